@@ -1,32 +1,66 @@
+from typing import Union
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from app.core.config import supabase
+from app.core.config import settings
+from app.core.db import supabase
+from app.core.security import (
+    token_verifier, TokenUser, TokenVerificationError, SigningKeyUnavailable
+)
+from app.core.tracing import trace_user
 from supabase_auth.types import User
 
 # This tells FastA\PI that the token will be sent in an 'Authorization: Bearer <TOKEN>' header.
 # The `tokenUrl` is a required parameter but isn't used in this authentication flow.
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
-async def get_current_user(token: str = Depends(oauth2_scheme)) -> User:
-    """
-    Dependency to get the current user from the JWT in the Authorization header.
+AuthenticatedUser = Union[User, TokenUser]
+
+
+def _credentials_exception(detail: str) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail=detail,
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
 
-    Validates the token with Supabase and returns the user object.
+async def get_remote_user(token: str) -> User:
+    """
+    Validates the token with a round trip to Supabase Auth (strict mode).
     Raises an HTTPException if the token is invalid or the user is not found.
     """
     try:
-        user_response = supabase.auth.get_user(token)
+        user_response = await supabase.auth.get_user(token)
         user = user_response.user
-        if not user:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid authentication credentials",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
-        return user
     except Exception:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Could not validate credentials",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
+        raise _credentials_exception("Could not validate credentials")
+    if not user:
+        raise _credentials_exception("Invalid authentication credentials")
+    return user
+
+
+async def get_current_user(token: str = Depends(oauth2_scheme)) -> AuthenticatedUser:
+    """
+    Dependency to get the current user from the JWT in the Authorization header.
+
+    Verifies the token locally (signature, exp, aud and role) and returns the
+    user described by its claims. With AUTH_STRICT_MODE enabled, or when no
+    signing key is available, the token is validated by Supabase Auth instead.
+    Raises an HTTPException if the token is invalid or the user is not found.
+    """
+    user = await _authenticate(token)
+    trace_user(user.id)
+    return user
+
+
+async def _authenticate(token: str) -> AuthenticatedUser:
+    if settings.AUTH_STRICT_MODE:
+        return await get_remote_user(token)
+
+    try:
+        claims = await token_verifier.verify(token)
+    except SigningKeyUnavailable:
+        return await get_remote_user(token)
+    except TokenVerificationError:
+        raise _credentials_exception("Could not validate credentials")
+    return TokenUser.from_claims(claims)
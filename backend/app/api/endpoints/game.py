@@ -1,135 +1,461 @@
+import asyncio
+import json
 import logging
 from uuid import UUID
-from fastapi import APIRouter, Depends, HTTPException
-from app.core.config import supabase
-from app.core.game_state import get_full_game_state, clear_game_state_cache
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import StreamingResponse
+from app.core.admission import Overloaded, attempt_rate_limiter, db_admission, retry_after_header
+from app.core.attempts import attempt_batcher, attempt_coalescer
+from app.core.chat_log import ChatLogTooLarge, InvalidChatLog, iter_chat_log, record_win_streaming
+from app.core.config import settings
+from app.core.credit_packs import get_credit_packs_payload, etag_matches
+from app.core.db import supabase
+from app.core.idempotency import BodyDigest, IdempotencyConflict, IdempotencyKeyReused, idempotency_store
+from app.core.game_state import (
+    build_system_prompt, clear_game_state_cache, game_state_broadcaster, get_full_game_state,
+    get_game_state_body,
+)
+from app.core.llm import LLMError, stream_reply
+from app.core.profiles import balance_write, get_credit_hint, get_profile, publish_credits_change
+from app.core.resilience import DatabaseUnavailable, db_breaker
+from app.core.responses import FastJSONResponse, trusted_fields
+from app.core.wins import InvalidCursor, get_leaderboard, get_recent_wins, get_win_messages
 from app.schemas.game import (
-    HandleWinRequest, HandleWinResponse, LogAttemptResponse,
-    GameStateResponse, ProfileResponse, CreditPackResponse, PurchaseResponse
+    ChatRequest, HandleWinRequest, HandleWinResponse, LogAttemptResponse,
+    GameStateResponse, ProfileResponse, CreditPackResponse, PurchaseResponse,
+    LeaderboardPage, WinsPage, WinTranscriptPage,
 )
 from app.api.deps import get_current_user
 from postgrest import APIResponse
-from typing import List
+from pydantic import BaseModel, ValidationError
+from typing import Any, Awaitable, Callable, Dict, List, Optional
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+
+
+def _database_unavailable() -> HTTPException:
+    # Fails fast while the circuit breaker is open; retry once it lets a probe through
+    return HTTPException(
+        status_code=503,
+        detail="Database is unavailable, please retry.",
+        headers=retry_after_header(db_breaker.retry_after()),
+    )
+
 
 @router.get("/game_state", response_model=GameStateResponse)
 async def get_game_state():
     """Fetches the current public state of the game."""
     try:
+        if settings.FAST_JSON_RESPONSES:
+            return Response(content=await get_game_state_body(), media_type="application/json")
         # Use optimized game state function
         game_state_data = await get_full_game_state()
         return GameStateResponse(**game_state_data)
+    except DatabaseUnavailable:
+        raise _database_unavailable()
     except Exception as e:
         logger.error(f"Error fetching game state: {e}")
         raise HTTPException(status_code=500, detail="Failed to fetch game state.")
 
 
+@router.get("/game_state/stream")
+async def stream_game_state():
+    """
+    Streams game state changes as Server-Sent Events.
+    The first event carries the full state; later events carry only changed fields.
+    """
+    async def events():
+        subscription = game_state_broadcaster.subscribe()
+        try:
+            while True:
+                try:
+                    delta = await asyncio.wait_for(
+                        subscription.get(), timeout=settings.GAME_STATE_STREAM_KEEPALIVE_SECONDS
+                    )
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"data: {json.dumps(delta)}\n\n"
+        finally:
+            game_state_broadcaster.unsubscribe(subscription)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @router.get("/me/profile", response_model=ProfileResponse)
 async def get_my_profile(user=Depends(get_current_user)):
-    """Fetches the profile for the currently authenticated user."""
+    """
+    Fetches the profile for the currently authenticated user.
+    Served from the profile cache, which balance-changing writes keep current.
+    """
     try:
-        res = supabase.table('profiles').select("*").eq('id', str(user.id)).single().execute()
-        return ProfileResponse(**res.data)
+        profile = await get_profile(str(user.id))
+        if settings.FAST_JSON_RESPONSES:
+            return FastJSONResponse(trusted_fields(ProfileResponse, profile))
+        return ProfileResponse(**profile)
+    except DatabaseUnavailable:
+        raise _database_unavailable()
     except Exception as e:
         logger.error(f"Error fetching profile for user {user.id}: {e}")
         raise HTTPException(status_code=500, detail="Failed to fetch user profile.")
 
 
+async def _record_attempt(user_id: str) -> Dict[str, Any]:
+    """
+    Charges one credit and counts the attempt, returning the database row in
+    the LogAttemptResponse shape. Raises HTTPException on refusal.
+    Attempts that are sure to fail are refused before reaching the database:
+    429 past the per-user rate, 402 for a balance recently seen at zero,
+    and 503 when the worker's database slots stay full.
+    """
+    retry_after = attempt_rate_limiter.acquire(user_id)
+    if retry_after:
+        raise HTTPException(status_code=429, detail="Too many attempts.", headers=retry_after_header(retry_after))
+    credits = get_credit_hint(user_id)
+    if credits is not None and credits <= 0:
+        raise HTTPException(status_code=402, detail="Insufficient credits.")
+
+    with balance_write(user_id) as write:
+        try:
+            if settings.ATTEMPT_COUNTER_MODE == "coalesced":
+                # Shares one log_attempts call (and admission slot) with concurrent attempts
+                attempt_data = await attempt_coalescer.submit(user_id)
+            else:
+                async with db_admission.slot():
+                    if settings.ATTEMPT_COUNTER_MODE == "batched":
+                        # Only the user's credits are updated here; the game_state attempt
+                        # counter is applied by the batcher as an aggregated delta.
+                        res: APIResponse = await supabase.rpc('consume_attempt_credit', {'p_user_id': user_id}).execute()
+                        attempt_batcher.record()
+                    else:
+                        res: APIResponse = await supabase.rpc('log_attempt', {'p_user_id': user_id}).execute()
+                attempt_data = res.data[0]
+
+            write.credits = attempt_data['new_credits_balance']
+            # Shaped by our own database function
+            return trusted_fields(LogAttemptResponse, attempt_data)
+        except Overloaded:
+            raise HTTPException(
+                status_code=503,
+                detail="Server is busy, please retry.",
+                headers=retry_after_header(settings.DB_ADMISSION_QUEUE_TIMEOUT_SECONDS),
+            )
+        except DatabaseUnavailable:
+            raise _database_unavailable()
+        except Exception as e:
+            # The database functions refuse to take the balance below zero
+            if "Insufficient credits" in str(e):
+                write.credits = 0
+                raise HTTPException(status_code=402, detail="Insufficient credits.")
+            logger.error(f"Error recording attempt for user {user_id}: {e}")
+            raise HTTPException(status_code=500, detail="An internal error occurred while processing the attempt.")
+
+
 @router.post("/log_attempt", response_model=LogAttemptResponse)
 async def log_attempt(user=Depends(get_current_user)):
-    """Logs an attempt and returns the current game state."""
+    """Logs an attempt and returns the current game state and the user's new balance."""
+    attempt = await _record_attempt(str(user.id))
+    if settings.FAST_JSON_RESPONSES:
+        return FastJSONResponse(attempt)
+    return LogAttemptResponse(**attempt)
+
+
+# The body is read under a size limit before it is parsed, so document it here
+_chat_body_schema = ChatRequest.model_json_schema(ref_template="#/components/schemas/{model}")
+_chat_body_schema.pop("$defs", None)
+
+
+async def _read_chat_request(request: Request) -> ChatRequest:
+    """Parses the /chat body, with 413 as soon as it exceeds CHAT_MAX_BODY_BYTES."""
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > settings.CHAT_MAX_BODY_BYTES:
+        raise HTTPException(status_code=413, detail="Request body is too large.")
+    body = bytearray()
+    async for piece in request.stream():
+        body += piece
+        if len(body) > settings.CHAT_MAX_BODY_BYTES:
+            raise HTTPException(status_code=413, detail="Request body is too large.")
     try:
-        res: APIResponse = supabase.rpc('log_attempt', {'p_user_id': str(user.id)}).execute()
-        return LogAttemptResponse(is_payout_phase_active=res.data)
+        return ChatRequest.model_validate_json(body)
+    except ValidationError as e:
+        raise RequestValidationError(e.errors(include_url=False))
+
+
+async def _refund_attempt(user_id: str) -> Optional[int]:
+    """Gives back the credit of an attempt the model never answered; returns the new balance, or None on failure."""
+    try:
+        with balance_write(user_id) as write:
+            res = await supabase.rpc('refund_attempt_credit', {'p_user_id': user_id}).execute()
+            write.credits = res.data
+        return res.data
     except Exception as e:
-        logger.error(f"Error in /log_attempt for user {user.id}: {e}")
-        raise HTTPException(status_code=500, detail="An internal error occurred while processing the attempt.")
+        logger.error(f"Error refunding the attempt of user {user_id}: {e}")
+        return None
+
+
+@router.post(
+    "/chat",
+    openapi_extra={"requestBody": {
+        "required": True,
+        "content": {"application/json": {"schema": _chat_body_schema}},
+    }},
+)
+async def chat(request: Request, user=Depends(get_current_user)):
+    """
+    Charges an attempt and streams the model's reply as Server-Sent Events.
+    Events carry `{"text": ...}` chunks, then a `done` event with the new
+    balance, or an `error` event if the model fails mid-stream. If it fails
+    before its first token the attempt is refunded, and the error event
+    carries the refunded balance. When the client disconnects the upstream
+    model request is cancelled.
+    """
+    chat_request = await _read_chat_request(request)
+    if len(chat_request.message) > settings.CHAT_MAX_MESSAGE_CHARS:
+        raise HTTPException(status_code=422, detail="Message is too long.")
+    history = chat_request.history
+    if len(history) > settings.CHAT_MAX_HISTORY_TURNS:
+        raise HTTPException(status_code=422, detail="Conversation is too long.")
+    if any(len(turn.prompt) > settings.CHAT_MAX_MESSAGE_CHARS for turn in history) or \
+            sum(len(turn.prompt) + len(turn.response) for turn in history) > settings.CHAT_MAX_HISTORY_CHARS:
+        raise HTTPException(status_code=422, detail="Conversation is too long.")
+
+    # Refusals surface as plain HTTP errors before the stream starts
+    attempt = await _record_attempt(str(user.id))
+    system_prompt = await build_system_prompt(settings.GAME_SYSTEM_PROMPT)
+
+    async def events():
+        replied = False
+        try:
+            async for text in stream_reply(system_prompt, chat_request.history, chat_request.message):
+                replied = True
+                yield f"data: {json.dumps({'text': text})}\n\n"
+        except LLMError as e:
+            logger.error(f"Error in /chat for user {user.id}: {e}")
+            error: Dict[str, Any] = {'detail': 'The model failed to reply.'}
+            if not replied:
+                balance = await _refund_attempt(str(user.id))
+                if balance is not None:
+                    error['new_credits_balance'] = balance
+            yield f"event: error\ndata: {json.dumps(error)}\n\n"
+            return
+        yield f"event: done\ndata: {json.dumps({'new_credits_balance': attempt['new_credits_balance']})}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def _run_idempotent(
+    request: Request,
+    response: Response,
+    user_id: str,
+    handler: Callable[[], Awaitable[BaseModel]],
+    body: Optional[BodyDigest] = None,
+) -> Any:
+    """
+    Runs `handler` once per Idempotency-Key header and gives duplicates the
+    stored result, marked with `Idempotent-Replayed: true`. Keys are scoped
+    to the user and the request path, and tied to the request body: reusing
+    a key with another body is a 422. Requests without a key just run.
+    A handler that reads the body must read it through `body`.
+    """
+    key = request.headers.get("idempotency-key")
+    if key is None:
+        return await handler()
+    if not key or len(key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+        raise HTTPException(status_code=400, detail="Invalid Idempotency-Key header.")
 
+    async def run() -> Dict[str, Any]:
+        return (await handler()).model_dump(mode="json")
 
-@router.post("/handle_win", response_model=HandleWinResponse)
-async def handle_win(win_request: HandleWinRequest, user=Depends(get_current_user)):
-    """Handles the win condition, logs the chat, and resets the game state."""
+    body = body or BodyDigest(request.stream())
+    try:
+        result, replayed = await idempotency_store.run(
+            f"{user_id}:{request.url.path}:{key}", run, body.fingerprint
+        )
+    except IdempotencyConflict:
+        raise HTTPException(
+            status_code=409, detail="A request with this Idempotency-Key is still being processed."
+        )
+    except IdempotencyKeyReused:
+        raise HTTPException(
+            status_code=422, detail="This Idempotency-Key was already used with a different request."
+        )
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
+    return result
+
+
+# The body is parsed incrementally rather than by FastAPI, so document it here
+_handle_win_body_schema = HandleWinRequest.model_json_schema(ref_template="#/components/schemas/{model}")
+_handle_win_body_schema.pop("$defs", None)
+
+
+@router.post(
+    "/handle_win",
+    response_model=HandleWinResponse,
+    openapi_extra={"requestBody": {
+        "required": True,
+        "content": {"application/json": {"schema": _handle_win_body_schema}},
+    }},
+)
+async def handle_win(request: Request, response: Response, user=Depends(get_current_user)):
+    """
+    Handles the win condition, logs the chat, and resets the game state.
+    The chat log is read and stored incrementally: 413 past the size or
+    message limits, 422 for a malformed log. Honours Idempotency-Key.
+    """
     # Note: In a real app, you'd have logic here to verify the win is legitimate
     # before proceeding.
-    log_id = None
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > settings.WIN_MAX_BODY_BYTES:
+        raise HTTPException(status_code=413, detail="Chat log is too large.")
+
+    body = BodyDigest(request.stream())
+
+    async def record_win() -> HandleWinResponse:
+        try:
+            # The 'record_win' / 'finalize_win' database functions store the chat log
+            # and its messages, create the win record and reset the game state in one transaction.
+            win_id = await record_win_streaming(str(user.id), iter_chat_log(body.stream()))
+
+            # Clear game state cache after reset
+            await clear_game_state_cache()
+
+            return HandleWinResponse(status="success", win_id=win_id)
+
+        except ChatLogTooLarge as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        except InvalidChatLog as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        except DatabaseUnavailable:
+            raise _database_unavailable()
+        except Exception as e:
+            logger.error(f"Error in /handle_win for user {user.id}: {e}")
+            raise HTTPException(status_code=500, detail=f"An error occurred during win processing.")
+
+    return await _run_idempotent(request, response, str(user.id), record_win, body)
+
+
+_page_limit = Query(settings.WINS_PAGE_SIZE, ge=1, le=settings.WINS_MAX_PAGE_SIZE)
+
+
+@router.get("/wins", response_model=WinsPage)
+async def list_recent_wins(limit: int = _page_limit, cursor: str | None = None):
+    """Lists wins, newest first. Follow `next_cursor` for older wins."""
     try:
-        # 1. Create a winning chat log entry
-        log_res = supabase.table('winning_chat_logs').insert({'user_id': str(user.id)}).execute()
-        log_id = log_res.data[0]['id']
-
-        # 2. Insert all messages from the winning chat
-        messages_to_insert = [
-            {'log_id': log_id, 'prompt': msg.prompt, 'response': msg.response}
-            for msg in win_request.chat_log
-        ]
-        msg_res = supabase.table('winning_chat_messages').insert(messages_to_insert).execute()
-
-        # 3. Create the final win record
-        game_state = supabase.table('game_state').select('global_attempts').single().execute()
-        
-        win_res = supabase.table('wins').insert({
-            'user_id': str(user.id),
-            'global_attempt_at_win': game_state.data['global_attempts'],
-            'winning_chat_log_id': log_id
-        }).execute()
-
-        # 4. Call the database function to reset the game state
-        reset_res = supabase.rpc('handle_win', {}).execute()
-        
-        # 5. Clear game state cache after reset
-        await clear_game_state_cache()
-        
-        return HandleWinResponse(status="success", win_id=win_res.data[0]['id'])
+        items, next_cursor = await get_recent_wins(limit, cursor)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except DatabaseUnavailable:
+        raise _database_unavailable()
+    except Exception as e:
+        logger.error(f"Error fetching recent wins: {e}")
+        raise HTTPException(status_code=500, detail="Failed to fetch wins.")
+    return WinsPage(items=items, next_cursor=next_cursor)
+
+
+@router.get("/wins/{win_id}/messages", response_model=WinTranscriptPage)
+async def list_win_messages(win_id: UUID, limit: int = _page_limit, cursor: str | None = None):
+    """Pages through the winning chat transcript, in order."""
+    try:
+        messages, next_cursor = await get_win_messages(str(win_id), limit, cursor)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except DatabaseUnavailable:
+        raise _database_unavailable()
+    except Exception as e:
+        if "Win not found" in str(e):
+            raise HTTPException(status_code=404, detail="Win not found.")
+        logger.error(f"Error fetching transcript of win {win_id}: {e}")
+        raise HTTPException(status_code=500, detail="Failed to fetch the transcript.")
+    return WinTranscriptPage(win_id=win_id, messages=messages, next_cursor=next_cursor)
+
 
+@router.get("/leaderboard", response_model=LeaderboardPage)
+async def list_leaderboard(limit: int = _page_limit, cursor: str | None = None):
+    """
+    Lists winners by number of wins, ties going to whoever got there first.
+    Served from the leaderboard table, which each recorded win updates.
+    """
+    try:
+        items, next_cursor = await get_leaderboard(limit, cursor)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except DatabaseUnavailable:
+        raise _database_unavailable()
     except Exception as e:
-        logger.error(f"Error in /handle_win for user {user.id}: {e}")
-        # If a log entry was created but something failed after, attempt to clean it up.
-        if log_id:
-            supabase.table('winning_chat_logs').delete().eq('id', log_id).execute()
-        raise HTTPException(status_code=500, detail=f"An error occurred during win processing.")
+        logger.error(f"Error fetching leaderboard: {e}")
+        raise HTTPException(status_code=500, detail="Failed to fetch the leaderboard.")
+    return LeaderboardPage(items=items, next_cursor=next_cursor)
 
 
 @router.get("/credit_packs", response_model=List[CreditPackResponse])
-async def list_credit_packs():
-    """Lists all available credit packs for purchase."""
+async def list_credit_packs(request: Request):
+    """
+    Lists all available credit packs for purchase.
+    The serialized catalogue is cached; clients revalidate with If-None-Match.
+    """
     try:
-        res = supabase.table('credit_packs').select("*").order('price').execute()
-        return [CreditPackResponse(**pack) for pack in res.data]
+        payload = await get_credit_packs_payload()
+    except DatabaseUnavailable:
+        raise _database_unavailable()
     except Exception as e:
         logger.error(f"Error fetching credit packs: {e}")
         raise HTTPException(status_code=500, detail="Failed to fetch credit packs.")
 
+    headers = {
+        "ETag": payload.etag,
+        "Cache-Control": f"public, max-age={settings.CREDIT_PACKS_MAX_AGE_SECONDS}",
+    }
+    if etag_matches(request.headers.get("if-none-match"), payload.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=payload.body, media_type="application/json", headers=headers)
+
 
 @router.post("/credit_packs/{pack_id}/purchase", response_model=PurchaseResponse)
-async def purchase_credit_pack(pack_id: UUID, user=Depends(get_current_user)):
+async def purchase_credit_pack(
+    pack_id: UUID, request: Request, response: Response, user=Depends(get_current_user)
+):
     """
     Handles a credit purchase for a user by calling the atomic
-    'purchase_credits' database function.
+    'purchase_credits' database function. Honours Idempotency-Key.
     """
-    try:
-        # A real application would integrate with a payment provider like Stripe here
-        # to confirm payment before calling this endpoint.
+    async def purchase() -> PurchaseResponse:
+        try:
+            # A real application would integrate with a payment provider like Stripe here
+            # to confirm payment before calling this endpoint.
 
-        params = {'p_user_id': str(user.id), 'p_pack_id': str(pack_id)}
-        res = supabase.rpc('purchase_credits', params).execute()
+            params = {'p_user_id': str(user.id), 'p_pack_id': str(pack_id)}
+            with balance_write(str(user.id)) as write:
+                res = await supabase.rpc('purchase_credits', params).execute()
+                purchase_data = res.data[0]
+                write.credits = purchase_data['new_credits_balance']
+            await publish_credits_change(str(user.id))
+            return PurchaseResponse(
+                status="success",
+                purchase_id=purchase_data['purchase_id'],
+                new_credits_balance=purchase_data['new_credits_balance']
+            )
 
-        purchase_data = res.data[0]
-        return PurchaseResponse(
-            status="success",
-            purchase_id=purchase_data['purchase_id'],
-            new_credits_balance=purchase_data['new_credits_balance']
-        )
+        except DatabaseUnavailable:
+            raise _database_unavailable()
+        except Exception as e:
+            logger.error(f"Error in /purchase for user {user.id}, pack {pack_id}: {e}")
+            # Check for a specific error message from our function
+            if "Credit pack not found" in str(e):
+                raise HTTPException(status_code=404, detail="Credit pack not found.")
+            raise HTTPException(status_code=500, detail="An error occurred during the purchase process.")
 
-    except Exception as e:
-        logger.error(f"Error in /purchase for user {user.id}, pack {pack_id}: {e}")
-        # Check for a specific error message from our function
-        if "Credit pack not found" in str(e):
-            raise HTTPException(status_code=404, detail="Credit pack not found.")
-        raise HTTPException(status_code=500, detail="An error occurred during the purchase process.")
-    
-    
+    return await _run_idempotent(request, response, str(user.id), purchase)
@@ -0,0 +1,126 @@
+import asyncio
+import math
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Deque, Dict, Tuple
+from app.core.config import settings
+
+
+class Overloaded(Exception):
+    """Raised when a request could not get a database slot in time."""
+
+
+class RateLimiter:
+    """
+    Per-key token buckets: `burst` requests at once, refilled at `rate` per
+    second. Buckets live in an LRU, so an evicted (long idle) key starts full.
+    """
+
+    def __init__(self, rate: float, burst: int, max_keys: int = 10_000):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self.stats = {"allowed": 0, "limited": 0}
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    def acquire(self, key: str) -> float:
+        """Takes a token for `key`. Returns 0 if allowed, otherwise seconds until one is available."""
+        if self.rate <= 0:
+            return 0.0
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(key, (float(self.burst), now))
+        tokens = min(float(self.burst), tokens + (now - updated) * self.rate)
+        if tokens < 1.0:
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            self.stats["limited"] += 1
+            return (1.0 - tokens) / self.rate
+
+        self._buckets[key] = (tokens - 1.0, now)
+        self._buckets.move_to_end(key)
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        self.stats["allowed"] += 1
+        return 0.0
+
+    def reset(self) -> None:
+        self._buckets.clear()
+
+
+class ConcurrencyLimiter:
+    """
+    Caps in-flight database calls per worker. Callers past the cap wait in a
+    FIFO queue of at most `max_queue` for up to `queue_timeout` seconds, then
+    get `Overloaded`, so a burst is shed in the app instead of piling up on
+    the connection pool.
+    """
+
+    def __init__(self, max_inflight: int, max_queue: int, queue_timeout: float):
+        self.max_inflight = max_inflight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.inflight = 0
+        self.stats = {"admitted": 0, "queued": 0, "rejected": 0}
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    @asynccontextmanager
+    async def slot(self):
+        await self._acquire()
+        try:
+            yield
+        finally:
+            self._release()
+
+    async def _acquire(self) -> None:
+        if self.inflight < self.max_inflight and not self._waiters:
+            self.inflight += 1
+            self.stats["admitted"] += 1
+            return
+        if len(self._waiters) >= self.max_queue:
+            self.stats["rejected"] += 1
+            raise Overloaded()
+
+        # The slot is handed over by _release, so inflight is not bumped here
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self.stats["queued"] += 1
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._abandon(waiter)
+            self.stats["rejected"] += 1
+            raise Overloaded()
+        except asyncio.CancelledError:
+            self._abandon(waiter)
+            raise
+        self.stats["admitted"] += 1
+
+    def _abandon(self, waiter: asyncio.Future) -> None:
+        if waiter.done():
+            # Handed a slot just as the wait ended; pass it on
+            self._release()
+        else:
+            waiter.cancel()
+            self._waiters.remove(waiter)
+
+    def _release(self) -> None:
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.inflight -= 1
+
+
+def retry_after_header(seconds: float) -> Dict[str, str]:
+    return {"Retry-After": str(max(1, math.ceil(seconds)))}
+
+
+# Per worker; with N workers a user gets at most N times the configured rate
+attempt_rate_limiter = RateLimiter(settings.ATTEMPT_RATE_PER_SECOND, settings.ATTEMPT_RATE_BURST)
+db_admission = ConcurrencyLimiter(
+    settings.DB_MAX_INFLIGHT,
+    max_queue=settings.DB_ADMISSION_MAX_QUEUE,
+    queue_timeout=settings.DB_ADMISSION_QUEUE_TIMEOUT_SECONDS,
+)
@@ -0,0 +1,43 @@
+"""
+Archiving of old winning transcripts.
+
+Once a transcript is older than TRANSCRIPT_ARCHIVE_AFTER_DAYS its messages
+are moved out of winning_chat_messages into winning_chat_archive: one
+compressed row per transcript, in append-only monthly partitions. The hot
+table then only holds recent transcripts. /wins/{id}/messages reads either
+place, with the same cursors.
+"""
+import logging
+from app.core.config import settings
+from app.core.db import supabase
+from app.core.tasks import task_queue
+
+logger = logging.getLogger(__name__)
+
+
+async def archive_win_transcripts() -> int:
+    """
+    Archives every transcript past the cutoff, one batch per database call,
+    and returns how many were moved. Concurrent runs on other workers skip
+    the transcripts this one is archiving.
+    """
+    archived = 0
+    while True:
+        res = await supabase.rpc('archive_win_transcripts', {
+            'p_older_than': f"{settings.TRANSCRIPT_ARCHIVE_AFTER_DAYS} days",
+            'p_limit': settings.TRANSCRIPT_ARCHIVE_BATCH_SIZE,
+        }).execute()
+        archived += res.data
+        if res.data < settings.TRANSCRIPT_ARCHIVE_BATCH_SIZE:
+            break
+    if archived:
+        logger.info(f"Archived {archived} winning transcripts")
+    return archived
+
+task_queue.register('archive_win_transcripts', archive_win_transcripts)
+
+
+def schedule_archiver() -> None:
+    """Runs the archiver periodically from the task queue, unless disabled."""
+    if settings.TRANSCRIPT_ARCHIVE_INTERVAL_SECONDS > 0:
+        task_queue.schedule('archive_win_transcripts', settings.TRANSCRIPT_ARCHIVE_INTERVAL_SECONDS)
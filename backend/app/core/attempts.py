@@ -0,0 +1,185 @@
+import asyncio
+import logging
+import uuid
+from typing import Any, Dict, List, Optional, Set, Tuple
+from app.core.admission import db_admission
+from app.core.config import settings
+from app.core.db import supabase
+from app.core.game_state import clear_game_state_cache
+
+logger = logging.getLogger(__name__)
+
+
+class AttemptBatcher:
+    """
+    Write-combining counter for game attempts.
+
+    Attempts are counted in memory and applied to `game_state` as a single
+    aggregated delta per flush, so requests no longer queue on the singleton
+    row lock. Each flush carries an id that the database deduplicates on: a
+    flush that fails is retried with the same id and delta until it lands,
+    so attempts are neither lost nor double-counted.
+    """
+
+    def __init__(self, flush_interval: float, max_pending: int):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.stats = {"recorded": 0, "flushed": 0, "flushes": 0, "failed_flushes": 0}
+        self._pending = 0
+        self._inflight: Optional[Tuple[str, int]] = None
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._early_flush: Optional[asyncio.Task] = None
+
+    @property
+    def pending(self) -> int:
+        """Attempts recorded but not yet applied to game_state."""
+        return self._pending + (self._inflight[1] if self._inflight else 0)
+
+    def record(self, count: int = 1) -> None:
+        """Counts attempts; triggers an early flush once `max_pending` is reached."""
+        self._pending += count
+        self.stats["recorded"] += count
+        if self._pending >= self.max_pending and (self._early_flush is None or self._early_flush.done()):
+            self._early_flush = asyncio.create_task(self.flush())
+
+    async def flush(self) -> None:
+        """Applies all pending attempts to game_state in one database call."""
+        async with self._flush_lock:
+            if self._inflight is None:
+                if not self._pending:
+                    return
+                self._inflight = (str(uuid.uuid4()), self._pending)
+                self._pending = 0
+
+            flush_id, delta = self._inflight
+            try:
+                res = await supabase.rpc(
+                    'add_game_attempts', {'p_flush_id': flush_id, 'p_delta': delta}
+                ).execute()
+            except Exception as e:
+                # Keep the same id so the retry is deduplicated if this one landed
+                self.stats["failed_flushes"] += 1
+                logger.error(f"Error flushing {delta} game attempts: {e}")
+                return
+
+            self._inflight = None
+            self.stats["flushed"] += delta
+            self.stats["flushes"] += 1
+
+        if res.data and res.data[0]['activated']:
+            logger.info("Payout phase activated by attempt flush")
+            await clear_game_state_cache()
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stops the flush loop and drains everything still pending."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        while self.pending:
+            failed = self.stats["failed_flushes"]
+            await self.flush()
+            if self.stats["failed_flushes"] != failed:
+                logger.error(f"Dropping {self.pending} unflushed game attempts on shutdown")
+                break
+
+
+class InsufficientCredits(Exception):
+    """The user had no credits left for this attempt."""
+
+    def __init__(self):
+        super().__init__("Insufficient credits")
+
+
+class AttemptCoalescer:
+    """
+    Micro-batcher for whole attempts.
+
+    Callers that arrive within `window` seconds of the first one are sent to
+    the database together as one set-based log_attempts call, which charges
+    every user and bumps game_state once by the batch size. A full batch is
+    sent straight away. Each caller still gets its own row: its new balance
+    and the payout phase as of its place in the batch. A batch holds one
+    database admission slot, and a failed batch fails all of its callers.
+    """
+
+    def __init__(self, window: float, max_batch: int):
+        self.window = window
+        self.max_batch = max_batch
+        self.stats = {"attempts": 0, "batches": 0, "failed_batches": 0}
+        self._waiting: List[Tuple[str, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._batches: Set[asyncio.Task] = set()
+
+    async def submit(self, user_id: str) -> Dict[str, Any]:
+        """Logs one attempt for `user_id`; returns its log_attempt row or raises InsufficientCredits."""
+        future = asyncio.get_running_loop().create_future()
+        self._waiting.append((user_id, future))
+        self.stats["attempts"] += 1
+        if len(self._waiting) >= self.max_batch:
+            self._dispatch()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.window, self._dispatch)
+        return await future
+
+    def _dispatch(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._waiting = self._waiting, []
+        if batch:
+            task = asyncio.create_task(self._send(batch))
+            self._batches.add(task)
+            task.add_done_callback(self._batches.discard)
+
+    async def _send(self, batch: List[Tuple[str, asyncio.Future]]) -> None:
+        try:
+            async with db_admission.slot():
+                res = await supabase.rpc('log_attempts', {'p_user_ids': [user_id for user_id, _ in batch]}).execute()
+        except Exception as e:
+            self.stats["failed_batches"] += 1
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self.stats["batches"] += 1
+        for row in res.data:
+            future = batch[row['attempt_index']][1]
+            if future.done():
+                # The caller went away; its attempt was still charged
+                continue
+            if row['new_credits_balance'] is None:
+                future.set_exception(InsufficientCredits())
+            else:
+                future.set_result(row)
+
+    async def stop(self) -> None:
+        """Sends whatever is waiting and waits for every batch in flight."""
+        self._dispatch()
+        if self._batches:
+            await asyncio.gather(*self._batches, return_exceptions=True)
+
+
+attempt_batcher = AttemptBatcher(
+    flush_interval=settings.ATTEMPT_FLUSH_INTERVAL_MS / 1000,
+    max_pending=settings.ATTEMPT_FLUSH_MAX_PENDING,
+)
+
+attempt_coalescer = AttemptCoalescer(
+    window=settings.ATTEMPT_COALESCE_WINDOW_MS / 1000,
+    max_batch=settings.ATTEMPT_COALESCE_MAX_BATCH,
+)
@@ -0,0 +1,101 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    """
+    A subscriber's mailbox. Instead of queueing every message, pending deltas
+    are merged into one dict, so a slow consumer costs O(fields) memory and
+    simply receives the latest values when it catches up.
+    """
+
+    def __init__(self):
+        self._pending: Dict[str, Any] = {}
+        self._ready = asyncio.Event()
+        self.conflated = 0
+
+    def push(self, delta: Dict[str, Any]) -> None:
+        if self._ready.is_set():
+            self.conflated += 1
+        self._pending.update(delta)
+        self._ready.set()
+
+    async def get(self) -> Dict[str, Any]:
+        await self._ready.wait()
+        delta, self._pending = self._pending, {}
+        self._ready.clear()
+        return delta
+
+
+class StateBroadcaster:
+    """
+    Fans state changes out to any number of subscribers from a single upstream
+    watcher per worker. The watcher polls `fetch` every `interval` seconds while
+    at least one subscriber is connected and publishes only the fields that
+    changed. New subscribers immediately receive the full current state.
+    """
+
+    def __init__(self, fetch: Callable[[], Awaitable[Dict[str, Any]]], interval: float):
+        self.fetch = fetch
+        self.interval = interval
+        self.stats = {"polls": 0, "publishes": 0, "poll_errors": 0}
+        self._subscribers: Set[Subscription] = set()
+        self._state: Optional[Dict[str, Any]] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def subscribe(self) -> Subscription:
+        subscription = Subscription()
+        if self._state is not None:
+            subscription.push(self._state)
+        self._subscribers.add(subscription)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._watch())
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        self._subscribers.discard(subscription)
+        if not self._subscribers and self._task is not None:
+            self._task.cancel()
+            self._task = None
+            # Nobody is watching, so the last state will go stale
+            self._state = None
+
+    def publish(self, state: Dict[str, Any]) -> None:
+        """Pushes the fields of `state` that changed since the last publish."""
+        previous = self._state or {}
+        delta = {k: v for k, v in state.items() if previous.get(k) != v or k not in previous}
+        if not delta:
+            return
+        self._state = dict(state)
+        self.stats["publishes"] += 1
+        for subscription in self._subscribers:
+            subscription.push(delta)
+
+    async def _watch(self) -> None:
+        while True:
+            try:
+                state = await self.fetch()
+                self.stats["polls"] += 1
+                self.publish(state)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.stats["poll_errors"] += 1
+                logger.error(f"Error polling state for subscribers: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
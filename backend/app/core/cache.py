@@ -0,0 +1,243 @@
+import asyncio
+import json
+import logging
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import redis.asyncio as redis
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class SnapshotCache:
+    """
+    TTL cache for a single value with request coalescing (single-flight).
+
+    Concurrent misses share one in-flight load instead of each querying the
+    database. A value loaded while `invalidate()` ran is returned to its
+    waiters but not stored, so an invalidation is never undone by a slow load.
+
+    With `stale_ttl`, an expired value is kept that much longer: callers that
+    arrive while a refresh is in flight get it at once instead of waiting,
+    and it is served if the refresh fails. Invalidated values are never
+    served stale.
+    """
+
+    def __init__(self, loader: Callable[[], Awaitable[Any]], ttl: float, stale_ttl: float = 0.0):
+        self.loader = loader
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0, "stale": 0}
+        self._value: Any = None
+        self._expires = 0.0
+        self._generation = 0
+        self._inflight: Optional[asyncio.Future] = None
+
+    def _stale(self) -> bool:
+        return self._value is not None and time.monotonic() < self._expires + self.stale_ttl
+
+    async def get(self) -> Any:
+        if self._value is not None and self._expires > time.monotonic():
+            self.stats["hits"] += 1
+            return self._value
+
+        if self._inflight is not None and not self._inflight.done():
+            if self._stale():
+                self.stats["stale"] += 1
+                return self._value
+            self.stats["coalesced"] += 1
+            return await asyncio.shield(self._inflight)
+
+        self.stats["misses"] += 1
+        self._inflight = asyncio.ensure_future(self._load(self._generation))
+        try:
+            return await asyncio.shield(self._inflight)
+        except Exception as e:
+            if not self._stale():
+                raise
+            self.stats["stale"] += 1
+            logger.warning(f"Serving a stale value after a failed refresh: {e}")
+            return self._value
+
+    async def _load(self, generation: int) -> Any:
+        value = await self.loader()
+        if generation == self._generation:
+            self._value = value
+            self._expires = time.monotonic() + self.ttl
+        return value
+
+    def invalidate(self) -> None:
+        self._generation += 1
+        self._value = None
+        self._expires = 0.0
+        self._inflight = None
+
+
+class InMemoryCacheBackend:
+    """
+    Per-process key/value cache with TTLs. Invalidation only reaches this
+    process, which is enough for tests and single-worker runs.
+    """
+
+    def __init__(self):
+        self._entries: Dict[str, Tuple[Any, float]] = {}
+        self._listeners: List[Callable[[], None]] = []
+        self._user_listeners: List[Callable[[Optional[str]], None]] = []
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "invalidations_sent": 0,
+            "invalidations_received": 0,
+            "invalidation_latency_ms_last": 0.0,
+            "invalidation_latency_ms_max": 0.0,
+        }
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"] / lookups if lookups else 0.0
+
+    def get(self, key: str) -> Any:
+        entry = self._entries.get(key)
+        if entry is None or entry[1] <= time.monotonic():
+            self.stats["misses"] += 1
+            return None
+        self.stats["hits"] += 1
+        return entry[0]
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        self._entries[key] = (value, time.monotonic() + ttl)
+
+    def on_invalidate(self, listener: Callable[[], None]) -> None:
+        """Registers a callback for caches kept outside the backend (e.g. snapshots)."""
+        self._listeners.append(listener)
+
+    def _clear_local(self) -> None:
+        self._entries.clear()
+        for listener in self._listeners:
+            listener()
+
+    async def invalidate(self) -> None:
+        """Drops every cached entry (call after game state changes)."""
+        self.stats["invalidations_sent"] += 1
+        self._clear_local()
+
+    def on_user_change(self, listener: Callable[[Optional[str]], None]) -> None:
+        """
+        Registers a callback for per-user caches, called with the id of a user
+        whose data another worker changed, or None when any user's may have.
+        """
+        self._user_listeners.append(listener)
+
+    def _user_changed(self, user_id: Optional[str]) -> None:
+        for listener in self._user_listeners:
+            listener(user_id)
+
+    async def publish_user_change(self, user_id: str) -> None:
+        """Tells the other workers that `user_id`'s data changed; this worker updates its own caches."""
+        pass
+
+    async def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+
+class RedisCacheBackend(InMemoryCacheBackend):
+    """
+    Per-worker cache whose invalidations are broadcast over Redis pub/sub, so a
+    win handled by one worker clears every worker's cache at once. Messages carry
+    their send time so each receiver can record invalidation latency.
+    """
+
+    def __init__(self, url: str, channel: str):
+        super().__init__()
+        self.url = url
+        self.channel = channel
+        self.worker_id = uuid.uuid4().hex
+        self._redis: Optional[redis.Redis] = None
+        self._listener_task: Optional[asyncio.Task] = None
+
+    async def invalidate(self) -> None:
+        await super().invalidate()
+        if self._redis is None:
+            return
+        message = json.dumps({"origin": self.worker_id, "sent_at": time.time()})
+        try:
+            await self._redis.publish(self.channel, message)
+        except Exception as e:
+            logger.error(f"Error publishing cache invalidation: {e}")
+
+    async def publish_user_change(self, user_id: str) -> None:
+        if self._redis is None:
+            return
+        message = json.dumps({"origin": self.worker_id, "sent_at": time.time(), "user_id": user_id})
+        try:
+            await self._redis.publish(self.channel, message)
+        except Exception as e:
+            logger.error(f"Error publishing a change to user {user_id}: {e}")
+
+    def handle_message(self, data: Any) -> None:
+        payload = json.loads(data)
+        if payload["origin"] == self.worker_id:
+            return
+        if "user_id" in payload:
+            self._user_changed(payload["user_id"])
+            return
+        latency_ms = max(0.0, (time.time() - payload["sent_at"]) * 1000)
+        self.stats["invalidations_received"] += 1
+        self.stats["invalidation_latency_ms_last"] = latency_ms
+        self.stats["invalidation_latency_ms_max"] = max(self.stats["invalidation_latency_ms_max"], latency_ms)
+        self._clear_local()
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                pubsub = self._redis.pubsub()
+                await pubsub.subscribe(self.channel)
+                # Invalidations may have been missed while disconnected
+                self._clear_local()
+                self._user_changed(None)
+                try:
+                    while True:
+                        message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                        if message is not None:
+                            self.handle_message(message["data"])
+                finally:
+                    await pubsub.aclose()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Cache invalidation listener lost connection: {e}")
+                await asyncio.sleep(1.0)
+
+    async def start(self) -> None:
+        if self._redis is None:
+            self._redis = redis.from_url(self.url)
+        if self._listener_task is None:
+            self._listener_task = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        if self._listener_task is not None:
+            self._listener_task.cancel()
+            try:
+                await self._listener_task
+            except asyncio.CancelledError:
+                pass
+            self._listener_task = None
+        if self._redis is not None:
+            await self._redis.aclose()
+            self._redis = None
+
+
+def create_cache_backend() -> InMemoryCacheBackend:
+    if settings.CACHE_BACKEND == "redis":
+        return RedisCacheBackend(settings.REDIS_URL, channel=settings.CACHE_INVALIDATION_CHANNEL)
+    return InMemoryCacheBackend()
+
+
+# Shared by every cache in this worker
+cache_backend = create_cache_backend()
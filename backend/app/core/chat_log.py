@@ -0,0 +1,193 @@
+"""
+Bounded, incremental ingestion of winning chat logs.
+
+The /handle_win body is read in network-sized pieces. Size and message
+count limits are enforced as it arrives, and messages are parsed one by one
+and handed to the database in fixed-size chunks. Peak memory per request
+therefore depends on the chunk size, not on the transcript length.
+"""
+import codecs
+import json
+import logging
+import re
+import uuid
+from typing import Any, AsyncIterable, AsyncIterator, Dict, List
+from pydantic import ValidationError
+from app.core.config import settings
+from app.core.db import supabase
+from app.core.tasks import task_queue
+from app.schemas.game import ChatMessage
+
+logger = logging.getLogger(__name__)
+
+_PREFIX = re.compile(r'\s*\{\s*"chat_log"\s*:\s*\[')
+_WHITESPACE = re.compile(r'\s*')
+_decoder = json.JSONDecoder()
+
+
+class ChatLogTooLarge(Exception):
+    """The body or the transcript exceeds the configured limits."""
+
+
+class InvalidChatLog(Exception):
+    """The body is not a well-formed {"chat_log": [...]} document."""
+
+
+class ChatLogParser:
+    """
+    Push parser for `{"chat_log": [{...}, ...]}` documents. `feed()` returns
+    the message objects completed by each piece of text; only the unparsed
+    tail is buffered, and a single message may not exceed `max_message_chars`.
+    """
+
+    def __init__(self, max_message_chars: int):
+        self.max_message_chars = max_message_chars
+        self._buffer = ""
+        self._pos = 0
+        self._state = "prefix"
+        self._need_comma = False
+
+    def feed(self, text: str) -> List[Dict[str, Any]]:
+        self._buffer = self._buffer[self._pos:] + text
+        self._pos = 0
+        messages = []
+        while True:
+            if self._state == "prefix":
+                match = _PREFIX.match(self._buffer)
+                if match is None:
+                    if len(self._buffer) > 256:
+                        raise InvalidChatLog('Expected a {"chat_log": [...]} object')
+                    return messages
+                self._pos = match.end()
+                self._state = "items"
+
+            elif self._state == "items":
+                self._pos = _WHITESPACE.match(self._buffer, self._pos).end()
+                if self._pos == len(self._buffer):
+                    return messages
+                char = self._buffer[self._pos]
+                if char == "]":
+                    self._pos += 1
+                    self._state = "suffix"
+                elif self._need_comma:
+                    if char != ",":
+                        raise InvalidChatLog("Expected ',' or ']' between messages")
+                    self._pos += 1
+                    self._need_comma = False
+                elif char != "{":
+                    raise InvalidChatLog("Chat log entries must be objects")
+                else:
+                    try:
+                        message, end = _decoder.raw_decode(self._buffer, self._pos)
+                    except json.JSONDecodeError:
+                        # Most likely cut off mid-message; wait for more text
+                        if len(self._buffer) - self._pos > self.max_message_chars:
+                            raise ChatLogTooLarge("A chat log message exceeds the size limit")
+                        return messages
+                    # The same limit whether or not the message arrived in one piece
+                    if end - self._pos > self.max_message_chars:
+                        raise ChatLogTooLarge("A chat log message exceeds the size limit")
+                    messages.append(message)
+                    self._pos = end
+                    self._need_comma = True
+
+            else:
+                self._pos = _WHITESPACE.match(self._buffer, self._pos).end()
+                if self._pos == len(self._buffer):
+                    return messages
+                if self._state == "suffix" and self._buffer[self._pos] == "}":
+                    self._pos += 1
+                    self._state = "done"
+                    continue
+                raise InvalidChatLog("Unexpected data after the chat log")
+
+    def close(self) -> None:
+        """Checks that the document ended where it should."""
+        if self._state != "done":
+            raise InvalidChatLog("Chat log body is incomplete")
+
+
+async def iter_chat_log(body: AsyncIterable[bytes]) -> AsyncIterator[ChatMessage]:
+    """
+    Yields validated messages from a streamed request body, raising
+    ChatLogTooLarge as soon as a limit is crossed.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    parser = ChatLogParser(max_message_chars=settings.WIN_MAX_MESSAGE_CHARS)
+    received = 0
+    count = 0
+    try:
+        async for piece in body:
+            received += len(piece)
+            if received > settings.WIN_MAX_BODY_BYTES:
+                raise ChatLogTooLarge("Request body exceeds the size limit")
+            for raw in parser.feed(decoder.decode(piece)):
+                count += 1
+                if count > settings.WIN_MAX_MESSAGES:
+                    raise ChatLogTooLarge("Chat log has too many messages")
+                yield ChatMessage.model_validate(raw)
+        for raw in parser.feed(decoder.decode(b"", final=True)):
+            count += 1
+            if count > settings.WIN_MAX_MESSAGES:
+                raise ChatLogTooLarge("Chat log has too many messages")
+            yield ChatMessage.model_validate(raw)
+    except UnicodeDecodeError as e:
+        raise InvalidChatLog(f"Body is not valid UTF-8: {e}")
+    except ValidationError as e:
+        raise InvalidChatLog(f"Invalid chat log message: {e.errors()[0]['msg']}")
+    parser.close()
+
+
+async def record_win_streaming(user_id: str, messages: AsyncIterable[ChatMessage]) -> str:
+    """
+    Records a win from a stream of messages and returns the win id.
+
+    A transcript that fits in one chunk is recorded with a single
+    'record_win' call. Longer ones are staged chunk by chunk with
+    'stage_win_messages' and committed by 'finalize_win', which stores the
+    log, the win and the game reset in one transaction, so a failed upload
+    never leaves a partial win behind.
+    """
+    chunk_size = settings.WIN_INGEST_CHUNK_SIZE
+    chunk: List[Dict[str, str]] = []
+    upload_id = None
+    staged = 0
+    try:
+        async for message in messages:
+            if len(chunk) == chunk_size:
+                if upload_id is None:
+                    upload_id = str(uuid.uuid4())
+                await supabase.rpc('stage_win_messages', {
+                    'p_upload_id': upload_id,
+                    'p_user_id': user_id,
+                    'p_offset': staged,
+                    'p_messages': chunk,
+                }).execute()
+                staged += len(chunk)
+                chunk = []
+            chunk.append(message.model_dump())
+
+        if upload_id is None:
+            res = await supabase.rpc('record_win', {'p_user_id': user_id, 'p_chat_log': chunk}).execute()
+        else:
+            res = await supabase.rpc('finalize_win', {
+                'p_upload_id': upload_id,
+                'p_user_id': user_id,
+                'p_chat_log': chunk,
+            }).execute()
+        return res.data
+    except Exception:
+        if upload_id is not None:
+            # Off the request path, so the error response does not wait on the delete
+            try:
+                await task_queue.enqueue('discard_win_upload', upload_id=upload_id)
+            except Exception as e:
+                logger.error(f"Error queueing discard of win upload {upload_id}: {e}")
+        raise
+
+
+async def _discard_upload(upload_id: str) -> None:
+    # finalize_win also purges uploads abandoned for over an hour
+    await supabase.rpc('discard_win_upload', {'p_upload_id': upload_id}).execute()
+
+task_queue.register('discard_win_upload', _discard_upload)
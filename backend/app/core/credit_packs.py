@@ -0,0 +1,51 @@
+import hashlib
+import logging
+from typing import Dict, List, NamedTuple
+from pydantic import TypeAdapter
+from app.core.cache import SnapshotCache
+from app.core.config import settings
+from app.core.db import supabase
+from app.schemas.game import CreditPackResponse
+
+logger = logging.getLogger(__name__)
+
+_credit_pack_list = TypeAdapter(List[CreditPackResponse])
+
+
+class CachedPayload(NamedTuple):
+    """A serialized response body and its strong ETag."""
+    body: bytes
+    etag: str
+
+
+async def _load_credit_packs() -> CachedPayload:
+    res = await supabase.table('credit_packs').select("*").order('price').execute()
+    body = _credit_pack_list.dump_json([CreditPackResponse(**pack) for pack in res.data])
+    return CachedPayload(body=body, etag=f'"{hashlib.sha256(body).hexdigest()[:32]}"')
+
+
+# The catalogue rarely changes, so the serialized list is cached as bytes
+_credit_packs_cache = SnapshotCache(
+    _load_credit_packs,
+    ttl=settings.CREDIT_PACKS_CACHE_TTL_SECONDS,
+    stale_ttl=settings.CREDIT_PACKS_STALE_SECONDS,
+)
+
+async def get_credit_packs_payload() -> CachedPayload:
+    """Returns the serialized credit pack catalogue, from cache when possible."""
+    return await _credit_packs_cache.get()
+
+def get_credit_packs_cache_stats() -> Dict[str, int]:
+    """Hit, miss and coalesced counts of the credit pack cache."""
+    return dict(_credit_packs_cache.stats)
+
+def clear_credit_packs_cache():
+    """Clear the cached catalogue (call after credit packs are changed)."""
+    _credit_packs_cache.invalidate()
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against `etag`, as RFC 9110 requires."""
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in (tag.removeprefix("W/") for tag in candidates)
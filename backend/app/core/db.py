@@ -0,0 +1,75 @@
+from typing import TYPE_CHECKING
+import httpx
+from app.core.config import settings
+from app.core.lazy import LazyProxy, PerWorker
+from app.core.metrics import InstrumentedTransport
+from app.core.resilience import ResilientTransport, bulk_db_breaker, db_breaker
+from app.core.tracing import TracingTransport
+
+if TYPE_CHECKING:
+    from supabase import AsyncClient
+
+
+def _create_supabase() -> "AsyncClient":
+    # Imported here: the supabase package and the TLS setup of the pool are
+    # a large part of a worker's boot time
+    from supabase import AsyncClient, AsyncClientOptions
+
+    # One pooled HTTP/2 connection pool per worker, shared by every PostgREST,
+    # RPC and Auth call so awaiting the database never blocks the event loop.
+    transport: httpx.AsyncBaseTransport = httpx.AsyncHTTPTransport(
+        http2=True,
+        limits=httpx.Limits(
+            max_connections=settings.DB_POOL_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.DB_POOL_MAX_KEEPALIVE,
+        ),
+    )
+    if settings.METRICS_ENABLED:
+        transport = InstrumentedTransport(transport)
+    if settings.TRACE_PATH:
+        transport = TracingTransport(transport)
+    # Outermost, so metrics count every attempt and the deadline covers retries
+    transport = ResilientTransport(
+        transport,
+        db_breaker,
+        deadline=settings.DB_CALL_DEADLINE_SECONDS,
+        read_retries=settings.DB_READ_RETRIES,
+        backoff=settings.DB_RETRY_BACKOFF_SECONDS,
+        backoff_max=settings.DB_RETRY_BACKOFF_MAX_SECONDS,
+        bulk_breaker=bulk_db_breaker,
+        bulk_deadline=settings.DB_BULK_CALL_DEADLINE_SECONDS,
+    )
+
+    http_client = httpx.AsyncClient(
+        transport=transport,
+        follow_redirects=True,
+        timeout=settings.DB_TIMEOUT_SECONDS,
+    )
+    return AsyncClient(
+        settings.SUPABASE_URL,
+        settings.SUPABASE_SERVICE_ROLE_KEY,
+        AsyncClientOptions(httpx_client=http_client),
+    )
+
+
+_supabase: PerWorker["AsyncClient"] = PerWorker(_create_supabase)
+
+
+def get_supabase() -> "AsyncClient":
+    """
+    Returns this worker's Supabase client, building it on first use.
+    Can also be used as a FastAPI dependency.
+    """
+    return _supabase.get()
+
+
+# Shared handle for modules that import the client by name; the client is
+# only built when the first query is made
+supabase: "AsyncClient" = LazyProxy(_supabase)  # type: ignore[assignment]
+
+
+async def close_db():
+    """Close the worker's connection pool (call on shutdown)."""
+    client = _supabase.reset()
+    if client is not None:
+        await client.options.httpx_client.aclose()
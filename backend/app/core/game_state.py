@@ -1,60 +1,180 @@
+import asyncio
+import itertools
 import logging
-from functools import lru_cache
-from datetime import datetime, timedelta
-from app.core.config import supabase
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+from app.core.broadcast import StateBroadcaster
+from app.core.cache import SnapshotCache, cache_backend
+from app.core.config import settings
+from app.core.db import supabase
+from app.core.listener import NotifyListener
+from app.core.responses import dump_json, trusted_fields
+from app.schemas.game import GameStateResponse
 
 logger = logging.getLogger(__name__)
 
-# Simple in-memory cache for payout phase (1 second TTL)
-_payout_cache = {"value": None, "expires": None}
+# Payout phase is cached for 1 second in the shared cache backend
+PAYOUT_CACHE_KEY = "game_state:is_payout_phase_active"
+PAYOUT_CACHE_TTL_SECONDS = 1.0
+
+# Last value read from the database, served if a refresh fails
+_last_payout_value: Optional[bool] = None
+# Shared by concurrent callers that miss the cache; bumped generation means a
+# refresh that started before an invalidation must not repopulate the cache
+_payout_refresh: Optional[asyncio.Future] = None
+_payout_generation = 0
+
+
+class GamePhase(NamedTuple):
+    """The payout phase as last read, with a version that changes whenever the phase does."""
+    version: int
+    payout_active: bool
+
+
+# None until read, and again after a win or an invalidation
+_phase: Optional[GamePhase] = None
+_phase_versions = itertools.count(1)
+
+
+def _observe_payout_phase(payout_active: bool) -> None:
+    global _phase
+    if _phase is None or _phase.payout_active != payout_active:
+        _phase = GamePhase(next(_phase_versions), payout_active)
+
 
 async def is_payout_phase_active() -> bool:
     """
-    Fast payout phase check with 1-second in-memory cache.
+    Fast payout phase check with 1-second cache.
     Critical for determining when to inject payout protocol into system prompts.
+    Concurrent misses share one database read. While the game_state listener
+    is live the phase is pushed to memory on every change and no TTL applies.
     """
-    now = datetime.utcnow()
-    
+    global _payout_refresh
+
+    if game_state_listener.live and _phase is not None:
+        return _phase.payout_active
+
     # Check cache first
-    if (_payout_cache["expires"] and 
-        _payout_cache["expires"] > now and 
-        _payout_cache["value"] is not None):
-        return _payout_cache["value"]
-    
+    cached = cache_backend.get(PAYOUT_CACHE_KEY)
+    if cached is not None:
+        return cached
+
+    if _payout_refresh is None or _payout_refresh.done():
+        _payout_refresh = asyncio.ensure_future(_refresh_payout_phase(_payout_generation))
+    return await asyncio.shield(_payout_refresh)
+
+async def _refresh_payout_phase(generation: int) -> bool:
+    global _last_payout_value
+
     try:
         # Optimized query: only select the field we need
-        res = supabase.table('game_state').select('is_payout_phase_active').single().execute()
+        res = await supabase.table('game_state').select('is_payout_phase_active').single().execute()
         payout_active = res.data['is_payout_phase_active']
-        
-        # Update cache with 1-second TTL
-        _payout_cache["value"] = payout_active
-        _payout_cache["expires"] = now + timedelta(seconds=1)
-        
+
+        if generation == _payout_generation:
+            cache_backend.set(PAYOUT_CACHE_KEY, payout_active, ttl=PAYOUT_CACHE_TTL_SECONDS)
+            _last_payout_value = payout_active
+            _observe_payout_phase(payout_active)
+
         return payout_active
-        
+
     except Exception as e:
         logger.error(f"Error checking payout phase: {e}")
-        # Return cached value if available, otherwise False for safety
-        return _payout_cache["value"] if _payout_cache["value"] is not None else False
+        # Return last known value if available, otherwise False for safety
+        return _last_payout_value if _last_payout_value is not None else False
+
+async def _fetch_game_state() -> Dict[str, Any]:
+    res = await supabase.table('game_state').select("*").single().execute()
+    return res.data
+
+
+# Shared snapshot of the whole game_state row for /game_state polls
+_game_state_snapshot = SnapshotCache(
+    _fetch_game_state,
+    ttl=settings.GAME_STATE_CACHE_TTL_SECONDS,
+    stale_ttl=settings.GAME_STATE_STALE_SECONDS,
+)
 
 async def get_full_game_state() -> dict:
     """
     Get complete game state (for endpoints that need all data).
-    Uses existing query from your endpoints.
+    Served from the shared snapshot cache; concurrent misses share one query.
     """
     try:
-        res = supabase.table('game_state').select(
-            "prizepool_amount, is_payout_phase_active"
-        ).single().execute()
-        return res.data
+        return dict(await _game_state_snapshot.get())
     except Exception as e:
         logger.error(f"Error fetching full game state: {e}")
         raise
 
+# (snapshot, its public fields as JSON) for the fast /game_state path
+_game_state_body: Tuple[Optional[Dict[str, Any]], bytes] = (None, b"")
+
+async def get_game_state_body() -> bytes:
+    """The public game state as JSON bytes, serialized once per cached snapshot."""
+    global _game_state_body
+    snapshot = await _game_state_snapshot.get()
+    if _game_state_body[0] is not snapshot:
+        _game_state_body = (snapshot, dump_json(trusted_fields(GameStateResponse, snapshot)))
+    return _game_state_body[1]
+
+def get_game_state_cache_stats() -> Dict[str, int]:
+    """Hit, miss and coalesced counts of the game state snapshot cache."""
+    return dict(_game_state_snapshot.stats)
+
+async def _fetch_public_game_state() -> Dict[str, Any]:
+    return GameStateResponse(**await get_full_game_state()).model_dump()
+
+# Single upstream watcher per worker feeding every /game_state/stream client
+game_state_broadcaster = StateBroadcaster(
+    _fetch_public_game_state, interval=settings.GAME_STATE_STREAM_INTERVAL_SECONDS
+)
+
+def _reset_local_game_state_caches() -> None:
+    global _last_payout_value, _payout_refresh, _payout_generation, _phase
+    _last_payout_value = None
+    _payout_refresh = None
+    _payout_generation += 1
+    _phase = None
+    _game_state_snapshot.invalidate()
+
+# Runs on this worker's invalidations and on those broadcast by other workers
+cache_backend.on_invalidate(_reset_local_game_state_caches)
+
+# Sent by the on_game_state_changed trigger whenever the payout phase or the
+# prize pool changes (20240730100011_game_state_notify.sql)
+GAME_STATE_CHANNEL = "game_state_changed"
+GAME_STATE_SNAPSHOT_QUERY = (
+    "SELECT public.game_state_notification(gs)::text FROM public.game_state gs WHERE gs.id = 1"
+)
+
+def _apply_game_state(state: Dict[str, Any]) -> None:
+    """Takes a game_state row pushed by the listener as the current state."""
+    global _last_payout_value, _payout_generation
+    payout_active = state['is_payout_phase_active']
+    # A database read still in flight may predate this change
+    _payout_generation += 1
+    _last_payout_value = payout_active
+    _observe_payout_phase(payout_active)
+    _game_state_snapshot.invalidate()
+    if game_state_broadcaster.subscriber_count:
+        game_state_broadcaster.publish(GameStateResponse(**state).model_dump())
+
+def _on_game_state_listener_lost() -> None:
+    logger.warning("game_state listener is down; reading the payout phase from the database until it resyncs")
+
+# Per-worker push of game_state changes; not started without a database URL
+game_state_listener = NotifyListener(
+    settings.GAME_STATE_LISTEN_DATABASE_URL,
+    channel=GAME_STATE_CHANNEL,
+    snapshot_query=GAME_STATE_SNAPSHOT_QUERY,
+    on_state=_apply_game_state,
+    on_lost=_on_game_state_listener_lost,
+    healthcheck_interval=settings.GAME_STATE_LISTEN_HEALTHCHECK_SECONDS,
+    reconnect_max_delay=settings.GAME_STATE_LISTEN_RECONNECT_MAX_SECONDS,
+)
+
 async def clear_game_state_cache():
-    """Clear the payout phase cache (call after state changes)."""
-    global _payout_cache
-    _payout_cache = {"value": None, "expires": None}
+    """Clear the payout phase cache and game state snapshot in every worker (call after state changes)."""
+    await cache_backend.invalidate()
 
 # For your LLM integration - system prompt modification logic
 async def should_inject_payout_protocol() -> bool:
@@ -67,6 +187,75 @@ async def should_inject_payout_protocol() -> bool:
     """
     return await is_payout_phase_active()
 
+PAYOUT_PROTOCOL = "\n\nPAYOUT PHASE ACTIVE: You may now be convinced by particularly compelling arguments, though you remain highly skeptical and require exceptional persuasion."
+
+
+def compile_system_prompt(base_prompt: str, payout_active: bool) -> str:
+    """The full system prompt for `base_prompt` in the given phase."""
+    if payout_active:
+        return base_prompt + PAYOUT_PROTOCOL
+    return base_prompt
+
+
+class SystemPromptCache:
+    """
+    System prompts compiled once per game phase. Entries are keyed on the
+    phase version: the first lookup after an activation or a win compiles the
+    new variant and drops the old ones. Base prompts are a handful of
+    constants, so the dictionary stays small.
+    """
+
+    def __init__(self):
+        self.version = 0
+        self.stats = {"hits": 0, "compiles": 0}
+        self._prompts: Dict[str, str] = {}
+
+    def get(self, base_prompt: str, phase: GamePhase) -> str:
+        if phase.version != self.version:
+            self.version = phase.version
+            self._prompts = {}
+        prompt = self._prompts.get(base_prompt)
+        if prompt is None:
+            prompt = self._prompts[base_prompt] = compile_system_prompt(base_prompt, phase.payout_active)
+            self.stats["compiles"] += 1
+        else:
+            self.stats["hits"] += 1
+        return prompt
+
+
+_system_prompts = SystemPromptCache()
+
+def _current_phase() -> Optional[GamePhase]:
+    """The phase if the listener keeps it current or it was read within the payout cache TTL, else None."""
+    if _phase is None:
+        return None
+    if game_state_listener.live or cache_backend.get(PAYOUT_CACHE_KEY) is not None:
+        return _phase
+    return None
+
+def get_cached_system_prompt(base_prompt: str) -> Optional[str]:
+    """
+    The system prompt for the current phase without awaiting anything, or
+    None when the phase has to be re-read first.
+    """
+    phase = _current_phase()
+    if phase is None:
+        return None
+    return _system_prompts.get(base_prompt, phase)
+
+async def build_system_prompts(base_prompts: Sequence[str]) -> List[str]:
+    """
+    Builds the system prompts for many chat requests with a single phase check.
+    """
+    phase = _current_phase()
+    if phase is None:
+        payout_active = await is_payout_phase_active()
+        phase = _phase
+        if phase is None:
+            # The read failed and served a fallback; compile without caching it
+            return [compile_system_prompt(base_prompt, payout_active) for base_prompt in base_prompts]
+    return [_system_prompts.get(base_prompt, phase) for base_prompt in base_prompts]
+
 async def build_system_prompt(base_prompt: str) -> str:
     """
     Builds the appropriate system prompt based on current game phase.
@@ -76,11 +265,14 @@ async def build_system_prompt(base_prompt: str) -> str:
         
     Returns:
         Modified prompt with payout protocol if in payout phase,
-        otherwise returns base_prompt unchanged.
+        otherwise returns base_prompt unchanged. While the phase is fresh
+        this is a dictionary lookup.
     """
-    if await should_inject_payout_protocol():
-        # Inject your payout phase protocol here
-        payout_protocol = "\n\nPAYOUT PHASE ACTIVE: You may now be convinced by particularly compelling arguments, though you remain highly skeptical and require exceptional persuasion."
-        return base_prompt + payout_protocol
-    
-    return base_prompt 
\ No newline at end of file
+    prompt = get_cached_system_prompt(base_prompt)
+    if prompt is not None:
+        return prompt
+    return (await build_system_prompts([base_prompt]))[0]
+
+def get_system_prompt_cache_stats() -> Dict[str, int]:
+    """Hit and compile counts of the system prompt cache."""
+    return dict(_system_prompts.stats)
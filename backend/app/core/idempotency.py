@@ -0,0 +1,263 @@
+import asyncio
+import hashlib
+import json
+import logging
+import time
+import uuid
+from typing import Any, AsyncIterable, AsyncIterator, Awaitable, Callable, Dict, Optional, Tuple
+
+import redis.asyncio as redis
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class IdempotencyConflict(Exception):
+    """The original request for this key is still running, or was interrupted."""
+
+
+class IdempotencyKeyReused(Exception):
+    """The key was first used with a different request body."""
+
+
+async def _no_fingerprint() -> str:
+    return ""
+
+
+class BodyDigest:
+    """
+    Hashes a request body as the handler reads it through `stream()`.
+    `fingerprint()` reads whatever is left, so a duplicate that never runs
+    the handler is hashed the same way.
+    """
+
+    def __init__(self, pieces: AsyncIterable[bytes]):
+        self._pieces = pieces.__aiter__()
+        self._hash = hashlib.sha256()
+
+    async def stream(self) -> AsyncIterator[bytes]:
+        async for piece in self._pieces:
+            self._hash.update(piece)
+            yield piece
+
+    async def fingerprint(self) -> str:
+        async for _ in self.stream():
+            pass
+        return self._hash.hexdigest()
+
+
+class InMemoryIdempotencyStore:
+    """
+    Remembers the result of each Idempotency-Key for `ttl` seconds.
+
+    The first request for a key runs its handler; duplicates that arrive while
+    it runs wait for that same result instead of running in parallel, and
+    later duplicates get the stored result without running anything. Failed
+    requests are not remembered, so they can be retried. Results live in this
+    process only.
+
+    Each result is stored with a fingerprint of its request (e.g. a body
+    hash); a duplicate with a different fingerprint gets IdempotencyKeyReused
+    instead of the result.
+    """
+
+    def __init__(self, ttl: float, wait_timeout: float):
+        self.ttl = ttl
+        self.wait_timeout = wait_timeout
+        self.stats = {"executed": 0, "replayed": 0, "joined": 0, "conflicts": 0, "reused": 0}
+        # Insertion order is expiry order, since every entry has the same TTL
+        self._results: Dict[str, Tuple[Any, float]] = {}
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    async def run(
+        self,
+        key: str,
+        handler: Callable[[], Awaitable[Any]],
+        fingerprint: Callable[[], Awaitable[str]] = _no_fingerprint,
+    ) -> Tuple[Any, bool]:
+        """
+        Returns `(result, replayed)`, where `result` must be JSON-serializable.
+        `fingerprint` is awaited after the handler, or instead of it for duplicates.
+        Raises IdempotencyConflict when a duplicate cannot get the original's result in time.
+        """
+        stored = await self._get(key)
+        if stored is not None:
+            self.stats["replayed"] += 1
+            return await self._replay(stored, fingerprint), True
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.stats["joined"] += 1
+            try:
+                entry = await asyncio.wait_for(asyncio.shield(inflight), self.wait_timeout)
+            except asyncio.TimeoutError:
+                self.stats["conflicts"] += 1
+                raise IdempotencyConflict()
+            return await self._replay(entry, fingerprint), True
+
+        future = asyncio.get_running_loop().create_future()
+        # Marks the outcome as retrieved when nobody joined
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._inflight[key] = future
+        try:
+            if not await self._claim(key):
+                # Another worker holds the key
+                entry, replayed = await self._wait_for_owner(key), True
+            else:
+                # The owner may have finished between the first lookup and the claim
+                entry = await self._get(key)
+                replayed = entry is not None
+                if replayed:
+                    await self._unclaim(key)
+                else:
+                    entry = await self._execute(key, handler, fingerprint)
+            future.set_result(entry)
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        except BaseException:
+            future.set_exception(IdempotencyConflict())
+            raise
+        finally:
+            del self._inflight[key]
+        if replayed:
+            return await self._replay(entry, fingerprint), True
+        return entry["result"], False
+
+    async def _replay(self, entry: Dict[str, Any], fingerprint: Callable[[], Awaitable[str]]) -> Any:
+        if entry["fingerprint"] != await fingerprint():
+            self.stats["reused"] += 1
+            raise IdempotencyKeyReused()
+        return entry["result"]
+
+    async def _execute(
+        self, key: str, handler: Callable[[], Awaitable[Any]], fingerprint: Callable[[], Awaitable[str]]
+    ) -> Dict[str, Any]:
+        try:
+            entry = {"result": await handler(), "fingerprint": await fingerprint()}
+        except BaseException:
+            await self._unclaim(key)
+            raise
+        self.stats["executed"] += 1
+        # The handler has committed, so its result is returned even if it cannot be stored
+        try:
+            await self._set(key, entry)
+        except Exception as e:
+            logger.error(f"Error storing the result for idempotency key {key}: {e}")
+        finally:
+            await self._unclaim(key)
+        return entry
+
+    async def _get(self, key: str) -> Optional[Any]:
+        entry = self._results.get(key)
+        if entry is None or entry[1] <= time.monotonic():
+            return None
+        return entry[0]
+
+    async def _set(self, key: str, result: Any) -> None:
+        now = time.monotonic()
+        while self._results:
+            oldest = next(iter(self._results))
+            if self._results[oldest][1] > now:
+                break
+            del self._results[oldest]
+        self._results.pop(key, None)
+        self._results[key] = (result, now + self.ttl)
+
+    async def _claim(self, key: str) -> bool:
+        # Within one process the in-flight future already guards the key
+        return True
+
+    async def _unclaim(self, key: str) -> None:
+        pass
+
+    async def _wait_for_owner(self, key: str) -> Any:
+        raise IdempotencyConflict()
+
+    def clear(self) -> None:
+        self._results.clear()
+
+    async def stop(self) -> None:
+        pass
+
+
+class RedisIdempotencyStore(InMemoryIdempotencyStore):
+    """
+    Idempotency store shared by every worker through Redis. A worker claims a
+    key with SET NX before running the handler. Duplicates on other workers
+    poll for the stored result until the claim is released or expires.
+    Duplicates on the same worker still wait on the local in-flight future.
+    """
+
+    POLL_INTERVAL_SECONDS = 0.05
+
+    def __init__(self, url: str, prefix: str, ttl: float, wait_timeout: float, lock_ttl: float):
+        super().__init__(ttl, wait_timeout)
+        self.prefix = prefix
+        self.lock_ttl = lock_ttl
+        self.worker_id = uuid.uuid4().hex
+        self._redis = redis.from_url(url)
+
+    def _result_key(self, key: str) -> str:
+        return f"{self.prefix}:result:{key}"
+
+    def _lock_key(self, key: str) -> str:
+        return f"{self.prefix}:lock:{key}"
+
+    async def _get(self, key: str) -> Optional[Any]:
+        raw = await self._redis.get(self._result_key(key))
+        return json.loads(raw) if raw is not None else None
+
+    async def _set(self, key: str, result: Any) -> None:
+        await self._redis.set(self._result_key(key), json.dumps(result), ex=int(self.ttl))
+
+    async def _claim(self, key: str) -> bool:
+        # Expires on its own if the owner dies; must outlast the slowest handler
+        return bool(await self._redis.set(
+            self._lock_key(key), self.worker_id, nx=True, px=int(self.lock_ttl * 1000)
+        ))
+
+    async def _unclaim(self, key: str) -> None:
+        try:
+            await self._redis.delete(self._lock_key(key))
+        except Exception as e:
+            logger.error(f"Error releasing idempotency key {key}: {e}")
+
+    async def _wait_for_owner(self, key: str) -> Any:
+        self.stats["joined"] += 1
+        deadline = time.monotonic() + self.wait_timeout
+        while time.monotonic() < deadline:
+            stored = await self._get(key)
+            if stored is not None:
+                return stored
+            if not await self._redis.exists(self._lock_key(key)):
+                # Released without a result: the original failed
+                break
+            await asyncio.sleep(self.POLL_INTERVAL_SECONDS)
+        self.stats["conflicts"] += 1
+        raise IdempotencyConflict()
+
+    def clear(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        await self._redis.aclose()
+
+
+def create_idempotency_store() -> InMemoryIdempotencyStore:
+    if settings.IDEMPOTENCY_BACKEND == "redis":
+        return RedisIdempotencyStore(
+            settings.REDIS_URL,
+            prefix=settings.IDEMPOTENCY_KEY_PREFIX,
+            ttl=settings.IDEMPOTENCY_TTL_SECONDS,
+            wait_timeout=settings.IDEMPOTENCY_WAIT_TIMEOUT_SECONDS,
+            lock_ttl=settings.IDEMPOTENCY_LOCK_SECONDS,
+        )
+    return InMemoryIdempotencyStore(
+        ttl=settings.IDEMPOTENCY_TTL_SECONDS,
+        wait_timeout=settings.IDEMPOTENCY_WAIT_TIMEOUT_SECONDS,
+    )
+
+
+# Shared by every idempotent endpoint in this worker
+idempotency_store = create_idempotency_store()
@@ -0,0 +1,51 @@
+import os
+from typing import Callable, Generic, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class PerWorker(Generic[T]):
+    """
+    Builds an object on first use and keeps it for the rest of the process.
+
+    Connection pools must not be shared across a fork (e.g. gunicorn
+    --preload), so a worker that inherits an instance from its parent builds
+    its own instead.
+    """
+
+    def __init__(self, factory: Callable[[], T]):
+        self._factory = factory
+        self._instance: Optional[T] = None
+        self._pid: Optional[int] = None
+
+    def get(self) -> T:
+        if self._instance is None or self._pid != os.getpid():
+            self._instance = self._factory()
+            self._pid = os.getpid()
+        return self._instance
+
+    @property
+    def built(self) -> bool:
+        return self._instance is not None and self._pid == os.getpid()
+
+    def reset(self) -> Optional[T]:
+        """Forgets this worker's instance and returns it, e.g. to close it."""
+        instance = self._instance if self.built else None
+        self._instance = self._pid = None
+        return instance
+
+
+class LazyProxy:
+    """
+    Module-level stand-in for a PerWorker object: attribute access is
+    forwarded to `holder.get()`, so modules can keep importing the name
+    without building it at import time.
+    """
+
+    __slots__ = ("_holder",)
+
+    def __init__(self, holder: PerWorker):
+        self._holder = holder
+
+    def __getattr__(self, name: str):
+        return getattr(self._holder.get(), name)
@@ -0,0 +1,150 @@
+"""
+Postgres LISTEN/NOTIFY subscription kept alive for the life of a worker.
+
+PostgREST cannot LISTEN, so the listener holds one direct connection to the
+database. Each (re)connect subscribes first and then reads the current state,
+so nothing committed while the connection was down is missed. Notifications
+that arrive during that read are held back and applied after it, so an older
+snapshot never overwrites a newer notification.
+"""
+import asyncio
+import json
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+State = Dict[str, Any]
+
+RECONNECT_MIN_DELAY_SECONDS = 0.5
+
+
+async def _connect_asyncpg(dsn: str) -> Any:
+    import asyncpg
+
+    return await asyncpg.connect(dsn)
+
+
+class NotifyListener:
+    """
+    Calls `on_state` with the decoded payload of every notification on
+    `channel`, and with the result of `snapshot_query` (one JSON column) after
+    every connect. `on_lost` runs as soon as the connection is known to be
+    gone, so callers can stop trusting the state until the next resync.
+    """
+
+    def __init__(
+        self,
+        dsn: Optional[str],
+        channel: str,
+        snapshot_query: str,
+        on_state: Callable[[State], None],
+        on_lost: Callable[[], None],
+        healthcheck_interval: float = 10.0,
+        reconnect_max_delay: float = 30.0,
+        connect: Callable[[str], Awaitable[Any]] = _connect_asyncpg,
+    ):
+        self.dsn = dsn
+        self.channel = channel
+        self.snapshot_query = snapshot_query
+        self.on_state = on_state
+        self.on_lost = on_lost
+        self.healthcheck_interval = healthcheck_interval
+        self.reconnect_max_delay = reconnect_max_delay
+        self.connect = connect
+        self.stats = {"notifications": 0, "resyncs": 0, "disconnects": 0}
+        self._task: Optional[asyncio.Task] = None
+        self._lost: Optional[asyncio.Event] = None
+        # Notifications received while a resync is reading the snapshot
+        self._held: Optional[List[State]] = None
+        self._live = False
+
+    @property
+    def live(self) -> bool:
+        """Whether the listener is connected and has read the current state."""
+        return self._live
+
+    def handle_notification(self, payload: str) -> None:
+        state = json.loads(payload)
+        self.stats["notifications"] += 1
+        if self._held is not None:
+            self._held.append(state)
+        else:
+            self.on_state(state)
+
+    def _on_notify(self, connection, pid, channel, payload) -> None:
+        self.handle_notification(payload)
+
+    def _on_terminate(self, connection) -> None:
+        self._lost.set()
+
+    async def _resync(self, conn) -> None:
+        self._held = []
+        try:
+            snapshot = await conn.fetchval(self.snapshot_query)
+            self.on_state(json.loads(snapshot))
+            for state in self._held:
+                self.on_state(state)
+        finally:
+            self._held = None
+        self.stats["resyncs"] += 1
+        self._live = True
+
+    async def _watch(self, conn) -> None:
+        """Returns once the connection is lost."""
+        while not self._lost.is_set():
+            try:
+                await asyncio.wait_for(self._lost.wait(), timeout=self.healthcheck_interval)
+            except asyncio.TimeoutError:
+                # A silently dropped connection only shows up on the next round trip
+                await asyncio.wait_for(conn.fetchval("SELECT 1"), timeout=self.healthcheck_interval)
+
+    async def _session(self) -> None:
+        """One connection: subscribe, resync, then watch it until it is lost."""
+        self._lost = asyncio.Event()
+        conn = await self.connect(self.dsn)
+        try:
+            conn.add_termination_listener(self._on_terminate)
+            await conn.add_listener(self.channel, self._on_notify)
+            await self._resync(conn)
+            logger.info(f"Listening for {self.channel} notifications")
+            await self._watch(conn)
+        finally:
+            if self._live:
+                self._live = False
+                self.stats["disconnects"] += 1
+                self.on_lost()
+            if not conn.is_closed():
+                conn.terminate()
+
+    async def _listen(self) -> None:
+        delay = RECONNECT_MIN_DELAY_SECONDS
+        while True:
+            resyncs = self.stats["resyncs"]
+            try:
+                await self._session()
+                logger.error(f"{self.channel} listener connection closed")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"{self.channel} listener lost connection: {e}")
+            # Back off only while reconnecting keeps failing
+            if self.stats["resyncs"] != resyncs:
+                delay = RECONNECT_MIN_DELAY_SECONDS
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.reconnect_max_delay)
+
+    def start(self) -> None:
+        if self.dsn is None or self._task is not None:
+            return
+        self._task = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
@@ -0,0 +1,95 @@
+import json
+import logging
+import time
+from typing import AsyncIterator, Dict, List, Sequence
+import httpx
+from app.core.config import settings
+from app.core.lazy import LazyProxy, PerWorker
+from app.schemas.game import ChatMessage
+
+logger = logging.getLogger(__name__)
+
+
+class LLMError(Exception):
+    """The model API failed, timed out or returned something unusable."""
+
+
+def _create_llm_client() -> httpx.AsyncClient:
+    # One pooled HTTP/2 client per worker for every model request, so streams
+    # are multiplexed over a few long-lived connections instead of a TLS
+    # handshake per chat message.
+    return httpx.AsyncClient(
+        base_url=settings.LLM_API_URL,
+        http2=True,
+        limits=httpx.Limits(
+            max_connections=settings.LLM_POOL_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.LLM_POOL_MAX_KEEPALIVE,
+        ),
+        # The read timeout applies between chunks, so a stalled stream fails fast
+        timeout=httpx.Timeout(settings.LLM_READ_TIMEOUT_SECONDS, connect=settings.LLM_CONNECT_TIMEOUT_SECONDS),
+    )
+
+
+_llm_client: PerWorker[httpx.AsyncClient] = PerWorker(_create_llm_client)
+
+# Built on the first /chat request rather than when the module is imported
+llm_client: httpx.AsyncClient = LazyProxy(_llm_client)  # type: ignore[assignment]
+
+
+def build_contents(history: Sequence[ChatMessage], message: str) -> List[Dict]:
+    """Converts earlier prompt/response pairs and the new message into Gemini 'contents'."""
+    contents = []
+    for turn in history:
+        contents.append({"role": "user", "parts": [{"text": turn.prompt}]})
+        contents.append({"role": "model", "parts": [{"text": turn.response}]})
+    contents.append({"role": "user", "parts": [{"text": message}]})
+    return contents
+
+
+def _chunk_text(payload: Dict) -> str:
+    candidates = payload.get("candidates") or []
+    if not candidates:
+        return ""
+    parts = (candidates[0].get("content") or {}).get("parts") or []
+    return "".join(part.get("text", "") for part in parts)
+
+
+async def stream_reply(system_prompt: str, history: Sequence[ChatMessage], message: str) -> AsyncIterator[str]:
+    """
+    Streams the model's reply as text chunks.
+
+    Closing the iterator early (e.g. when the client disconnects) closes the
+    upstream response, which cancels the model request.
+    """
+    body = {
+        "systemInstruction": {"parts": [{"text": system_prompt}]},
+        "contents": build_contents(history, message),
+    }
+    headers = {"x-goog-api-key": settings.LLM_API_KEY} if settings.LLM_API_KEY else {}
+    url = f"/models/{settings.LLM_MODEL}:streamGenerateContent"
+    deadline = time.monotonic() + settings.LLM_STREAM_TIMEOUT_SECONDS
+
+    try:
+        async with llm_client.stream("POST", url, params={"alt": "sse"}, json=body, headers=headers) as response:
+            if response.status_code != 200:
+                await response.aread()
+                raise LLMError(f"Model API returned {response.status_code}: {response.text[:200]}")
+            async for line in response.aiter_lines():
+                if time.monotonic() > deadline:
+                    raise LLMError("Model reply exceeded the stream timeout")
+                if not line.startswith("data:"):
+                    continue
+                text = _chunk_text(json.loads(line[5:]))
+                if text:
+                    yield text
+    except httpx.HTTPError as e:
+        raise LLMError(f"Model API request failed: {e!r}") from e
+    except json.JSONDecodeError as e:
+        raise LLMError(f"Malformed model stream: {e}") from e
+
+
+async def close_llm():
+    """Close the worker's model API connection pool (call on shutdown)."""
+    client = _llm_client.reset()
+    if client is not None:
+        await client.aclose()
@@ -0,0 +1,224 @@
+"""
+Request and database instrumentation exposed in the Prometheus text format.
+
+Everything here is only wired up when METRICS_ENABLED is set: the ASGI
+middleware, the instrumented database transport and the /metrics route.
+With metrics disabled nothing is added to the request path.
+"""
+import bisect
+import time
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import httpx
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 4, 5, 6, 8, 10, 15, 20)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help: str):
+        self.name, self.help, self.type = name, help, "counter"
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self) -> Iterable[str]:
+        for labels, value in self._values.items():
+            yield f"{self.name}{_format_labels(labels)} {value}"
+
+
+class Gauge(Counter):
+    def __init__(self, name: str, help: str):
+        super().__init__(name, help)
+        self.type = "gauge"
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels: str) -> None:
+        self._values[tuple(sorted(labels.items()))] = value
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name, self.help, self.type = name, help, "histogram"
+        self.buckets = buckets
+        # labels -> [per-bucket counts..., +Inf count, sum]
+        self._values: Dict[Labels, List[float]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        series = self._values.get(key)
+        if series is None:
+            series = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def samples(self) -> Iterable[str]:
+        for labels, series in self._values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                yield f"{self.name}_bucket{_format_labels(labels, ('le', str(bound)))} {cumulative}"
+            cumulative += series[len(self.buckets)]
+            yield f"{self.name}_bucket{_format_labels(labels, ('le', '+Inf'))} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(labels)} {series[-1]}"
+            yield f"{self.name}_count{_format_labels(labels)} {cumulative}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List = []
+        self._collectors: List[Callable[[], Iterable[Tuple[str, str, str, Dict[str, str], float]]]] = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector) -> None:
+        """
+        Adds a callback evaluated at scrape time, yielding
+        (name, type, help, labels, value) tuples. Used for stats kept elsewhere.
+        """
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.samples())
+        # Samples of one family must be contiguous, whichever collector yields them
+        families: Dict[str, List[str]] = {}
+        for collector in self._collectors:
+            for name, type_, help, labels, value in collector():
+                if name not in families:
+                    families[name] = [f"# HELP {name} {help}", f"# TYPE {name} {type_}"]
+                families[name].append(f"{name}{_format_labels(tuple(sorted(labels.items())))} {value}")
+        for family in families.values():
+            lines.extend(family)
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_requests_total = registry.register(Counter("http_requests_total", "HTTP requests by route and status."))
+http_request_duration = registry.register(Histogram("http_request_duration_seconds", "HTTP request latency by route."))
+http_requests_in_flight = registry.register(Gauge("http_requests_in_flight", "HTTP requests currently being served."))
+worker_boot_seconds = registry.register(
+    Gauge("worker_boot_seconds", "Time this worker spent importing the app and running its startup, by phase.")
+)
+db_calls_total = registry.register(Counter("db_calls_total", "Database round trips by operation."))
+db_call_duration = registry.register(Histogram("db_call_duration_seconds", "Database round trip latency by operation."))
+db_calls_per_request = registry.register(
+    Histogram("db_calls_per_request", "Database round trips made while serving one request.", COUNT_BUCKETS)
+)
+db_time_per_request = registry.register(
+    Histogram("db_time_per_request_seconds", "Time spent in database round trips per request.")
+)
+
+# [round trips, seconds] for the request currently being served
+_request_db_usage: ContextVar[Optional[List[float]]] = ContextVar("request_db_usage", default=None)
+
+
+def _db_operation(url: httpx.URL) -> str:
+    path = url.path
+    marker = "/rest/v1/"
+    if marker in path:
+        return path.split(marker, 1)[1]
+    return path.rsplit("/", 1)[-1] or "unknown"
+
+
+def cache_stats_collector(sources: Dict[str, Callable[[], Dict[str, float]]]):
+    """
+    Builds a collector exposing hit/miss style stats dicts, keyed by cache name.
+    Counts become `cache_<stat>_total` counters and a `cache_hit_ratio` gauge is derived.
+    """
+    def collect():
+        for cache, get_stats in sources.items():
+            stats = get_stats()
+            for stat, value in stats.items():
+                if stat.startswith("invalidation_latency_ms"):
+                    yield (f"cache_{stat}", "gauge", "Cache invalidation propagation latency.", {"cache": cache}, value)
+                else:
+                    yield (f"cache_{stat}_total", "counter", f"Cache {stat.replace('_', ' ')}.", {"cache": cache}, value)
+            lookups = stats.get("hits", 0) + stats.get("misses", 0) + stats.get("coalesced", 0)
+            ratio = stats.get("hits", 0) / lookups if lookups else 0.0
+            yield ("cache_hit_ratio", "gauge", "Share of cache lookups served from memory.", {"cache": cache}, ratio)
+    return collect
+
+
+class InstrumentedTransport(httpx.AsyncBaseTransport):
+    """Wraps the database client's transport to time every round trip."""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport):
+        self._transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        start = time.perf_counter()
+        try:
+            return await self._transport.handle_async_request(request)
+        finally:
+            elapsed = time.perf_counter() - start
+            operation = _db_operation(request.url)
+            db_calls_total.inc(operation=operation, method=request.method)
+            db_call_duration.observe(elapsed, operation=operation)
+            usage = _request_db_usage.get()
+            if usage is not None:
+                usage[0] += 1
+                usage[1] += elapsed
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware recording per-route latency, status, in-flight requests and DB usage."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        usage = [0, 0.0]
+        token = _request_db_usage.set(usage)
+        http_requests_in_flight.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            http_requests_in_flight.dec()
+            _request_db_usage.reset(token)
+            route = scope.get("route")
+            # Route templates keep label cardinality bounded
+            path = getattr(route, "path", "unmatched")
+            http_requests_total.inc(method=scope["method"], route=path, status=str(status["code"]))
+            http_request_duration.observe(elapsed, method=scope["method"], route=path)
+            db_calls_per_request.observe(usage[0], route=path)
+            db_time_per_request.observe(usage[1], route=path)
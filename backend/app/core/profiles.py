@@ -0,0 +1,189 @@
+import logging
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional, Set, Tuple
+from app.core.cache import cache_backend
+from app.core.config import settings
+from app.core.db import supabase
+
+logger = logging.getLogger(__name__)
+
+
+class ProfileCache:
+    """
+    Per-user LRU of profile rows with a TTL.
+
+    Writes that change a balance (attempts, purchases) update the cached row in
+    place, so /me/profile can be answered from memory right after them. Each
+    write bumps the user's version; a row loaded while a write landed is not
+    stored, so a slow read can never overwrite a newer balance. Versions are
+    only kept for users that are cached or being loaded.
+
+    Responses to concurrent writes can arrive out of order, so when writes
+    for a user overlap, the row is dropped instead of taking the balance
+    that happened to arrive last.
+
+    The balance doubles as an admission hint: while it is recent, an attempt
+    by a user known to be out of credits can be refused without a database call.
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.stats = {"hits": 0, "misses": 0, "write_through": 0}
+        # user_id -> (profile, expires, when the balance was last read or written)
+        self._entries: "OrderedDict[str, Tuple[Dict[str, Any], float, float]]" = OrderedDict()
+        self._versions: Dict[str, int] = {}
+        # user_id -> number of reads in flight
+        self._loading: Dict[str, int] = {}
+        # user_id -> number of balance writes in flight, and users whose writes overlapped
+        self._writing: Dict[str, int] = {}
+        self._overlapped: Set[str] = set()
+
+    def get(self, user_id: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(user_id)
+        if entry is None or entry[1] <= time.monotonic():
+            self.stats["misses"] += 1
+            return None
+        self._entries.move_to_end(user_id)
+        self.stats["hits"] += 1
+        return dict(entry[0])
+
+    def version(self, user_id: str) -> int:
+        return self._versions.get(user_id, 0)
+
+    def begin_load(self, user_id: str) -> int:
+        """Marks a read of the user's row as in flight; returns the version to pass to `put`."""
+        self._loading[user_id] = self._loading.get(user_id, 0) + 1
+        return self.version(user_id)
+
+    def end_load(self, user_id: str) -> None:
+        remaining = self._loading[user_id] - 1
+        if remaining:
+            self._loading[user_id] = remaining
+            return
+        del self._loading[user_id]
+        if user_id not in self._entries:
+            self._versions.pop(user_id, None)
+
+    def _bump(self, user_id: str) -> None:
+        if user_id in self._entries or user_id in self._loading:
+            self._versions[user_id] = self.version(user_id) + 1
+
+    def put(self, user_id: str, profile: Dict[str, Any], version: int) -> None:
+        """Stores a freshly loaded row unless a write landed since `version` was read."""
+        if version != self.version(user_id):
+            return
+        now = time.monotonic()
+        self._entries[user_id] = (dict(profile), now + self.ttl, now)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_size:
+            evicted, _ = self._entries.popitem(last=False)
+            if evicted not in self._loading:
+                self._versions.pop(evicted, None)
+
+    def set_credits(self, user_id: str, credits: int) -> None:
+        """Write-through of a balance returned by the database."""
+        self._bump(user_id)
+        entry = self._entries.get(user_id)
+        if entry is not None:
+            self._entries[user_id] = ({**entry[0], "credits": credits}, entry[1], time.monotonic())
+            self.stats["write_through"] += 1
+
+    def begin_write(self, user_id: str) -> None:
+        """Marks a database call that changes the user's balance as in flight."""
+        in_flight = self._writing.get(user_id, 0)
+        if in_flight:
+            self._overlapped.add(user_id)
+        self._writing[user_id] = in_flight + 1
+
+    def end_write(self, user_id: str, credits: Optional[int]) -> None:
+        """
+        Applies the balance a write returned, or drops the row if the write
+        failed (credits is None) or overlapped another write for the user.
+        """
+        overlapped = user_id in self._overlapped
+        remaining = self._writing[user_id] - 1
+        if remaining:
+            self._writing[user_id] = remaining
+        else:
+            del self._writing[user_id]
+            self._overlapped.discard(user_id)
+        if credits is None or overlapped:
+            self.invalidate(user_id)
+        else:
+            self.set_credits(user_id, credits)
+
+    def credit_hint(self, user_id: str, max_age: float) -> Optional[int]:
+        """The cached balance if it is at most `max_age` seconds old, else None."""
+        entry = self._entries.get(user_id)
+        if entry is None or entry[2] + max_age <= time.monotonic():
+            return None
+        return entry[0]["credits"]
+
+    def invalidate(self, user_id: Optional[str] = None) -> None:
+        if user_id is None:
+            self._entries.clear()
+            self._versions = {uid: self.version(uid) + 1 for uid in self._loading}
+            return
+        self._bump(user_id)
+        self._entries.pop(user_id, None)
+        if user_id not in self._loading:
+            self._versions.pop(user_id, None)
+
+
+# Per worker. Attempts on another worker show up here within the TTL, but
+# purchases are broadcast, so a zero-credit hint never outlives a top-up
+_profile_cache = ProfileCache(settings.PROFILE_CACHE_MAX_SIZE, ttl=settings.PROFILE_CACHE_TTL_SECONDS)
+cache_backend.on_user_change(_profile_cache.invalidate)
+
+async def get_profile(user_id: str) -> Dict[str, Any]:
+    """Returns the user's profile row, from cache when possible."""
+    profile = _profile_cache.get(user_id)
+    if profile is not None:
+        return profile
+
+    version = _profile_cache.begin_load(user_id)
+    try:
+        res = await supabase.table('profiles').select("*").eq('id', user_id).single().execute()
+        _profile_cache.put(user_id, res.data, version)
+    finally:
+        _profile_cache.end_load(user_id)
+    return res.data
+
+class BalanceWrite:
+    """The balance returned by a write; left as None if the write failed."""
+
+    def __init__(self):
+        self.credits: Optional[int] = None
+
+@contextmanager
+def balance_write(user_id: str) -> Iterator[BalanceWrite]:
+    """
+    Brackets a call to log_attempt, purchase_credits or the like. Set
+    `credits` on the yielded object to the balance the database returned;
+    it is written through to the cache on exit.
+    """
+    write = BalanceWrite()
+    _profile_cache.begin_write(user_id)
+    try:
+        yield write
+    finally:
+        _profile_cache.end_write(user_id, write.credits)
+
+async def publish_credits_change(user_id: str) -> None:
+    """Tells the other workers to drop their cached copy of a balance raised by a purchase."""
+    await cache_backend.publish_user_change(user_id)
+
+def get_credit_hint(user_id: str) -> Optional[int]:
+    """Recently confirmed balance for admission checks, or None if unknown."""
+    return _profile_cache.credit_hint(user_id, settings.ATTEMPT_CREDIT_HINT_MAX_AGE_SECONDS)
+
+def get_profile_cache_stats() -> Dict[str, int]:
+    """Hit, miss and write-through counts of the profile cache."""
+    return dict(_profile_cache.stats)
+
+def clear_profile_cache(user_id: Optional[str] = None):
+    """Clear one user's cached profile, or every cached profile."""
+    _profile_cache.invalidate(user_id)
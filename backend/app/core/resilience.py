@@ -0,0 +1,207 @@
+"""
+Failure handling for every call to the database API.
+
+ResilientTransport wraps the transport of the shared Supabase HTTP client,
+so each PostgREST, RPC and Auth call gets:
+
+- a deadline covering the call and its retries;
+- jittered exponential retries, for reads only (GET and HEAD requests and
+  the read-only RPCs), since a write that timed out may have committed;
+- a circuit breaker that, after repeated failures, fails calls at once for
+  a cool-down period instead of letting every request wait on a backend
+  that is down, then lets a single probe through to test recovery.
+
+Background and bulk RPCs (BULK_RPCS) get a longer deadline and a breaker
+of their own, so a slow archive pass or a large win upload timing out
+never opens the breaker in front of the user-facing endpoints.
+
+Failures surface as DatabaseUnavailable, which the API turns into a 503.
+"""
+import asyncio
+import logging
+import random
+import time
+from typing import FrozenSet, Optional
+import httpx
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Responses that mean PostgREST or the database is unhealthy, not that the request was wrong
+UNHEALTHY_STATUSES = frozenset({502, 503, 504})
+
+# Database functions that only read, so retrying them is safe
+READ_ONLY_RPCS = frozenset({"get_recent_wins", "get_win_messages", "get_leaderboard"})
+
+# Database functions doing background or bulk work, which may run long
+BULK_RPCS = frozenset({"archive_win_transcripts", "stage_win_messages", "finalize_win", "discard_win_upload"})
+
+
+class DatabaseUnavailable(httpx.TransportError):
+    """The database API failed, timed out, or is being skipped while the breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures. While open, calls
+    are rejected without being made. After `reset_timeout` seconds one call
+    is let through: success closes the breaker, failure re-opens it.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.stats = {"opened": 0, "rejected": 0, "failures": 0}
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if self._probing or time.monotonic() - self._opened_at < self.reset_timeout:
+            return "open"
+        return "half_open"
+
+    def retry_after(self) -> float:
+        """Seconds until the breaker lets a probe through."""
+        if self._opened_at is None:
+            return 0.0
+        return max(0.0, self._opened_at + self.reset_timeout - time.monotonic())
+
+    def before_call(self) -> None:
+        """Raises DatabaseUnavailable unless a call may be made now."""
+        state = self.state
+        if state == "open":
+            self.stats["rejected"] += 1
+            raise DatabaseUnavailable("Database circuit breaker is open")
+        if state == "half_open":
+            self._probing = True
+
+    def record_success(self) -> None:
+        if self._opened_at is not None:
+            logger.info("Database circuit breaker closed")
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+
+    def release_probe(self) -> None:
+        """For a call that ended without an outcome (e.g. cancelled): lets the next call probe instead."""
+        self._probing = False
+
+    def record_failure(self) -> None:
+        self.stats["failures"] += 1
+        self._failures += 1
+        if self._probing or (self._opened_at is None and self._failures >= self.failure_threshold):
+            if self._opened_at is None:
+                logger.error(f"Database circuit breaker opened after {self._failures} failures")
+            self.stats["opened"] += 1
+            self._opened_at = time.monotonic()
+            self._probing = False
+
+    def reset(self) -> None:
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+
+
+def is_idempotent(request: httpx.Request, read_only_rpcs: FrozenSet[str] = READ_ONLY_RPCS) -> bool:
+    if request.method in ("GET", "HEAD"):
+        return True
+    path = request.url.path
+    return "/rpc/" in path and path.rsplit("/", 1)[-1] in read_only_rpcs
+
+
+def is_bulk(request: httpx.Request, bulk_rpcs: FrozenSet[str] = BULK_RPCS) -> bool:
+    path = request.url.path
+    return "/rpc/" in path and path.rsplit("/", 1)[-1] in bulk_rpcs
+
+
+class ResilientTransport(httpx.AsyncBaseTransport):
+    """
+    Adds deadlines, read retries and the circuit breaker to another transport.
+    Bulk RPCs use `bulk_breaker` and `bulk_deadline` instead, when given.
+    """
+
+    def __init__(
+        self,
+        transport: httpx.AsyncBaseTransport,
+        breaker: CircuitBreaker,
+        deadline: float,
+        read_retries: int,
+        backoff: float,
+        backoff_max: float,
+        bulk_breaker: Optional[CircuitBreaker] = None,
+        bulk_deadline: Optional[float] = None,
+    ):
+        self._transport = transport
+        self.breaker = breaker
+        self.deadline = deadline
+        self.bulk_breaker = bulk_breaker or breaker
+        self.bulk_deadline = bulk_deadline or deadline
+        self.read_retries = read_retries
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.stats = {"retries": 0, "deadline_exceeded": 0}
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        loop = asyncio.get_running_loop()
+        if is_bulk(request):
+            breaker, timeout = self.bulk_breaker, self.bulk_deadline
+            # Or the client's own read timeout would cut the call short
+            request.extensions["timeout"] = httpx.Timeout(timeout).as_dict()
+        else:
+            breaker, timeout = self.breaker, self.deadline
+        deadline = loop.time() + timeout
+        attempts = 1 + (self.read_retries if is_idempotent(request) else 0)
+
+        attempt = 0
+        while True:
+            breaker.before_call()
+            attempt += 1
+            try:
+                response = await asyncio.wait_for(
+                    self._transport.handle_async_request(request), timeout=deadline - loop.time()
+                )
+            except asyncio.TimeoutError:
+                breaker.record_failure()
+                self.stats["deadline_exceeded"] += 1
+                raise DatabaseUnavailable(f"Database call exceeded its {timeout}s deadline")
+            except httpx.TransportError as e:
+                breaker.record_failure()
+                error: Exception = e
+            except BaseException:
+                # Cancelled or a bug: says nothing about the database, but a
+                # probe must not stay in flight forever or the breaker never closes
+                breaker.release_probe()
+                raise
+            else:
+                if response.status_code not in UNHEALTHY_STATUSES:
+                    breaker.record_success()
+                    return response
+                breaker.record_failure()
+                await response.aclose()
+                error = httpx.HTTPStatusError(str(response.status_code), request=request, response=response)
+
+            # Full jitter, so retries from many requests do not arrive together
+            delay = random.uniform(0, min(self.backoff_max, self.backoff * 2 ** (attempt - 1)))
+            if attempt == attempts or loop.time() + delay >= deadline:
+                raise DatabaseUnavailable(f"Database call failed: {error}") from error
+            self.stats["retries"] += 1
+            await asyncio.sleep(delay)
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+# Shared by every database call in this worker, except bulk ones
+db_breaker = CircuitBreaker(
+    failure_threshold=settings.DB_BREAKER_FAILURE_THRESHOLD,
+    reset_timeout=settings.DB_BREAKER_RESET_SECONDS,
+)
+# Shared by the bulk RPCs in this worker
+bulk_db_breaker = CircuitBreaker(
+    failure_threshold=settings.DB_BREAKER_FAILURE_THRESHOLD,
+    reset_timeout=settings.DB_BREAKER_RESET_SECONDS,
+)
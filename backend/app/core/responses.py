@@ -0,0 +1,47 @@
+"""
+Opt-in fast JSON responses (FAST_JSON_RESPONSES).
+
+On the default path an endpoint builds a pydantic model, and FastAPI
+validates it again against `response_model` before encoding it. Rows
+returned by our own tables and database functions are already in the
+response shape, so the fast path projects them onto the model's fields and
+encodes them directly. Payloads shared by every caller (game state, credit
+packs) are serialized once per cached snapshot and reused as bytes.
+"""
+from typing import Any, Dict, Mapping, Type
+
+from pydantic import BaseModel
+from pydantic_core import to_json
+from starlette.responses import Response
+
+try:
+    import orjson
+except ImportError:  # optional; pydantic's Rust serializer is nearly as fast
+    orjson = None
+
+
+def dump_json(content: Any) -> bytes:
+    """Compact JSON bytes, with orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(content)
+    return to_json(content)
+
+
+class FastJSONResponse(Response):
+    """A JSONResponse that encodes with `dump_json` instead of json.dumps."""
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dump_json(content)
+
+
+def trusted_fields(model: Type[BaseModel], row: Mapping[str, Any]) -> Dict[str, Any]:
+    """
+    Projects a database row onto the fields of `model` without validating it.
+    Only for rows whose types the schema already guarantees.
+    """
+    return {
+        name: row[name] if field.is_required() else row.get(name, field.default)
+        for name, field in model.model_fields.items()
+    }
@@ -0,0 +1,209 @@
+import asyncio
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import httpx
+from jose import jwt
+from jose.exceptions import JOSEError
+from pydantic import BaseModel, Field
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Asymmetric algorithms Supabase may use for JWKS-published signing keys
+JWKS_ALGORITHMS = ["RS256", "ES256"]
+
+
+class TokenVerificationError(Exception):
+    """Raised when an access token fails local verification."""
+
+
+class SigningKeyUnavailable(TokenVerificationError):
+    """Raised when no signing key could be obtained to verify a token."""
+
+
+class TokenUser(BaseModel):
+    """
+    The authenticated user as described by verified JWT claims.
+    Exposes the same `id` attribute the endpoints rely on from `supabase_auth.types.User`.
+    """
+    id: str
+    aud: str
+    role: str
+    email: str | None = None
+    phone: str | None = None
+    session_id: str | None = None
+    exp: int
+    app_metadata: Dict[str, Any] = Field(default_factory=dict)
+    user_metadata: Dict[str, Any] = Field(default_factory=dict)
+
+    @classmethod
+    def from_claims(cls, claims: Dict[str, Any]) -> "TokenUser":
+        return cls(
+            id=claims["sub"],
+            aud=claims["aud"],
+            role=claims["role"],
+            email=claims.get("email"),
+            phone=claims.get("phone"),
+            session_id=claims.get("session_id"),
+            exp=claims["exp"],
+            app_metadata=claims.get("app_metadata") or {},
+            user_metadata=claims.get("user_metadata") or {},
+        )
+
+
+class ClaimsCache:
+    """
+    Bounded LRU of decoded claims keyed by a SHA-256 of the raw token.
+    Entries are dropped as soon as the token they belong to expires.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+    @staticmethod
+    def key_for(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        claims = self._entries.get(key)
+        if claims is None:
+            return None
+        if claims["exp"] <= time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return claims
+
+    def set(self, key: str, claims: Dict[str, Any]) -> None:
+        if self.maxsize <= 0:
+            return
+        self._entries[key] = claims
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class JWTVerifier:
+    """
+    Verifies Supabase access tokens in-process.
+
+    Uses the project JWT secret (HS256) when configured, otherwise the JWKS
+    published by Supabase Auth. The JWKS is cached and refreshed by a
+    background task; a token signed with an unknown `kid` forces one refresh.
+    """
+
+    def __init__(
+        self,
+        supabase_url: str,
+        audience: str,
+        jwt_secret: str | None = None,
+        refresh_seconds: int = 600,
+        cache_size: int = 10_000,
+        role: str = "authenticated",
+    ):
+        self.jwks_url = f"{supabase_url.rstrip('/')}/auth/v1/.well-known/jwks.json"
+        self.audience = audience
+        self.role = role
+        self.jwt_secret = jwt_secret
+        self.refresh_seconds = refresh_seconds
+        self.claims_cache = ClaimsCache(cache_size)
+        self._keys: Dict[str, Dict[str, Any]] = {}
+        self._keys_fetched_at = 0.0
+        self._refresh_lock = asyncio.Lock()
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    async def verify(self, token: str) -> Dict[str, Any]:
+        """Returns the verified claims for `token`, from cache when possible."""
+        cache_key = ClaimsCache.key_for(token)
+        claims = self.claims_cache.get(cache_key)
+        if claims is not None:
+            return claims
+
+        key, algorithms = await self._signing_key_for(token)
+        try:
+            claims = jwt.decode(token, key, algorithms=algorithms, audience=self.audience)
+        except JOSEError as e:
+            raise TokenVerificationError(str(e)) from e
+
+        if claims.get("role") != self.role or not claims.get("sub") or "exp" not in claims:
+            raise TokenVerificationError("Token is not an authenticated user session")
+
+        self.claims_cache.set(cache_key, claims)
+        return claims
+
+    async def _signing_key_for(self, token: str):
+        if self.jwt_secret:
+            return self.jwt_secret, ["HS256"]
+
+        try:
+            kid = jwt.get_unverified_header(token).get("kid")
+        except JOSEError as e:
+            raise TokenVerificationError(str(e)) from e
+
+        if kid not in self._keys:
+            # Unknown kid usually means the signing key was rotated
+            await self.refresh_keys(min_age=1.0)
+        key = self._keys.get(kid)
+        if key is None:
+            raise SigningKeyUnavailable(f"No signing key found for kid {kid!r}")
+        return key, JWKS_ALGORITHMS
+
+    async def refresh_keys(self, min_age: float = 0.0) -> None:
+        """Fetches the JWKS, skipping the fetch if it was refreshed within `min_age` seconds."""
+        if self.jwt_secret:
+            return
+        async with self._refresh_lock:
+            if time.monotonic() - self._keys_fetched_at < min_age:
+                return
+            try:
+                async with httpx.AsyncClient(timeout=5.0) as client:
+                    res = await client.get(self.jwks_url)
+                    res.raise_for_status()
+                    jwks = res.json()
+            except Exception as e:
+                logger.error(f"Error refreshing JWKS: {e}")
+                return
+            self._keys = {k["kid"]: k for k in jwks.get("keys", []) if "kid" in k}
+            self._keys_fetched_at = time.monotonic()
+
+    async def _refresh_loop(self) -> None:
+        while True:
+            await self.refresh_keys()
+            await asyncio.sleep(self.refresh_seconds)
+
+    def start(self) -> None:
+        """Starts the background JWKS refresh task (no-op for HS256 secrets)."""
+        if self.jwt_secret or self._refresh_task is not None:
+            return
+        self._refresh_task = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self) -> None:
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            try:
+                await self._refresh_task
+            except asyncio.CancelledError:
+                pass
+            self._refresh_task = None
+
+
+# A single verifier per worker so the key set and claims cache are shared
+token_verifier = JWTVerifier(
+    supabase_url=settings.SUPABASE_URL,
+    audience=settings.SUPABASE_JWT_AUDIENCE,
+    role=settings.SUPABASE_JWT_ROLE,
+    jwt_secret=settings.SUPABASE_JWT_SECRET,
+    refresh_seconds=settings.AUTH_JWKS_REFRESH_SECONDS,
+    cache_size=settings.AUTH_CLAIMS_CACHE_SIZE,
+)
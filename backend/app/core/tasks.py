@@ -0,0 +1,205 @@
+"""
+Background jobs that should not hold up a response: compensating deletes
+after a failed request, bookkeeping writes and periodic maintenance.
+
+Jobs are named handlers registered at import time and called with JSON
+keyword arguments, so the same job can go through the in-process queue or
+through Redis to whichever worker is free. A failing job is retried with
+exponential backoff, then dropped with an error log; handlers must be safe
+to run more than once.
+"""
+import asyncio
+import json
+import logging
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+import redis.asyncio as redis
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[..., Awaitable[Any]]
+Job = Tuple[str, Dict[str, Any]]
+
+
+class UnknownTask(Exception):
+    """No handler is registered under this name."""
+
+
+class InMemoryTaskQueue:
+    """
+    Runs jobs on this worker's event loop with `concurrency` consumers. Jobs
+    enqueued before `start()` wait for it. `stop()` gives queued jobs up to
+    `drain_timeout` seconds to finish; whatever is left is lost with the
+    process.
+    """
+
+    def __init__(self, concurrency: int, max_attempts: int, retry_delay: float, drain_timeout: float):
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.drain_timeout = drain_timeout
+        self.stats = {"enqueued": 0, "completed": 0, "retried": 0, "failed": 0}
+        self._handlers: Dict[str, Handler] = {}
+        self._schedules: Dict[str, float] = {}
+        self._backlog: Deque[Job] = deque()
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+
+    def register(self, name: str, handler: Handler) -> None:
+        self._handlers[name] = handler
+
+    def schedule(self, name: str, interval: float) -> None:
+        """Enqueues job `name` every `interval` seconds while the queue runs."""
+        self._schedules[name] = interval
+
+    async def enqueue(self, name: str, **payload: Any) -> None:
+        if name not in self._handlers:
+            raise UnknownTask(name)
+        self.stats["enqueued"] += 1
+        if self._queue is None:
+            self._backlog.append((name, payload))
+        else:
+            self._queue.put_nowait((name, payload))
+
+    async def run_job(self, name: str, payload: Dict[str, Any]) -> None:
+        """Runs one job, retrying failures; never raises."""
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                await self._handlers[name](**payload)
+                self.stats["completed"] += 1
+                return
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if attempt == self.max_attempts:
+                    self.stats["failed"] += 1
+                    logger.error(f"Background job {name} failed after {attempt} attempts: {e}")
+                    return
+                self.stats["retried"] += 1
+                logger.warning(f"Background job {name} failed, retrying: {e}")
+                await asyncio.sleep(self.retry_delay * 2 ** (attempt - 1))
+
+    async def _consume(self) -> None:
+        while True:
+            name, payload = await self._queue.get()
+            try:
+                await self.run_job(name, payload)
+            finally:
+                self._queue.task_done()
+
+    async def _repeat(self, name: str, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.enqueue(name)
+            except Exception as e:
+                logger.error(f"Error scheduling background job {name}: {e}")
+
+    def _start_tasks(self) -> None:
+        self._tasks += [asyncio.create_task(self._repeat(n, i)) for n, i in self._schedules.items()]
+
+    def start(self) -> None:
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue()
+        while self._backlog:
+            self._queue.put_nowait(self._backlog.popleft())
+        self._tasks = [asyncio.create_task(self._consume()) for _ in range(self.concurrency)]
+        self._start_tasks()
+
+    async def drain(self) -> None:
+        """Waits until every queued job has run."""
+        if self._queue is not None:
+            await self._queue.join()
+
+    async def _cancel_tasks(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def stop(self) -> None:
+        if self._queue is not None:
+            try:
+                await asyncio.wait_for(self.drain(), timeout=self.drain_timeout)
+            except asyncio.TimeoutError:
+                logger.error(f"Dropping {self._queue.qsize()} background jobs on shutdown")
+        await self._cancel_tasks()
+        self._queue = None
+
+
+class RedisTaskQueue(InMemoryTaskQueue):
+    """
+    Task queue shared by every worker through a Redis list: any worker may
+    run a job another one enqueued. A job is popped before it runs, so one
+    in progress when its worker dies is lost; handlers for work that must
+    happen need a sweep on the database side as well.
+    """
+
+    POP_TIMEOUT_SECONDS = 1
+
+    def __init__(self, url: str, key: str, concurrency: int, max_attempts: int, retry_delay: float):
+        super().__init__(concurrency, max_attempts, retry_delay, drain_timeout=0)
+        self.key = key
+        self._redis = redis.from_url(url)
+
+    async def enqueue(self, name: str, **payload: Any) -> None:
+        if name not in self._handlers:
+            raise UnknownTask(name)
+        await self._redis.lpush(self.key, json.dumps({"name": name, "payload": payload}))
+        self.stats["enqueued"] += 1
+
+    async def _consume(self) -> None:
+        while True:
+            try:
+                popped = await self._redis.brpop(self.key, timeout=self.POP_TIMEOUT_SECONDS)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Task queue lost its Redis connection: {e}")
+                await asyncio.sleep(1.0)
+                continue
+            if popped is None:
+                continue
+            job = json.loads(popped[1])
+            if job["name"] not in self._handlers:
+                logger.error(f"Dropping background job {job['name']}: no handler on this worker")
+                continue
+            await self.run_job(job["name"], job["payload"])
+
+    def start(self) -> None:
+        if self._tasks:
+            return
+        self._tasks = [asyncio.create_task(self._consume()) for _ in range(self.concurrency)]
+        self._start_tasks()
+
+    async def drain(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        # Jobs still in the list are left for the other workers
+        await self._cancel_tasks()
+        await self._redis.aclose()
+
+
+def create_task_queue() -> InMemoryTaskQueue:
+    if settings.TASK_QUEUE_BACKEND == "redis":
+        return RedisTaskQueue(
+            settings.REDIS_URL,
+            key=settings.TASK_QUEUE_KEY,
+            concurrency=settings.TASK_QUEUE_CONCURRENCY,
+            max_attempts=settings.TASK_MAX_ATTEMPTS,
+            retry_delay=settings.TASK_RETRY_DELAY_SECONDS,
+        )
+    return InMemoryTaskQueue(
+        concurrency=settings.TASK_QUEUE_CONCURRENCY,
+        max_attempts=settings.TASK_MAX_ATTEMPTS,
+        retry_delay=settings.TASK_RETRY_DELAY_SECONDS,
+        drain_timeout=settings.TASK_QUEUE_DRAIN_SECONDS,
+    )
+
+
+# Background jobs of this worker
+task_queue = create_task_queue()
@@ -0,0 +1,174 @@
+"""
+Sampled request traces, for replaying production traffic offline.
+
+Only wired up when TRACE_PATH is set. TraceMiddleware writes one JSON line
+for a sampled share of requests:
+
+    {"ts": 1722330000.123, "method": "GET", "route": "/api/v1/wins", "params": {"limit": "5"},
+     "user": "3f2a...", "status": 200, "ms": 4.1, "req_bytes": 0,
+     "db": [["rpc/get_recent_wins", "POST", 200, 2.3]]}
+
+It records the route template and never the concrete path. Query parameters
+outside TRACE_QUERY_PARAMS are dropped. User ids are hashed, and headers and
+bodies are never written, so traces carry no tokens or user content. Each
+entry under "db" is [operation, method, status, ms] for one database round
+trip made while serving the request. benchmarks/replay_trace.py replays
+traces against the app and the fake PostgREST.
+"""
+import hashlib
+import json
+import logging
+import os
+import random
+import time
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, TextIO
+
+import httpx
+from app.core.config import settings
+from app.core.metrics import _db_operation
+
+logger = logging.getLogger(__name__)
+
+# The record of the request currently being traced, if it was sampled
+_current_trace: ContextVar[Optional[Dict[str, Any]]] = ContextVar("current_trace", default=None)
+
+
+def hash_user(user_id: str) -> str:
+    return hashlib.sha256(f"{settings.TRACE_USER_SALT}{user_id}".encode()).hexdigest()[:16]
+
+
+def trace_user(user_id: Any) -> None:
+    """Attributes the request being traced, if any, to `user_id`."""
+    record = _current_trace.get()
+    if record is not None:
+        record["user"] = hash_user(str(user_id))
+
+
+def start_trace(record: Dict[str, Any]):
+    """Collects the database calls made from this context into `record["db"]`; returns a reset token."""
+    record.setdefault("db", [])
+    return _current_trace.set(record)
+
+
+def end_trace(token) -> None:
+    _current_trace.reset(token)
+
+
+def _route_template(scope) -> str:
+    """The matched route with its router's prefix, e.g. /api/v1/wins/{win_id}/messages."""
+    route = scope["route"]
+    # Routes of an included router only know their path below its prefix
+    rendered = route.path_format.format(**{k: str(v) for k, v in scope.get("path_params", {}).items()})
+    path = scope["path"]
+    if path.endswith(rendered):
+        return path[: len(path) - len(rendered)] + route.path
+    return route.path
+
+
+class TraceWriter:
+    """
+    Appends records to this worker's trace file, opened on the first write.
+    Writes are buffered, so the tail of the file is only complete once
+    `close()` has run at shutdown.
+    """
+
+    def __init__(self, path: Optional[str]):
+        self.path = path
+        self._file: Optional[TextIO] = None
+        self._pid: Optional[int] = None
+
+    def write(self, record: Dict[str, Any]) -> None:
+        if self._file is None or self._pid != os.getpid():
+            path = self.path.format(pid=os.getpid())
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._file = open(path, "a", encoding="utf-8")
+            self._pid = os.getpid()
+        self._file.write(json.dumps(record, separators=(",", ":")) + "\n")
+
+    def close(self) -> None:
+        if self._file is not None and self._pid == os.getpid():
+            self._file.close()
+        self._file = None
+
+
+class TracingTransport(httpx.AsyncBaseTransport):
+    """Wraps the database client's transport to add each round trip to the current trace."""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport):
+        self._transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        record = _current_trace.get()
+        if record is None:
+            return await self._transport.handle_async_request(request)
+        start = time.perf_counter()
+        status = 0
+        try:
+            response = await self._transport.handle_async_request(request)
+            status = response.status_code
+            return response
+        finally:
+            elapsed_ms = round((time.perf_counter() - start) * 1000, 3)
+            record["db"].append([_db_operation(request.url), request.method, status, elapsed_ms])
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+class TraceMiddleware:
+    """Pure ASGI middleware writing a trace record for a sampled share of requests."""
+
+    def __init__(self, app, writer: TraceWriter, sample_rate: float, query_params: List[str]):
+        self.app = app
+        self.writer = writer
+        self.sample_rate = sample_rate
+        self.query_params = frozenset(query_params)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or random.random() >= self.sample_rate:
+            return await self.app(scope, receive, send)
+
+        record: Dict[str, Any] = {"ts": round(time.time(), 3), "method": scope["method"], "user": None}
+        status = {"code": 500}
+        received = {"bytes": 0}
+
+        async def receive_wrapper():
+            message = await receive()
+            if message["type"] == "http.request":
+                received["bytes"] += len(message.get("body", b""))
+            return message
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        token = start_trace(record)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive_wrapper, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            end_trace(token)
+            # Unmatched paths (scanners, typos) are nothing to replay
+            if scope.get("route") is not None:
+                query = httpx.QueryParams(scope.get("query_string", b"").decode("latin-1"))
+                try:
+                    self.writer.write({
+                        "ts": record["ts"],
+                        "method": record["method"],
+                        "route": _route_template(scope),
+                        "params": {k: v for k, v in query.items() if k in self.query_params},
+                        "user": record["user"],
+                        "status": status["code"],
+                        "ms": round(elapsed * 1000, 3),
+                        "req_bytes": received["bytes"],
+                        "db": record["db"],
+                    })
+                except OSError as e:
+                    logger.error(f"Could not write a request trace: {e}")
+
+
+# Trace file of this worker
+trace_writer = TraceWriter(settings.TRACE_PATH)
@@ -0,0 +1,130 @@
+"""
+Reads of the wins feed, win transcripts and the leaderboard.
+
+Each list is paged with an opaque keyset cursor that encodes the sort key of
+the last row returned. One extra row is fetched to tell whether another page
+exists. The default first page of the feed and of the leaderboard is what
+every visitor polls, so it is cached per worker and cleared after each win.
+"""
+import base64
+import binascii
+import json
+import logging
+import uuid
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from app.core.cache import SnapshotCache, cache_backend
+from app.core.config import settings
+from app.core.db import supabase
+
+logger = logging.getLogger(__name__)
+
+Page = Tuple[List[Dict[str, Any]], Optional[str]]
+
+
+class InvalidCursor(Exception):
+    """The cursor was not issued by this API, or is for another list."""
+
+
+def encode_cursor(*values: Any) -> str:
+    raw = json.dumps(values, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def _integer(value: Any) -> int:
+    if isinstance(value, bool) or not isinstance(value, int):
+        raise ValueError(f"Not an integer: {value!r}")
+    return value
+
+
+def _timestamp(value: Any) -> str:
+    if not isinstance(value, str):
+        raise ValueError(f"Not a timestamp: {value!r}")
+    datetime.fromisoformat(value)
+    return value
+
+
+def _uuid(value: Any) -> str:
+    if not isinstance(value, str):
+        raise ValueError(f"Not a UUID: {value!r}")
+    uuid.UUID(value)
+    return value
+
+
+def decode_cursor(cursor: str, *fields: Callable[[Any], Any]) -> List[Any]:
+    """Decodes a cursor whose values must pass `fields`, one check per value (e.g. _integer)."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (binascii.Error, ValueError):
+        raise InvalidCursor("Malformed cursor")
+    if not isinstance(values, list) or len(values) != len(fields):
+        raise InvalidCursor("Malformed cursor")
+    try:
+        return [check(value) for check, value in zip(fields, values)]
+    except ValueError:
+        raise InvalidCursor("Malformed cursor")
+
+
+def _page(rows: List[Dict[str, Any]], limit: int, cursor_of) -> Page:
+    if len(rows) > limit:
+        return rows[:limit], encode_cursor(*cursor_of(rows[limit - 1]))
+    return rows, None
+
+
+async def _fetch_recent_wins(limit: int, cursor: Optional[str]) -> Page:
+    params: Dict[str, Any] = {'p_limit': limit + 1}
+    if cursor is not None:
+        params['p_before_time'], params['p_before_id'] = decode_cursor(cursor, _timestamp, _uuid)
+    res = await supabase.rpc('get_recent_wins', params).execute()
+    return _page(res.data, limit, lambda row: (row['win_time'], row['id']))
+
+
+async def _fetch_leaderboard(limit: int, cursor: Optional[str]) -> Page:
+    params: Dict[str, Any] = {'p_limit': limit + 1}
+    if cursor is not None:
+        params['p_after_wins'], params['p_after_last_win'], params['p_after_user'] = decode_cursor(cursor, _integer, _timestamp, _uuid)
+    res = await supabase.rpc('get_leaderboard', params).execute()
+    return _page(res.data, limit, lambda row: (row['wins'], row['last_win_at'], row['user_id']))
+
+
+_recent_wins_first_page = SnapshotCache(
+    lambda: _fetch_recent_wins(settings.WINS_PAGE_SIZE, None), ttl=settings.WIN_READS_CACHE_TTL_SECONDS
+)
+_leaderboard_first_page = SnapshotCache(
+    lambda: _fetch_leaderboard(settings.WINS_PAGE_SIZE, None), ttl=settings.WIN_READS_CACHE_TTL_SECONDS
+)
+
+def _reset_win_reads() -> None:
+    _recent_wins_first_page.invalidate()
+    _leaderboard_first_page.invalidate()
+
+# Every win clears the game state caches, on this worker and the others
+cache_backend.on_invalidate(_reset_win_reads)
+
+
+async def get_recent_wins(limit: int, cursor: Optional[str] = None) -> Page:
+    """Newest wins first, as (rows, next_cursor)."""
+    if cursor is None and limit == settings.WINS_PAGE_SIZE:
+        return await _recent_wins_first_page.get()
+    return await _fetch_recent_wins(limit, cursor)
+
+async def get_leaderboard(limit: int, cursor: Optional[str] = None) -> Page:
+    """Winners by number of wins, as (rows, next_cursor)."""
+    if cursor is None and limit == settings.WINS_PAGE_SIZE:
+        return await _leaderboard_first_page.get()
+    return await _fetch_leaderboard(limit, cursor)
+
+async def get_win_messages(win_id: str, limit: int, cursor: Optional[str] = None) -> Page:
+    """A win's transcript in order, as (messages, next_cursor)."""
+    params: Dict[str, Any] = {'p_win_id': win_id, 'p_limit': limit + 1}
+    if cursor is not None:
+        params['p_after_seq'], = decode_cursor(cursor, _integer)
+    res = await supabase.rpc('get_win_messages', params).execute()
+    return _page(res.data, limit, lambda row: (row['seq'],))
+
+def get_win_reads_cache_stats() -> Dict[str, int]:
+    """Hit, miss and coalesced counts of the cached first pages, summed."""
+    stats = dict(_recent_wins_first_page.stats)
+    for key, value in _leaderboard_first_page.stats.items():
+        stats[key] += value
+    return stats
@@ -1,13 +1,77 @@
-from fastapi import FastAPI
+import time
+# Taken before the application imports, to report the worker's import time
+_import_started = time.perf_counter()
+
+import logging
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from app.api.endpoints import game
+from app.core.admission import retry_after_header
+from app.core.archive import schedule_archiver
+from app.core.attempts import attempt_batcher, attempt_coalescer
+from app.core.cache import cache_backend
 from app.core.config import settings
+from app.core.credit_packs import get_credit_packs_cache_stats
+from app.core.db import close_db
+from app.core.game_state import (
+    game_state_broadcaster, game_state_listener, get_game_state_cache_stats, get_system_prompt_cache_stats
+)
+from app.core.idempotency import idempotency_store
+from app.core.llm import close_llm
+from app.core.metrics import MetricsMiddleware, cache_stats_collector, registry, worker_boot_seconds
+from app.core.profiles import get_profile_cache_stats
+from app.core.resilience import DatabaseUnavailable, bulk_db_breaker, db_breaker
+from app.core.security import token_verifier
+from app.core.tasks import task_queue
+from app.core.tracing import TraceMiddleware, trace_writer
+from app.core.wins import get_win_reads_cache_stats
+
+_import_seconds = time.perf_counter() - _import_started
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    started = time.perf_counter()
+    # Configured per worker at startup rather than as a side effect of an import
+    logging.basicConfig(level=settings.LOG_LEVEL)
+
+    # Per-worker background tasks
+    await cache_backend.start()
+    token_verifier.start()
+    game_state_listener.start()
+    schedule_archiver()
+    task_queue.start()
+    if settings.ATTEMPT_COUNTER_MODE == "batched":
+        attempt_batcher.start()
+
+    startup_seconds = time.perf_counter() - started
+    worker_boot_seconds.set(_import_seconds, phase="import")
+    worker_boot_seconds.set(startup_seconds, phase="startup")
+    logger.info(f"Worker booted: import {_import_seconds:.3f}s, startup {startup_seconds:.3f}s")
+    yield
+    await game_state_listener.stop()
+    await game_state_broadcaster.stop()
+    await attempt_coalescer.stop()
+    await attempt_batcher.stop()
+    await token_verifier.stop()
+    await cache_backend.stop()
+    await idempotency_store.stop()
+    # Drained before the clients close, so jobs queued during shutdown still run
+    await task_queue.stop()
+    await close_llm()
+    await close_db()
+    trace_writer.close()
+
 
 app = FastAPI(
     title="ConvinceAI Game Backend",
     # Disable FastAPI's default docs in production
     docs_url=None if settings.ENVIRONMENT == "prod" else "/docs",
-    redoc_url=None if settings.ENVIRONMENT == "prod" else "/redoc"
+    redoc_url=None if settings.ENVIRONMENT == "prod" else "/redoc",
+    lifespan=lifespan,
 )
 
 app.add_middleware(
@@ -16,8 +80,48 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Lets browser clients tell a replayed purchase or win from a new one
+    expose_headers=["Idempotent-Replayed"],
 )
 
+if settings.TRACE_PATH:
+    app.add_middleware(
+        TraceMiddleware,
+        writer=trace_writer,
+        sample_rate=settings.TRACE_SAMPLE_RATE,
+        query_params=settings.TRACE_QUERY_PARAMS,
+    )
+
+if settings.METRICS_ENABLED:
+    # Outermost, so the timings include CORS handling
+    app.add_middleware(MetricsMiddleware)
+    registry.register_collector(cache_stats_collector({
+        "game_state_snapshot": get_game_state_cache_stats,
+        "credit_packs": get_credit_packs_cache_stats,
+        "profiles": get_profile_cache_stats,
+        "system_prompts": get_system_prompt_cache_stats,
+        "win_reads": get_win_reads_cache_stats,
+        "shared": lambda: cache_backend.stats,
+        "game_state_listener": lambda: game_state_listener.stats,
+        "db_breaker": lambda: db_breaker.stats,
+        "db_bulk_breaker": lambda: bulk_db_breaker.stats,
+    }))
+
+    @app.get("/metrics", include_in_schema=False)
+    def metrics():
+        return Response(registry.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.exception_handler(DatabaseUnavailable)
+async def database_unavailable(request: Request, exc: DatabaseUnavailable):
+    # For database calls outside the endpoints' own error handling
+    logger.error(f"Database unavailable during {request.url.path}: {exc}")
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Database is unavailable, please retry."},
+        headers=retry_after_header(db_breaker.retry_after()),
+    )
+
 app.include_router(game.router, prefix="/api/v1", tags=["game"])
 
 @app.get("/")
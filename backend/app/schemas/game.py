@@ -1,3 +1,4 @@
+from datetime import datetime
 from pydantic import BaseModel, Field
 from typing import List
 from uuid import UUID
@@ -13,12 +14,18 @@ class ChatMessage(BaseModel):
 class HandleWinRequest(BaseModel):
     chat_log: List[ChatMessage]
 
+class ChatRequest(BaseModel):
+    message: str = Field(..., min_length=1)
+    # Earlier turns of this conversation, oldest first
+    history: List[ChatMessage] = []
+
 # ===================================================================
 # RESPONSE MODELS (Data sent FROM the API)
 # ===================================================================
 
 class LogAttemptResponse(BaseModel):
     is_payout_phase_active: bool
+    new_credits_balance: int
 
 class HandleWinResponse(BaseModel):
     status: str
@@ -44,3 +51,31 @@ class PurchaseResponse(BaseModel):
     status: str
     purchase_id: UUID
     new_credits_balance: int
+
+class WinSummary(BaseModel):
+    id: UUID
+    user_id: UUID
+    username: str | None = None
+    win_time: datetime
+    global_attempt_at_win: int
+
+class WinsPage(BaseModel):
+    items: List[WinSummary]
+    # Pass back as ?cursor= for the next page; null on the last page
+    next_cursor: str | None = None
+
+class WinTranscriptPage(BaseModel):
+    win_id: UUID
+    messages: List[ChatMessage]
+    next_cursor: str | None = None
+
+class LeaderboardEntry(BaseModel):
+    user_id: UUID
+    username: str | None = None
+    avatar_url: str | None = None
+    wins: int
+    last_win_at: datetime
+
+class LeaderboardPage(BaseModel):
+    items: List[LeaderboardEntry]
+    next_cursor: str | None = None
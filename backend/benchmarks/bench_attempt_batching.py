@@ -0,0 +1,108 @@
+"""
+Database calls per second against attempts per second for /log_attempt,
+one log_attempt call per request ("direct") vs micro-batched log_attempts
+calls ("coalesced").
+
+Concurrent players, each with their own account, loop on /log_attempt
+through the real app and async client against the fake PostgREST with an
+injected latency per call. Rate limiting is turned off so every attempt
+reaches the database, but admission control still sheds calls with 503
+when too many queue for a database slot.
+
+    cd backend && python -m benchmarks.bench_attempt_batching --players 10 100 500 --latency-ms 5
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+from unittest.mock import patch
+
+os.environ.setdefault("SUPABASE_URL", "http://fake-postgrest")
+os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "benchmark")
+os.environ.setdefault("FRONTEND_PROD_URL", "http://localhost")
+
+import httpx
+from fastapi import Header
+from supabase import AsyncClient, AsyncClientOptions
+
+from app.main import app
+from app.api.deps import get_current_user
+from app.core.admission import attempt_rate_limiter
+from app.core.config import settings
+from app.core.security import TokenUser
+from benchmarks.fake_postgrest import FakeDatabase, create_app
+
+
+def build_client(db: FakeDatabase, latency: float) -> AsyncClient:
+    http_client = httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=create_app(db, latency=latency)),
+        base_url=os.environ["SUPABASE_URL"],
+    )
+    return AsyncClient(
+        os.environ["SUPABASE_URL"],
+        os.environ["SUPABASE_SERVICE_ROLE_KEY"],
+        AsyncClientOptions(httpx_client=http_client),
+    )
+
+
+async def run_mode(mode: str, players: int, attempts: int, latency: float) -> dict:
+    db = FakeDatabase(users=players, threshold=10**9)
+    client = build_client(db, latency)
+    users = {
+        f"Bearer {p['id']}": TokenUser(id=p["id"], aud="authenticated", role="authenticated", exp=0)
+        for p in db.tables["profiles"]
+    }
+
+    async def current_user(authorization: str = Header()) -> TokenUser:
+        return users[authorization]
+
+    statuses = []
+
+    async def player(client_http: httpx.AsyncClient, token: str):
+        for _ in range(attempts):
+            res = await client_http.post("/api/v1/log_attempt", headers={"Authorization": token})
+            statuses.append(res.status_code)
+
+    app.dependency_overrides[get_current_user] = current_user
+    with patch("app.api.endpoints.game.supabase", client), patch("app.core.attempts.supabase", client), \
+            patch.object(settings, "ATTEMPT_COUNTER_MODE", mode), patch.object(attempt_rate_limiter, "rate", 0):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://backend") as client_http:
+            start = time.perf_counter()
+            await asyncio.gather(*(player(client_http, token) for token in users))
+            elapsed = time.perf_counter() - start
+    app.dependency_overrides.clear()
+
+    logged = statuses.count(200)
+    assert db.game_state["game_attempts"] == logged
+    return {
+        "attempts_per_s": round(logged / elapsed, 1),
+        "db_calls_per_s": round(db.request_count / elapsed, 1),
+        "attempts_per_db_call": round(logged / db.request_count, 1),
+        # 503s from database admission control once too many calls queue
+        "shed": len(statuses) - logged,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--players", type=int, nargs="+", default=[10, 100, 500])
+    parser.add_argument("--attempts", type=int, default=5, help="attempts per player")
+    parser.add_argument("--latency-ms", type=float, default=5.0)
+    args = parser.parse_args()
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    results = {
+        players: {
+            mode: asyncio.run(run_mode(mode, players, args.attempts, args.latency_ms / 1000))
+            for mode in ("direct", "coalesced")
+        }
+        for players in args.players
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
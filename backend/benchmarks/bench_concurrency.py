@@ -0,0 +1,132 @@
+"""
+Concurrent-request throughput per worker, before and after the async client.
+
+"blocking" reproduces the old behaviour: every `.execute()` blocks the event
+loop for the database latency, like the synchronous supabase client did.
+"async" routes the real AsyncClient through its pooled httpx client to the
+fake PostgREST, which awaits the same latency.
+
+    cd backend && python -m benchmarks.bench_concurrency --requests 400 --concurrency 50 --latency-ms 20
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import time
+from unittest.mock import patch
+
+os.environ.setdefault("SUPABASE_URL", "http://fake-postgrest")
+os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "benchmark")
+os.environ.setdefault("FRONTEND_PROD_URL", "http://localhost")
+
+import httpx
+from supabase import AsyncClient, AsyncClientOptions
+
+from app.main import app
+from app.api.deps import get_current_user
+from app.core.admission import attempt_rate_limiter
+from app.core.security import TokenUser
+from benchmarks.fake_postgrest import FakeDatabase, create_app
+
+ENDPOINTS = [
+    ("GET", "/api/v1/game_state"),
+    ("GET", "/api/v1/me/profile"),
+    ("POST", "/api/v1/log_attempt"),
+]
+
+
+class BlockingProxy:
+    """Wraps a request builder so `execute()` first blocks the thread for `latency` seconds."""
+
+    def __init__(self, target, latency: float):
+        self._target = target
+        self._latency = latency
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        if name == "execute":
+            async def execute(*args, **kwargs):
+                time.sleep(self._latency)
+                return await attr(*args, **kwargs)
+            return execute
+        if callable(attr):
+            def call(*args, **kwargs):
+                return BlockingProxy(attr(*args, **kwargs), self._latency)
+            return call
+        return attr
+
+
+def build_client(db: FakeDatabase, latency: float) -> AsyncClient:
+    http_client = httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=create_app(db, latency=latency)),
+        base_url=os.environ["SUPABASE_URL"],
+    )
+    return AsyncClient(
+        os.environ["SUPABASE_URL"],
+        os.environ["SUPABASE_SERVICE_ROLE_KEY"],
+        AsyncClientOptions(httpx_client=http_client),
+    )
+
+
+async def run_mode(mode: str, requests: int, concurrency: int, latency: float) -> dict:
+    db = FakeDatabase()
+    if mode == "blocking":
+        client = BlockingProxy(build_client(db, latency=0.0), latency)
+    else:
+        client = build_client(db, latency=latency)
+
+    user = TokenUser(id=db.tables["profiles"][0]["id"], aud="authenticated", role="authenticated", exp=0)
+    app.dependency_overrides[get_current_user] = lambda: user
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(client_http: httpx.AsyncClient, i: int):
+        method, path = ENDPOINTS[i % len(ENDPOINTS)]
+        async with semaphore:
+            start = time.perf_counter()
+            res = await client_http.request(method, path)
+            latencies.append(time.perf_counter() - start)
+            res.raise_for_status()
+
+    with patch("app.api.endpoints.game.supabase", client), patch("app.core.game_state.supabase", client), \
+            patch("app.core.profiles.supabase", client), \
+            patch.object(attempt_rate_limiter, "rate", 0):
+        # Every request comes from one user, so the attempt rate limit is off
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://backend") as client_http:
+            start = time.perf_counter()
+            await asyncio.gather(*(one(client_http, i) for i in range(requests)))
+            elapsed = time.perf_counter() - start
+
+    app.dependency_overrides.clear()
+    latencies.sort()
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "db_latency_ms": latency * 1000,
+        "rps": round(requests / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 2),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    args = parser.parse_args()
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    results = {
+        mode: asyncio.run(run_mode(mode, args.requests, args.concurrency, args.latency_ms / 1000))
+        for mode in ("blocking", "async")
+    }
+    results["speedup"] = round(results["async"]["rps"] / results["blocking"]["rps"], 1)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
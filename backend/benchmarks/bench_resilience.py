@@ -0,0 +1,132 @@
+"""
+Behaviour of the read endpoints while the database goes down and comes back.
+
+Concurrent clients poll /game_state, /credit_packs and /wins through the
+real app and resilient async client against the fake PostgREST, which
+answers normally, then fails every call ("error") or stops answering
+("hang"), then recovers. For each phase it reports the status codes and
+latency per endpoint, and how many calls reached the database: cached
+reads should keep answering from their stale copy, the rest should get
+fast 503s once the circuit breaker opens, and everything should recover
+after the breaker's reset timeout.
+
+    cd backend && python -m benchmarks.bench_resilience --outage error hang --phase-seconds 3
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import time
+from collections import Counter
+from unittest.mock import patch
+
+os.environ.setdefault("SUPABASE_URL", "http://fake-postgrest")
+os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "benchmark")
+os.environ.setdefault("FRONTEND_PROD_URL", "http://localhost")
+
+import httpx
+from supabase import AsyncClient, AsyncClientOptions
+
+from app.main import app
+from app.core.config import settings
+from app.core.credit_packs import clear_credit_packs_cache
+from app.core.game_state import clear_game_state_cache
+from app.core.resilience import ResilientTransport, db_breaker
+from benchmarks.fake_postgrest import FakeDatabase, create_app
+
+# The /wins page size is off the default, so it is not served from the first-page cache
+ENDPOINTS = ("/api/v1/game_state", "/api/v1/credit_packs", "/api/v1/wins?limit=5")
+
+
+def build_client(db: FakeDatabase, latency: float, deadline: float) -> AsyncClient:
+    transport = ResilientTransport(
+        httpx.ASGITransport(app=create_app(db, latency=latency)),
+        db_breaker,
+        deadline=deadline,
+        read_retries=settings.DB_READ_RETRIES,
+        backoff=settings.DB_RETRY_BACKOFF_SECONDS,
+        backoff_max=settings.DB_RETRY_BACKOFF_MAX_SECONDS,
+    )
+    http_client = httpx.AsyncClient(transport=transport, base_url=os.environ["SUPABASE_URL"])
+    return AsyncClient(
+        os.environ["SUPABASE_URL"],
+        os.environ["SUPABASE_SERVICE_ROLE_KEY"],
+        AsyncClientOptions(httpx_client=http_client),
+    )
+
+
+async def run_phase(
+    client_http: httpx.AsyncClient, db: FakeDatabase, clients: int, seconds: float, think: float
+) -> dict:
+    results = {path: {"statuses": Counter(), "latencies": []} for path in ENDPOINTS}
+    calls = db.request_count
+    stop = time.monotonic() + seconds
+
+    async def poller(path: str):
+        while time.monotonic() < stop:
+            started = time.perf_counter()
+            res = await client_http.get(path)
+            results[path]["latencies"].append(time.perf_counter() - started)
+            results[path]["statuses"][res.status_code] += 1
+            await asyncio.sleep(think)
+
+    await asyncio.gather(*(poller(path) for path in ENDPOINTS for _ in range(clients)))
+    report = {}
+    for path, r in results.items():
+        latencies = sorted(r["latencies"]) or [float("nan")]
+        report[path] = {
+            "statuses": dict(r["statuses"]),
+            "p50_ms": round(statistics.median(latencies) * 1000, 2),
+            "p99_ms": round(latencies[int(len(latencies) * 0.99)] * 1000, 2),
+        }
+    report["db_calls"] = db.request_count - calls
+    report["breaker"] = db_breaker.state
+    return report
+
+
+async def run(outage: str, clients: int, seconds: float, latency: float, think: float) -> dict:
+    db = FakeDatabase(users=1)
+    # A short deadline, so a hanging database is noticed within the phase
+    client = build_client(db, latency, deadline=0.5)
+    await clear_game_state_cache()
+    clear_credit_packs_cache()
+    db_breaker.reset()
+
+    phases = {}
+    with patch("app.core.game_state.supabase", client), patch("app.core.credit_packs.supabase", client), \
+            patch("app.core.wins.supabase", client), \
+            patch.object(db_breaker, "reset_timeout", seconds / 2):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://backend", timeout=30) as client_http:
+            phases["healthy"] = await run_phase(client_http, db, clients, seconds, think)
+            db.outage = outage
+            phases["outage"] = await run_phase(client_http, db, clients, seconds, think)
+            db.outage = None
+            phases["recovered"] = await run_phase(client_http, db, clients, seconds, think)
+    phases["breaker_stats"] = dict(db_breaker.stats)
+    return phases
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--outage", nargs="+", choices=["error", "hang"], default=["error", "hang"])
+    parser.add_argument("--clients", type=int, default=10, help="concurrent clients per endpoint")
+    parser.add_argument("--phase-seconds", type=float, default=3.0)
+    parser.add_argument("--latency-ms", type=float, default=2.0)
+    parser.add_argument("--think-ms", type=float, default=10.0, help="pause between a client's requests")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.CRITICAL)
+
+    results = {
+        outage: asyncio.run(run(
+            outage, args.clients, args.phase_seconds, args.latency_ms / 1000, args.think_ms / 1000
+        ))
+        for outage in args.outage
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
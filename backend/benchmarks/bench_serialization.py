@@ -0,0 +1,134 @@
+"""
+Response serialization cost per endpoint, default path vs FAST_JSON_RESPONSES.
+
+"default" does what an endpoint does today: builds the response model from
+the database row, then runs FastAPI's own response step (validation against
+`response_model` and encoding) for the real route. "fast" does what the
+fast path does: projects the row onto the model's fields and encodes it
+with FastJSONResponse, or reuses the bytes cached for the current snapshot.
+Database and routing costs are excluded.
+
+    cd backend && python -m benchmarks.bench_serialization --iterations 20000
+"""
+import argparse
+import asyncio
+import inspect
+import json
+import os
+import time
+import uuid
+
+os.environ.setdefault("SUPABASE_URL", "http://fake-postgrest")
+os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "benchmark")
+os.environ.setdefault("FRONTEND_PROD_URL", "http://localhost")
+
+from fastapi.routing import APIRoute, serialize_response
+from starlette.responses import JSONResponse, Response
+
+from app.api.endpoints.game import router
+from app.core import responses
+from app.core.credit_packs import _credit_pack_list
+from app.core.responses import FastJSONResponse, dump_json, trusted_fields
+from app.schemas.game import CreditPackResponse, GameStateResponse, LogAttemptResponse, ProfileResponse
+
+GAME_STATE_ROW = {
+    "id": 1, "prizepool_amount": 12345.67, "is_payout_phase_active": False,
+    "total_attempts": 98765, "updated_at": "2024-07-30T10:00:00+00:00",
+}
+PROFILE_ROW = {
+    "id": str(uuid.uuid4()), "username": "player", "avatar_url": None, "credits": 42,
+    "created_at": "2024-07-30T10:00:00+00:00",
+}
+ATTEMPT_ROW = {"is_payout_phase_active": False, "new_credits_balance": 41}
+CREDIT_PACK_ROWS = [
+    {"id": str(uuid.uuid4()), "name": f"Pack {i}", "credits_amount": 10 * i, "price": 4.99 * i,
+     "created_at": "2024-07-30T10:00:00+00:00"}
+    for i in range(1, 6)
+]
+
+# Serialized once per snapshot on the fast path
+GAME_STATE_BODY = dump_json(trusted_fields(GameStateResponse, GAME_STATE_ROW))
+CREDIT_PACKS_BODY = _credit_pack_list.dump_json([CreditPackResponse(**pack) for pack in CREDIT_PACK_ROWS])
+
+# Older FastAPI versions encode with jsonable_encoder + json.dumps instead
+SUPPORTS_DUMP_JSON = "dump_json" in inspect.signature(serialize_response).parameters
+
+
+def response_field(path: str):
+    for route in router.routes:
+        if isinstance(route, APIRoute) and route.path == path:
+            return route.response_field
+    raise LookupError(path)
+
+
+async def default_response(path: str, content) -> Response:
+    field = response_field(path)
+    if SUPPORTS_DUMP_JSON:
+        body = await serialize_response(field=field, response_content=content, dump_json=True)
+        return Response(body, media_type="application/json")
+    return JSONResponse(await serialize_response(field=field, response_content=content))
+
+
+CASES = {
+    "GET /game_state": (
+        lambda: default_response("/game_state", GameStateResponse(**GAME_STATE_ROW)),
+        lambda: Response(content=GAME_STATE_BODY, media_type="application/json"),
+    ),
+    "GET /me/profile": (
+        lambda: default_response("/me/profile", ProfileResponse(**PROFILE_ROW)),
+        lambda: FastJSONResponse(trusted_fields(ProfileResponse, PROFILE_ROW)),
+    ),
+    "POST /log_attempt": (
+        lambda: default_response(
+            "/log_attempt", LogAttemptResponse(**trusted_fields(LogAttemptResponse, ATTEMPT_ROW))
+        ),
+        lambda: FastJSONResponse(trusted_fields(LogAttemptResponse, ATTEMPT_ROW)),
+    ),
+    # The catalogue was already cached as bytes; "default" is the old per-request path
+    "GET /credit_packs": (
+        lambda: default_response("/credit_packs", [CreditPackResponse(**p) for p in CREDIT_PACK_ROWS]),
+        lambda: Response(content=CREDIT_PACKS_BODY, media_type="application/json"),
+    ),
+}
+
+
+async def per_call_us(build, iterations: int) -> float:
+    for _ in range(min(iterations, 1000)):
+        result = build()
+        if inspect.isawaitable(result):
+            await result
+    started = time.perf_counter()
+    for _ in range(iterations):
+        result = build()
+        if inspect.isawaitable(result):
+            await result
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+async def main_async(iterations: int):
+    results = []
+    for name, (default, fast) in CASES.items():
+        default_us = await per_call_us(default, iterations)
+        fast_us = await per_call_us(fast, iterations)
+        results.append({
+            "endpoint": name,
+            "default_us": round(default_us, 2),
+            "fast_us": round(fast_us, 2),
+            "speedup": round(default_us / fast_us, 1),
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure response serialization cost per endpoint.")
+    parser.add_argument("--iterations", type=int, default=20_000)
+    args = parser.parse_args()
+    print(json.dumps({
+        "encoder": "orjson" if responses.orjson is not None else "pydantic_core",
+        "fastapi_dump_json": SUPPORTS_DUMP_JSON,
+        "results": asyncio.run(main_async(args.iterations)),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
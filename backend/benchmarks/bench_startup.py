@@ -0,0 +1,94 @@
+"""
+Worker boot time: importing the application in a fresh interpreter.
+
+Each run starts a new Python process, imports app.main and reports how
+long that took, whether any connection pool was built along the way, and
+how long building the Supabase client takes on first use. With
+--importtime the slowest modules (by cumulative import time) are listed.
+
+    cd backend && python -m benchmarks.bench_startup --runs 10 --importtime
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+
+BOOT_SNIPPET = """
+import json, logging, time
+started = time.perf_counter()
+import app.main
+imported = time.perf_counter() - started
+from app.core import db, llm
+report = {
+    "import_seconds": imported,
+    "clients_built": db._supabase.built or llm._llm_client.built,
+    "root_log_handlers": len(logging.getLogger().handlers),
+}
+started = time.perf_counter()
+db.get_supabase()
+report["first_client_seconds"] = time.perf_counter() - started
+print(json.dumps(report))
+"""
+
+
+def _env() -> Dict[str, str]:
+    env = dict(os.environ)
+    env.setdefault("SUPABASE_URL", "http://fake-postgrest")
+    env.setdefault("SUPABASE_SERVICE_ROLE_KEY", "benchmark")
+    env.setdefault("FRONTEND_PROD_URL", "http://localhost")
+    return env
+
+
+def measure_boot() -> Dict:
+    """Imports the app once in a fresh interpreter and returns its report."""
+    out = subprocess.run(
+        [sys.executable, "-c", BOOT_SNIPPET], cwd=BACKEND_DIR, env=_env(),
+        capture_output=True, text=True, check=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def slowest_imports(limit: int = 15) -> List[tuple]:
+    """(cumulative microseconds, module) of the slowest imports, from -X importtime."""
+    out = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"], cwd=BACKEND_DIR, env=_env(),
+        capture_output=True, text=True, check=True,
+    )
+    rows = []
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        rows.append((int(cumulative), name.strip()))
+    return sorted(rows, reverse=True)[:limit]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--importtime", action="store_true", help="List the slowest imports")
+    args = parser.parse_args()
+
+    reports = [measure_boot() for _ in range(args.runs)]
+    imports = sorted(r["import_seconds"] for r in reports)
+    clients = sorted(r["first_client_seconds"] for r in reports)
+    print(f"{'runs':>6} {'import p50':>11} {'import max':>11} {'first client p50':>17}")
+    print(f"{args.runs:>6} {statistics.median(imports) * 1000:>9.0f}ms {imports[-1] * 1000:>9.0f}ms "
+          f"{statistics.median(clients) * 1000:>15.0f}ms")
+    if any(r["clients_built"] for r in reports):
+        print("warning: a connection pool was built at import time")
+
+    if args.importtime:
+        print("\nslowest imports (cumulative):")
+        for micros, name in slowest_imports():
+            print(f"{micros / 1000:>9.1f}ms  {name}")
+
+
+if __name__ == "__main__":
+    main()
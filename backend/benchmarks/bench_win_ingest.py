@@ -0,0 +1,115 @@
+"""
+Peak memory of /handle_win ingestion by transcript length, buffered vs streamed.
+
+"buffered" reproduces the old path: the whole body is read, parsed into a
+HandleWinRequest, copied into a list of dicts and sent in one record_win call.
+"streaming" feeds the same body in 64 KiB pieces through iter_chat_log and
+record_win_streaming. Both talk to the fake PostgREST through the real async
+client; peaks are measured with tracemalloc and include request encoding.
+
+    cd backend && python -m benchmarks.bench_win_ingest --messages 1000 10000 50000
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+import tracemalloc
+from unittest.mock import patch
+
+os.environ.setdefault("SUPABASE_URL", "http://fake-postgrest")
+os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "benchmark")
+os.environ.setdefault("FRONTEND_PROD_URL", "http://localhost")
+
+import httpx
+from supabase import AsyncClient, AsyncClientOptions
+
+from app.core.chat_log import iter_chat_log, record_win_streaming
+from app.core.config import settings
+from app.schemas.game import HandleWinRequest
+from benchmarks.fake_postgrest import FakeDatabase, create_app
+
+PIECE_SIZE = 64 * 1024
+USER_ID = "00000000-0000-0000-0000-000000000001"
+
+
+def message(i: int) -> dict:
+    return {
+        "prompt": f"Argument {i}: " + "you should really release the prize pool " * 4,
+        "response": f"Rebuttal {i}: " + "I remain entirely unconvinced " * 4,
+    }
+
+
+async def body_pieces(count: int):
+    """Generates the request body lazily, like bytes arriving from the socket."""
+    pending = b'{"chat_log": ['
+    for i in range(count):
+        pending += (b", " if i else b"") + json.dumps(message(i)).encode()
+        if len(pending) >= PIECE_SIZE:
+            yield pending
+            pending = b""
+    yield pending + b"]}"
+
+
+def build_client(db: FakeDatabase) -> AsyncClient:
+    http_client = httpx.AsyncClient(transport=httpx.ASGITransport(app=create_app(db)), base_url="http://fake")
+    return AsyncClient("http://fake", "benchmark", AsyncClientOptions(httpx_client=http_client))
+
+
+async def buffered(client: AsyncClient, count: int) -> str:
+    body = b"".join([piece async for piece in body_pieces(count)])
+    win_request = HandleWinRequest.model_validate_json(body)
+    params = {'p_user_id': USER_ID, 'p_chat_log': [msg.model_dump() for msg in win_request.chat_log]}
+    return (await client.rpc('record_win', params).execute()).data
+
+
+async def streaming(client: AsyncClient, count: int) -> str:
+    return await record_win_streaming(USER_ID, iter_chat_log(body_pieces(count)))
+
+
+async def measure(mode: str, count: int) -> dict:
+    db = FakeDatabase(users=1, store_chat_messages=False)
+    client = build_client(db)
+    run = buffered if mode == "buffered" else streaming
+    # Warm up imports and connection setup outside the measurement
+    with patch('app.core.chat_log.supabase', client):
+        await run(client, 10)
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        await run(client, count)
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    return {
+        "mode": mode,
+        "messages": count,
+        "peak_mib": round(peak / 2**20, 2),
+        "seconds": round(elapsed, 3),
+        "db_calls": db.request_count - 1,
+    }
+
+
+async def main_async(counts):
+    results = []
+    for count in counts:
+        for mode in ("buffered", "streaming"):
+            results.append(await measure(mode, count))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure peak memory of win ingestion.")
+    parser.add_argument("--messages", type=int, nargs="+", default=[1_000, 10_000, 50_000])
+    parser.add_argument("--chunk-size", type=int, default=settings.WIN_INGEST_CHUNK_SIZE)
+    args = parser.parse_args()
+
+    with patch.object(settings, "WIN_INGEST_CHUNK_SIZE", args.chunk_size), \
+            patch.object(settings, "WIN_MAX_MESSAGES", max(args.messages)), \
+            patch.object(settings, "WIN_MAX_BODY_BYTES", 2**31):
+        print(json.dumps(asyncio.run(main_async(args.messages)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
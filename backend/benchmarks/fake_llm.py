@@ -0,0 +1,72 @@
+"""
+A local stand-in for the Gemini streaming API, used by tests and load runs.
+
+Answers `POST /models/{model}:streamGenerateContent?alt=sse` with canned
+tokens as Server-Sent Events, one every `token_delay` seconds, and records
+each request (and whether its client went away) for inspection:
+
+    cd backend && python -m benchmarks.fake_llm --port 8089 --token-delay-ms 20
+    LLM_API_URL=http://127.0.0.1:8089 uvicorn app.main:app
+"""
+import argparse
+import asyncio
+import json
+from typing import Any, Dict, List, Sequence
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+DEFAULT_TOKENS = ("I ", "remain ", "entirely ", "unconvinced", ".")
+
+
+class FakeModel:
+    """Canned reply plus a log of what the proxy sent."""
+
+    def __init__(self, tokens: Sequence[str] = DEFAULT_TOKENS, token_delay: float = 0.0):
+        self.tokens = list(tokens)
+        self.token_delay = token_delay
+        self.requests: List[Dict[str, Any]] = []
+        self.completed = 0
+        self.cancelled = 0
+
+
+def create_app(model: FakeModel) -> Starlette:
+    async def generate(request: Request) -> Response:
+        target = request.path_params["target"]
+        if not target.endswith(":streamGenerateContent") or request.query_params.get("alt") != "sse":
+            return JSONResponse({"error": {"message": "unsupported"}}, status_code=404)
+        model.requests.append({"model": target.split(":")[0], "body": await request.json()})
+
+        async def chunks():
+            try:
+                for token in model.tokens:
+                    if model.token_delay:
+                        await asyncio.sleep(model.token_delay)
+                    payload = {"candidates": [{"content": {"role": "model", "parts": [{"text": token}]}}]}
+                    yield f"data: {json.dumps(payload)}\r\n\r\n"
+                model.completed += 1
+            except asyncio.CancelledError:
+                model.cancelled += 1
+                raise
+
+        return StreamingResponse(chunks(), media_type="text/event-stream")
+
+    return Starlette(routes=[Route("/models/{target:path}", generate, methods=["POST"])])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the fake model server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--token-delay-ms", type=float, default=20.0)
+    args = parser.parse_args()
+
+    import uvicorn
+    model = FakeModel(token_delay=args.token_delay_ms / 1000)
+    uvicorn.run(create_app(model), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
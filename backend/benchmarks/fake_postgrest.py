@@ -0,0 +1,409 @@
+"""
+A small in-memory stand-in for PostgREST, used by the benchmarks.
+
+Implements the subset of the REST/RPC surface the backend uses (eq filters,
+ordering, single-object reads, inserts, deletes and the game's RPC functions)
+with a configurable injected latency per request, and injected faults: a
+random share of requests failing with 503, or a full outage set through
+`FakeDatabase.outage`. It can also run as a standalone server for load tests:
+
+    cd backend && python -m benchmarks.fake_postgrest --port 54321 --latency-ms 5 --error-rate 0.01
+"""
+import argparse
+import asyncio
+import random
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+OBJECT_MEDIA_TYPE = "application/vnd.pgrst.object+json"
+
+
+class FakeDatabase:
+    """In-memory tables plus Python versions of the SQL functions in migrations/."""
+
+    def __init__(
+        self,
+        users: int = 100,
+        credits: int = 1_000_000,
+        threshold: int = 750,
+        broke_users: int = 0,
+        store_chat_messages: bool = True,
+    ):
+        # Funded users come first; the `broke_users` after them start with no credits
+        self.tables: Dict[str, List[Dict[str, Any]]] = {
+            "profiles": [
+                {
+                    "id": str(uuid.UUID(int=i + 1)),
+                    "username": f"user{i}",
+                    "avatar_url": None,
+                    "credits": credits if i < users else 0,
+                }
+                for i in range(users + broke_users)
+            ],
+            "credit_packs": [
+                {"id": str(uuid.uuid4()), "name": "Starter Pack", "credits_amount": 100, "price": 5.0},
+                {"id": str(uuid.uuid4()), "name": "Pro Pack", "credits_amount": 500, "price": 20.0},
+            ],
+            "purchases": [],
+            "game_state": [{
+                "id": 1,
+                "prizepool_amount": 100.0,
+                "global_attempts": 0,
+                "game_attempts": 0,
+                "payout_phase_threshold": threshold,
+                "is_payout_phase_active": False,
+            }],
+            "winning_chat_logs": [],
+            "winning_chat_messages": [],
+            "wins": [],
+            "leaderboard": [],
+            "winning_chat_archive": [],
+        }
+        self.rpcs: Dict[str, Callable[[Dict[str, Any]], Any]] = {
+            "log_attempt": self.log_attempt,
+            "log_attempts": self.log_attempts,
+            "handle_win": self.handle_win,
+            "purchase_credits": self.purchase_credits,
+            "consume_attempt_credit": self.consume_attempt_credit,
+            "refund_attempt_credit": self.refund_attempt_credit,
+            "add_game_attempts": self.add_game_attempts,
+            "record_win": self.record_win,
+            "stage_win_messages": self.stage_win_messages,
+            "finalize_win": self.finalize_win,
+            "discard_win_upload": self.discard_win_upload,
+            "get_recent_wins": self.get_recent_wins,
+            "get_win_messages": self.get_win_messages,
+            "get_leaderboard": self.get_leaderboard,
+            "archive_win_transcripts": self.archive_win_transcripts,
+        }
+        # Memory benchmarks turn this off so stored rows don't swamp the backend's own usage
+        self.store_chat_messages = store_chat_messages
+        self.uploads: Dict[str, Dict[int, Dict[str, Any]]] = {}
+        self.applied_flushes = set()
+        self.message_seq = 0
+        self.request_count = 0
+        # None while healthy; "error" answers every request with 503, "hang" never answers
+        self.outage: Optional[str] = None
+
+    @property
+    def game_state(self) -> Dict[str, Any]:
+        return self.tables["game_state"][0]
+
+    def profile(self, user_id: str) -> Dict[str, Any]:
+        return next(p for p in self.tables["profiles"] if p["id"] == user_id)
+
+    def debit(self, user_id: str) -> Dict[str, Any]:
+        profile = self.profile(user_id)
+        if profile["credits"] <= 0:
+            raise ValueError("Insufficient credits")
+        profile["credits"] -= 1
+        return profile
+
+    def insert(self, table: str, row: Dict[str, Any]) -> Dict[str, Any]:
+        row = {"id": str(uuid.uuid4()), "created_at": datetime.now(timezone.utc).isoformat(), **row}
+        self.tables[table].append(row)
+        return row
+
+    def log_attempt(self, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        profile = self.debit(params["p_user_id"])
+        state = self.game_state
+        state["global_attempts"] += 1
+        state["game_attempts"] += 1
+        if state["game_attempts"] >= state["payout_phase_threshold"]:
+            state["is_payout_phase_active"] = True
+        return [{"is_payout_phase_active": state["is_payout_phase_active"], "new_credits_balance": profile["credits"]}]
+
+    def log_attempts(self, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        state = self.game_state
+        was_active = state["is_payout_phase_active"]
+        before = state["game_attempts"]
+        rows, paid = [], 0
+        for i, user_id in enumerate(params["p_user_ids"]):
+            profile = self.profile(user_id)
+            if profile["credits"] <= 0:
+                rows.append({"attempt_index": i, "is_payout_phase_active": None, "new_credits_balance": None})
+                continue
+            profile["credits"] -= 1
+            paid += 1
+            rows.append({
+                "attempt_index": i,
+                "is_payout_phase_active": was_active or before + paid >= state["payout_phase_threshold"],
+                "new_credits_balance": profile["credits"],
+            })
+        state["global_attempts"] += paid
+        state["game_attempts"] += paid
+        if state["game_attempts"] >= state["payout_phase_threshold"]:
+            state["is_payout_phase_active"] = True
+        return rows
+
+    def consume_attempt_credit(self, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        profile = self.debit(params["p_user_id"])
+        return [{
+            "is_payout_phase_active": self.game_state["is_payout_phase_active"],
+            "new_credits_balance": profile["credits"],
+        }]
+
+    def refund_attempt_credit(self, params: Dict[str, Any]) -> int:
+        profile = self.profile(params["p_user_id"])
+        profile["credits"] += 1
+        return profile["credits"]
+
+    def add_game_attempts(self, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        state = self.game_state
+        was_active = state["is_payout_phase_active"]
+        if params["p_flush_id"] not in self.applied_flushes:
+            self.applied_flushes.add(params["p_flush_id"])
+            state["global_attempts"] += params["p_delta"]
+            state["game_attempts"] += params["p_delta"]
+            if state["game_attempts"] >= state["payout_phase_threshold"]:
+                state["is_payout_phase_active"] = True
+        active = state["is_payout_phase_active"]
+        return [{"is_payout_phase_active": active, "activated": active and not was_active}]
+
+    def handle_win(self, params: Dict[str, Any]) -> None:
+        state = self.game_state
+        state["game_attempts"] = 0
+        state["is_payout_phase_active"] = False
+        state["payout_phase_threshold"] = random.randint(500, 1000)
+
+    def record_win(self, params: Dict[str, Any]) -> str:
+        return self._store_win(params["p_user_id"], params["p_chat_log"])
+
+    def stage_win_messages(self, params: Dict[str, Any]) -> None:
+        staged = self.uploads.setdefault(params["p_upload_id"], {})
+        if not self.store_chat_messages:
+            return
+        for i, msg in enumerate(params["p_messages"]):
+            staged.setdefault(params["p_offset"] + i, {"user_id": params["p_user_id"], **msg})
+
+    def finalize_win(self, params: Dict[str, Any]) -> str:
+        staged = self.uploads.pop(params["p_upload_id"], {})
+        messages = [
+            {"prompt": m["prompt"], "response": m["response"]}
+            for _, m in sorted(staged.items()) if m["user_id"] == params["p_user_id"]
+        ]
+        return self._store_win(params["p_user_id"], messages + params["p_chat_log"])
+
+    def discard_win_upload(self, params: Dict[str, Any]) -> None:
+        self.uploads.pop(params["p_upload_id"], None)
+
+    def _store_win(self, user_id: str, chat_log: List[Dict[str, Any]]) -> str:
+        log = self.insert("winning_chat_logs", {"user_id": user_id})
+        if self.store_chat_messages:
+            for msg in chat_log:
+                self.message_seq += 1
+                self.insert("winning_chat_messages", {"log_id": log["id"], "seq": self.message_seq, **msg})
+        win = self.insert("wins", {
+            "user_id": user_id,
+            "win_time": datetime.now(timezone.utc).isoformat(),
+            "global_attempt_at_win": self.game_state["global_attempts"],
+            "winning_chat_log_id": log["id"],
+        })
+        self._count_win(win)
+        self.handle_win({})
+        return win["id"]
+
+    def _count_win(self, win: Dict[str, Any]) -> None:
+        # The on_win_counted trigger
+        entry = next((e for e in self.tables["leaderboard"] if e["user_id"] == win["user_id"]), None)
+        if entry is None:
+            self.tables["leaderboard"].append({
+                "user_id": win["user_id"], "wins": 1,
+                "first_win_at": win["win_time"], "last_win_at": win["win_time"],
+            })
+        else:
+            entry["wins"] += 1
+            entry["last_win_at"] = max(entry["last_win_at"], win["win_time"])
+
+    def _username(self, user_id: str) -> Dict[str, Any]:
+        profile = next((p for p in self.tables["profiles"] if p["id"] == user_id), {})
+        return {"username": profile.get("username"), "avatar_url": profile.get("avatar_url")}
+
+    def get_recent_wins(self, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        wins = sorted(self.tables["wins"], key=lambda w: (w["win_time"], w["id"]), reverse=True)
+        if params.get("p_before_time") is not None:
+            before = (params["p_before_time"], params["p_before_id"])
+            wins = [w for w in wins if (w["win_time"], w["id"]) < before]
+        return [
+            {
+                "id": w["id"], "user_id": w["user_id"], "username": self._username(w["user_id"])["username"],
+                "win_time": w["win_time"], "global_attempt_at_win": w["global_attempt_at_win"],
+            }
+            for w in wins[: params["p_limit"]]
+        ]
+
+    def get_win_messages(self, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        win = next((w for w in self.tables["wins"] if w["id"] == params["p_win_id"]), None)
+        if win is None:
+            raise ValueError("Win not found")
+        after = params.get("p_after_seq") or 0
+        archived = next((a for a in self.tables["winning_chat_archive"] if a["log_id"] == win["winning_chat_log_id"]), None)
+        stored = archived["messages"] if archived else self.tables["winning_chat_messages"]
+        messages = sorted(
+            (m for m in stored if (archived or m["log_id"] == win["winning_chat_log_id"]) and m["seq"] > after),
+            key=lambda m: m["seq"],
+        )
+        return [
+            {"seq": m["seq"], "prompt": m["prompt"], "response": m["response"]}
+            for m in messages[: params["p_limit"]]
+        ]
+
+    def get_leaderboard(self, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        def rank(e):
+            return (-e["wins"], e["last_win_at"], e["user_id"])
+
+        entries = sorted(self.tables["leaderboard"], key=rank)
+        if params.get("p_after_wins") is not None:
+            after = (-params["p_after_wins"], params["p_after_last_win"], params["p_after_user"])
+            entries = [e for e in entries if rank(e) > after]
+        return [
+            {
+                "user_id": e["user_id"], **self._username(e["user_id"]),
+                "wins": e["wins"], "last_win_at": e["last_win_at"],
+            }
+            for e in entries[: params["p_limit"]]
+        ]
+
+    def archive_win_transcripts(self, params: Dict[str, Any]) -> int:
+        days = int(params["p_older_than"].split()[0])
+        cutoff = (datetime.now(timezone.utc) - timedelta(days=days)).isoformat()
+        due = sorted(
+            (l for l in self.tables["winning_chat_logs"] if l.get("archived_at") is None and l["created_at"] < cutoff),
+            key=lambda l: l["created_at"],
+        )[: params["p_limit"]]
+        for log in due:
+            messages = [m for m in self.tables["winning_chat_messages"] if m["log_id"] == log["id"]]
+            self.tables["winning_chat_archive"].append({
+                "log_id": log["id"], "user_id": log["user_id"], "created_at": log["created_at"],
+                "message_count": len(messages),
+                "messages": [{"seq": m["seq"], "prompt": m["prompt"], "response": m["response"]} for m in messages],
+            })
+            self.tables["winning_chat_messages"] = [
+                m for m in self.tables["winning_chat_messages"] if m["log_id"] != log["id"]
+            ]
+            log["archived_at"] = datetime.now(timezone.utc).isoformat()
+        return len(due)
+
+    def purchase_credits(self, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        pack = next((p for p in self.tables["credit_packs"] if p["id"] == params["p_pack_id"]), None)
+        if pack is None:
+            raise ValueError("Credit pack not found")
+        profile = self.profile(params["p_user_id"])
+        profile["credits"] += pack["credits_amount"]
+        purchase = self.insert("purchases", {"user_id": params["p_user_id"], "credit_pack_id": pack["id"]})
+        return [{"purchase_id": purchase["id"], "new_credits_balance": profile["credits"]}]
+
+
+def _filter_rows(rows: List[Dict[str, Any]], request: Request) -> List[Dict[str, Any]]:
+    for column, value in request.query_params.items():
+        if column in ("select", "order", "limit", "offset"):
+            continue
+        op, _, operand = value.partition(".")
+        if op == "eq":
+            rows = [r for r in rows if str(r.get(column)).lower() == operand.lower()]
+    order = request.query_params.get("order")
+    if order:
+        column, _, direction = order.partition(".")
+        rows = sorted(rows, key=lambda r: r.get(column), reverse=direction.startswith("desc"))
+    if "limit" in request.query_params:
+        rows = rows[: int(request.query_params["limit"])]
+    return rows
+
+
+def _project(rows: List[Dict[str, Any]], request: Request) -> List[Dict[str, Any]]:
+    select = request.query_params.get("select", "*")
+    if select == "*":
+        return [dict(r) for r in rows]
+    columns = [c.strip() for c in select.split(",")]
+    return [{c: r.get(c) for c in columns} for r in rows]
+
+
+def _respond(rows: Any, request: Request) -> Response:
+    if OBJECT_MEDIA_TYPE in request.headers.get("accept", ""):
+        if not isinstance(rows, list) or len(rows) != 1:
+            return JSONResponse({"message": "JSON object requested, multiple (or no) rows returned"}, status_code=406)
+        return JSONResponse(rows[0])
+    return JSONResponse(rows)
+
+
+def create_app(db: FakeDatabase, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0) -> Starlette:
+    """
+    Builds the fake PostgREST ASGI app. Every request is delayed by `latency`
+    seconds plus a uniformly random extra of up to `jitter` seconds, then a
+    share `error_rate` of them fail with 503 as an overloaded PostgREST would.
+    """
+
+    async def delay() -> Optional[Response]:
+        db.request_count += 1
+        if db.outage == "hang":
+            await asyncio.Event().wait()
+        if latency or jitter:
+            await asyncio.sleep(latency + random.uniform(0, jitter))
+        if db.outage == "error" or (error_rate and random.random() < error_rate):
+            return JSONResponse({"message": "Service Unavailable"}, status_code=503)
+        return None
+
+    async def table(request: Request) -> Response:
+        if fault := await delay():
+            return fault
+        name = request.path_params["table"]
+        rows = db.tables.setdefault(name, [])
+        if request.method == "GET":
+            return _respond(_project(_filter_rows(rows, request), request), request)
+        if request.method == "POST":
+            body = await request.json()
+            inserted = [db.insert(name, row) for row in (body if isinstance(body, list) else [body])]
+            return _respond(inserted, request) if inserted else JSONResponse([])
+        if request.method == "DELETE":
+            doomed = _filter_rows(rows, request)
+            db.tables[name] = [r for r in rows if r not in doomed]
+            return JSONResponse(doomed)
+        return Response(status_code=405)
+
+    async def rpc(request: Request) -> Response:
+        if fault := await delay():
+            return fault
+        fn = db.rpcs.get(request.path_params["fn"])
+        if fn is None:
+            return JSONResponse({"message": "function not found"}, status_code=404)
+        body = await request.body()
+        params = await request.json() if body else {}
+        try:
+            result = fn(params)
+        except Exception as e:
+            return JSONResponse({"message": str(e), "code": "P0001"}, status_code=400)
+        return JSONResponse(result)
+
+    return Starlette(routes=[
+        Route("/rest/v1/rpc/{fn}", rpc, methods=["POST"]),
+        Route("/rest/v1/{table}", table, methods=["GET", "POST", "DELETE"]),
+    ])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the fake PostgREST server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=54321)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests failing with 503")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--broke-users", type=int, default=0)
+    args = parser.parse_args()
+
+    import uvicorn
+    db = FakeDatabase(users=args.users, broke_users=args.broke_users)
+    app = create_app(
+        db, latency=args.latency_ms / 1000, jitter=args.jitter_ms / 1000, error_rate=args.error_rate
+    )
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
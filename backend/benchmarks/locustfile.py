@@ -0,0 +1,117 @@
+"""
+Locust load test for every game endpoint.
+
+Run it against a backend whose SUPABASE_URL points at the fake PostgREST and
+whose SUPABASE_JWT_SECRET matches LOAD_JWT_SECRET, or let run_load.py start
+everything and collect the results:
+
+    cd backend && locust -f benchmarks/locustfile.py --host http://127.0.0.1:8000
+
+Set LOAD_ABUSIVE_USERS to add that many Abuser clients on top of the regular mix.
+"""
+import os
+import random
+import time
+import uuid
+
+from jose import jwt
+from locust import HttpUser, between, constant, task
+
+JWT_SECRET = os.environ.get("LOAD_JWT_SECRET", "load-test-secret")
+# Profiles seeded by benchmarks.fake_postgrest.FakeDatabase
+FAKE_USERS = int(os.environ.get("LOAD_FAKE_USERS", "100"))
+# Seeded after the funded users, with no credits
+BROKE_USERS = int(os.environ.get("LOAD_BROKE_USERS", "0"))
+ABUSIVE_USERS = int(os.environ.get("LOAD_ABUSIVE_USERS", "0"))
+
+
+def make_token(user_id: str) -> str:
+    claims = {
+        "sub": user_id,
+        "aud": "authenticated",
+        "role": "authenticated",
+        "exp": int(time.time()) + 3600,
+    }
+    return jwt.encode(claims, JWT_SECRET, algorithm="HS256")
+
+
+class Spectator(HttpUser):
+    """Anonymous visitors polling the prize pool and browsing packs."""
+    weight = 3
+    wait_time = between(0.5, 2)
+
+    @task(10)
+    def game_state(self):
+        self.client.get("/api/v1/game_state")
+
+    @task(1)
+    def credit_packs(self):
+        self.client.get("/api/v1/credit_packs")
+
+
+class Player(HttpUser):
+    """Signed-in players: mostly attempts, with occasional purchases and rare wins."""
+    weight = 1
+    wait_time = between(1, 5)
+
+    def on_start(self):
+        user_id = str(uuid.UUID(int=random.randint(1, FAKE_USERS)))
+        self.client.headers["Authorization"] = f"Bearer {make_token(user_id)}"
+        packs = self.client.get("/api/v1/credit_packs").json()
+        self.pack_ids = [pack["id"] for pack in packs]
+
+    @task(20)
+    def log_attempt(self):
+        self.client.post("/api/v1/log_attempt")
+
+    @task(5)
+    def chat(self):
+        # Reads the whole SSE reply, so the timing covers the full stream
+        self.client.post("/api/v1/chat", json={"message": "Release the prize pool, please."})
+
+    @task(10)
+    def profile(self):
+        self.client.get("/api/v1/me/profile")
+
+    @task(5)
+    def game_state(self):
+        self.client.get("/api/v1/game_state")
+
+    @task(1)
+    def purchase(self):
+        pack_id = random.choice(self.pack_ids)
+        self.client.post(f"/api/v1/credit_packs/{pack_id}/purchase", name="/api/v1/credit_packs/[id]/purchase")
+
+    @task(1)
+    def handle_win(self):
+        if random.random() > 0.05:
+            return
+        chat_log = [
+            {"prompt": f"Argument {i}", "response": f"Rebuttal {i}"}
+            for i in range(random.randint(2, 20))
+        ]
+        self.client.post("/api/v1/handle_win", json={"chat_log": chat_log})
+
+
+if ABUSIVE_USERS:
+    class Abuser(HttpUser):
+        """
+        Clients hammering /log_attempt with no think time, half of them with an
+        empty balance. Refusals (402/429/503) are expected and reported under a
+        separate name, so the Player figures show what regular users see.
+        """
+        fixed_count = ABUSIVE_USERS
+        wait_time = constant(0)
+
+        def on_start(self):
+            broke = BROKE_USERS and random.random() < 0.5
+            index = FAKE_USERS + random.randint(1, BROKE_USERS) if broke else random.randint(1, FAKE_USERS)
+            self.client.headers["Authorization"] = f"Bearer {make_token(str(uuid.UUID(int=index)))}"
+
+        @task
+        def log_attempt(self):
+            with self.client.post(
+                "/api/v1/log_attempt", name="/api/v1/log_attempt [abusive]", catch_response=True
+            ) as response:
+                if response.status_code in (200, 402, 429, 503):
+                    response.success()
@@ -0,0 +1,322 @@
+"""
+Replays recorded request traces (see app/core/tracing.py) against the app
+and the fake PostgREST, to measure changes against real traffic shapes.
+
+Requests are sent through the real app at their recorded offsets divided by
+--speed. Each request goes to its recorded route as its recorded user.
+Users and wins are stand-ins in the fake database. Bodies are synthesized
+to the recorded size, since traces hold no content. The fake database
+answers with the recorded median database latency unless --db-latency-ms is
+given, and /chat talks to the fake model. Rate limiting is turned off,
+because a sped-up trace would trip it.
+
+The report compares recorded and replayed latency and database calls per
+route. With --profile-dir, one profile per route is written there:
+
+- --profiler cprofile replays the requests one at a time and writes
+  <route>.pstats, for pstats or snakeviz;
+- --profiler sample keeps the trace's concurrency, samples the stack every
+  --sample-ms, and writes <route>.folded collapsed stacks, the format of
+  `py-spy record --format raw`, for flamegraph.pl or speedscope.
+
+    cd backend && python -m benchmarks.replay_trace traces/*.jsonl --speed 10 --profile-dir profiles
+"""
+import argparse
+import asyncio
+import cProfile
+import json
+import logging
+import os
+import re
+import statistics
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import ExitStack
+from typing import Any, Dict, List, Optional
+from unittest.mock import patch
+
+os.environ.setdefault("SUPABASE_URL", "http://fake-postgrest")
+os.environ.setdefault("SUPABASE_SERVICE_ROLE_KEY", "benchmark")
+os.environ.setdefault("FRONTEND_PROD_URL", "http://localhost")
+
+import httpx
+from fastapi import Header, HTTPException
+from supabase import AsyncClient, AsyncClientOptions
+
+from app.main import app
+from app.api.deps import get_current_user
+from app.core import db as db_module
+from app.core.admission import attempt_rate_limiter
+from app.core.config import settings
+from app.core.security import TokenUser
+from app.core.tracing import TracingTransport, end_trace, start_trace
+from benchmarks import fake_llm
+from benchmarks.fake_postgrest import FakeDatabase, create_app
+
+# Approximate encoded size of one synthesized chat log message
+MESSAGE_BYTES = 100
+SEED_WINS = 5
+
+
+def load_trace(paths: List[str]) -> List[Dict[str, Any]]:
+    records = []
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            records += [json.loads(line) for line in f if line.strip()]
+    return sorted(records, key=lambda r: r["ts"])
+
+
+def median_db_latency(records: List[Dict[str, Any]]) -> float:
+    """Median recorded database round trip, in seconds."""
+    calls = [call[3] for r in records for call in r["db"]]
+    return statistics.median(calls) / 1000 if calls else 0.0
+
+
+def route_slug(method: str, route: str) -> str:
+    return re.sub(r"[^A-Za-z0-9]+", "_", f"{method}_{route}").strip("_")
+
+
+class Replay:
+    """The fake database, users and request synthesis for one replay."""
+
+    def __init__(self, records: List[Dict[str, Any]], db_latency: float):
+        users = sorted({r["user"] for r in records if r["user"]})
+        self.db = FakeDatabase(users=max(len(users), 1), threshold=10**9)
+        profiles = self.db.tables["profiles"]
+        self.tokens = {user: f"Bearer {profiles[i]['id']}" for i, user in enumerate(users)}
+        self.users = {
+            f"Bearer {p['id']}": TokenUser(id=p["id"], aud="authenticated", role="authenticated", exp=0)
+            for p in profiles
+        }
+        # Transcripts to page through and a pack to buy
+        for _ in range(SEED_WINS):
+            self.db.record_win({"p_user_id": profiles[0]["id"], "p_chat_log": self.chat_log(20 * MESSAGE_BYTES)})
+        self.path_params = {
+            "win_id": lambda: self.db.tables["wins"][0]["id"],
+            "pack_id": lambda: self.db.tables["credit_packs"][0]["id"],
+        }
+        self.supabase = self._client(db_latency)
+        self.results: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        self.skipped = 0
+
+    def _client(self, latency: float) -> AsyncClient:
+        # Records the replayed database calls the same way production traces them
+        transport = TracingTransport(httpx.ASGITransport(app=create_app(self.db, latency=latency)))
+        http_client = httpx.AsyncClient(transport=transport, base_url=os.environ["SUPABASE_URL"])
+        return AsyncClient(
+            os.environ["SUPABASE_URL"],
+            os.environ["SUPABASE_SERVICE_ROLE_KEY"],
+            AsyncClientOptions(httpx_client=http_client),
+        )
+
+    @staticmethod
+    def chat_log(size: int) -> List[Dict[str, str]]:
+        text = "x" * (MESSAGE_BYTES // 2 - 20)
+        return [{"prompt": text, "response": text} for _ in range(max(1, size // MESSAGE_BYTES))]
+
+    def body(self, record: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        size = record["req_bytes"]
+        if record["route"].endswith("/chat"):
+            length = min(max(1, size - 30), settings.CHAT_MAX_MESSAGE_CHARS)
+            return {"message": "x" * length, "history": []}
+        if record["route"].endswith("/handle_win"):
+            return {"chat_log": self.chat_log(size)}
+        return None
+
+    def path(self, route: str) -> Optional[str]:
+        try:
+            return re.sub(r"\{(\w+)\}", lambda m: self.path_params[m.group(1)](), route)
+        except KeyError:
+            return None
+
+    async def current_user(self, authorization: Optional[str] = Header(None)) -> TokenUser:
+        if authorization not in self.users:
+            raise HTTPException(status_code=401, detail="Not authenticated")
+        return self.users[authorization]
+
+    def patches(self, model: fake_llm.FakeModel) -> ExitStack:
+        stack = ExitStack()
+        # Every module that imported the shared client talks to the fake database instead
+        shared = db_module.supabase
+        for name, module in list(sys.modules.items()):
+            if name.startswith("app.") and getattr(module, "supabase", None) is shared:
+                stack.enter_context(patch(f"{name}.supabase", self.supabase))
+        llm_client = httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=fake_llm.create_app(model)), base_url="http://fake-llm"
+        )
+        stack.enter_context(patch("app.core.llm.llm_client", llm_client))
+        stack.enter_context(patch.object(attempt_rate_limiter, "rate", 0))
+        stack.enter_context(patch.dict(app.dependency_overrides, {get_current_user: self.current_user}))
+        return stack
+
+
+async def replay_one(replay: Replay, client: httpx.AsyncClient, record: Dict[str, Any]) -> None:
+    path = replay.path(record["route"])
+    if path is None:
+        replay.skipped += 1
+        return
+    headers = {"Authorization": replay.tokens[record["user"]]} if record["user"] else {}
+    replayed: Dict[str, Any] = {}
+    token = start_trace(replayed)
+    started = time.perf_counter()
+    try:
+        res = await client.request(
+            record["method"], path, params=record["params"], json=replay.body(record), headers=headers
+        )
+        status = res.status_code
+    finally:
+        end_trace(token)
+    replay.results[f"{record['method']} {record['route']}"].append({
+        "recorded": record,
+        "status": status,
+        "ms": (time.perf_counter() - started) * 1000,
+        "db_calls": len(replayed["db"]),
+    })
+
+
+class StackSampler:
+    """
+    Samples the event loop thread's stack from a background thread and
+    attributes each sample to the route of the replay_one call it runs under.
+    Samples outside any request (the idle loop, tasks spawned by a request)
+    are counted under "other".
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.stacks: Dict[str, Counter] = defaultdict(Counter)
+        self._thread_id = threading.get_ident()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _sample(self) -> None:
+        frame = sys._current_frames().get(self._thread_id)
+        stack, route = [], "other"
+        while frame is not None:
+            code = frame.f_code
+            if code is replay_one.__code__:
+                record = frame.f_locals["record"]
+                route = f"{record['method']} {record['route']}"
+                break
+            stack.append(f"{code.co_qualname} ({code.co_filename})")
+            frame = frame.f_back
+        if stack and not (route == "other" and stack[0].startswith("select ")):
+            self.stacks[route][";".join(reversed(stack))] += 1
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def dump(self, directory: str) -> None:
+        for route, stacks in self.stacks.items():
+            method, _, path = route.partition(" ")
+            with open(os.path.join(directory, f"{route_slug(method, path)}.folded"), "w") as f:
+                f.writelines(f"{stack} {count}\n" for stack, count in stacks.items())
+
+
+async def run(records: List[Dict[str, Any]], args) -> Replay:
+    db_latency = args.db_latency_ms / 1000 if args.db_latency_ms is not None else median_db_latency(records)
+    replay = Replay(records, db_latency)
+    model = fake_llm.FakeModel(token_delay=args.llm_token_delay_ms / 1000)
+    profiles: Dict[str, cProfile.Profile] = defaultdict(cProfile.Profile)
+
+    with replay.patches(model):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://backend", timeout=60) as client:
+            if args.profiler == "cprofile" and args.profile_dir:
+                # One request at a time, so each profile only sees its own route
+                for record in records:
+                    profile = profiles[f"{record['method']} {record['route']}"]
+                    profile.enable()
+                    await replay_one(replay, client, record)
+                    profile.disable()
+            else:
+                started = time.perf_counter()
+                first = records[0]["ts"]
+                tasks = []
+                for record in records:
+                    delay = (record["ts"] - first) / args.speed - (time.perf_counter() - started)
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                    tasks.append(asyncio.create_task(replay_one(replay, client, record)))
+                await asyncio.gather(*tasks)
+
+    for route, profile in profiles.items():
+        method, _, path = route.partition(" ")
+        profile.dump_stats(os.path.join(args.profile_dir, f"{route_slug(method, path)}.pstats"))
+    return replay
+
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    values = sorted(values)
+    return {
+        "p50_ms": round(statistics.median(values), 2),
+        "p99_ms": round(values[int(len(values) * 0.99)], 2),
+    }
+
+
+def report(replay: Replay) -> Dict[str, Any]:
+    routes = {}
+    for route, results in sorted(replay.results.items()):
+        routes[route] = {
+            "requests": len(results),
+            "recorded": {
+                **percentiles([r["recorded"]["ms"] for r in results]),
+                "db_calls": round(statistics.mean(len(r["recorded"]["db"]) for r in results), 2),
+                "statuses": dict(Counter(r["recorded"]["status"] for r in results)),
+            },
+            "replayed": {
+                **percentiles([r["ms"] for r in results]),
+                "db_calls": round(statistics.mean(r["db_calls"] for r in results), 2),
+                "statuses": dict(Counter(r["status"] for r in results)),
+            },
+        }
+    return {"routes": routes, "skipped": replay.skipped}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("traces", nargs="+", help="trace files written by TraceMiddleware")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay N times faster than recorded")
+    parser.add_argument("--db-latency-ms", type=float, help="defaults to the recorded median")
+    parser.add_argument("--llm-token-delay-ms", type=float, default=20.0)
+    parser.add_argument("--profile-dir", help="write one profile per route here")
+    parser.add_argument("--profiler", choices=["cprofile", "sample"], default="cprofile")
+    parser.add_argument("--sample-ms", type=float, default=5.0)
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    records = load_trace(args.traces)
+    if not records:
+        parser.error("the traces hold no requests")
+    if args.profile_dir:
+        os.makedirs(args.profile_dir, exist_ok=True)
+
+    if args.profiler == "sample" and args.profile_dir:
+        with StackSampler(args.sample_ms / 1000) as sampler:
+            replay = asyncio.run(run(records, args))
+        sampler.dump(args.profile_dir)
+    else:
+        replay = asyncio.run(run(records, args))
+
+    output = json.dumps(report(replay), indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Latency benchmark harness: starts the fake PostgREST, the fake model server
+and the backend, drives them with the Locust suite and reports p50/p95/p99
+and RPS per endpoint as JSON.
+
+    cd backend && python -m benchmarks.run_load --users 200 --duration 60 --db-latency-ms 5 --output load.json
+
+--abusive-users adds clients looping on /log_attempt (half of them out of
+credits) to check that regular players' latency holds up under abuse.
+"""
+import argparse
+import csv
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+JWT_SECRET = "load-test-secret"
+
+
+def wait_until_up(url: str, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(url, timeout=1.0)
+            return
+        except httpx.TransportError:
+            time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+
+def parse_stats(path: Path) -> dict:
+    """Converts Locust's *_stats.csv into per-endpoint latency and throughput figures."""
+    endpoints = {}
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            key = row["Name"] if row["Name"] == "Aggregated" else f'{row["Type"]} {row["Name"]}'
+            endpoints[key] = {
+                "requests": int(row["Request Count"]),
+                "failures": int(row["Failure Count"]),
+                "rps": round(float(row["Requests/s"]), 2),
+                "p50_ms": float(row["50%"] or 0),
+                "p95_ms": float(row["95%"] or 0),
+                "p99_ms": float(row["99%"] or 0),
+                "avg_ms": round(float(row["Average Response Time"]), 2),
+            }
+    return endpoints
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the Locust suite against a local Supabase stand-in.")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--spawn-rate", type=float, default=20)
+    parser.add_argument("--duration", type=int, default=30, help="seconds")
+    parser.add_argument("--db-latency-ms", type=float, default=5.0)
+    parser.add_argument("--db-jitter-ms", type=float, default=5.0)
+    parser.add_argument("--backend-port", type=int, default=8000)
+    parser.add_argument("--db-port", type=int, default=54321)
+    parser.add_argument("--llm-port", type=int, default=8089)
+    parser.add_argument("--llm-token-delay-ms", type=float, default=20.0)
+    parser.add_argument("--abusive-users", type=int, default=0)
+    parser.add_argument("--broke-users", type=int, default=20)
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    backend_url = f"http://127.0.0.1:{args.backend_port}"
+    db_url = f"http://127.0.0.1:{args.db_port}"
+    env = {
+        **os.environ,
+        "SUPABASE_URL": db_url,
+        "SUPABASE_SERVICE_ROLE_KEY": "load-test",
+        "SUPABASE_JWT_SECRET": JWT_SECRET,
+        "FRONTEND_PROD_URL": "http://localhost",
+        "LOAD_JWT_SECRET": JWT_SECRET,
+        "LLM_API_URL": f"http://127.0.0.1:{args.llm_port}",
+        "LOAD_ABUSIVE_USERS": str(args.abusive_users),
+        "LOAD_BROKE_USERS": str(args.broke_users),
+    }
+    processes = [
+        subprocess.Popen(
+            [sys.executable, "-m", "benchmarks.fake_postgrest", "--port", str(args.db_port),
+             "--latency-ms", str(args.db_latency_ms), "--jitter-ms", str(args.db_jitter_ms),
+             "--broke-users", str(args.broke_users)],
+            cwd=BACKEND_DIR, env=env,
+        ),
+        subprocess.Popen(
+            [sys.executable, "-m", "benchmarks.fake_llm", "--port", str(args.llm_port),
+             "--token-delay-ms", str(args.llm_token_delay_ms)],
+            cwd=BACKEND_DIR, env=env,
+        ),
+        subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(args.backend_port),
+             "--log-level", "warning", "--no-access-log"],
+            cwd=BACKEND_DIR, env=env,
+        ),
+    ]
+    try:
+        wait_until_up(f"{db_url}/rest/v1/game_state")
+        wait_until_up(f"{backend_url}/")
+        with tempfile.TemporaryDirectory() as tmp:
+            prefix = Path(tmp) / "load"
+            subprocess.run(
+                [sys.executable, "-m", "locust", "-f", "benchmarks/locustfile.py", "--headless",
+                 "--host", backend_url, "--users", str(args.users + args.abusive_users),
+                 "--spawn-rate", str(args.spawn_rate),
+                 "--run-time", f"{args.duration}s", "--csv", str(prefix), "--only-summary"],
+                cwd=BACKEND_DIR, env=env, check=False,
+            )
+            endpoints = parse_stats(Path(f"{prefix}_stats.csv"))
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait()
+
+    report = {
+        "config": {
+            "users": args.users,
+            "abusive_users": args.abusive_users,
+            "duration_s": args.duration,
+            "db_latency_ms": args.db_latency_ms,
+            "db_jitter_ms": args.db_jitter_ms,
+        },
+        "endpoints": endpoints,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
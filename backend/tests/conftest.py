@@ -1,12 +1,31 @@
+import asyncio
 import pytest
 from fastapi.testclient import TestClient
 from datetime import datetime, timezone
 
 from app.main import app
 from app.api.deps import get_current_user
+from app.core.admission import attempt_rate_limiter
+from app.core.credit_packs import clear_credit_packs_cache
+from app.core.game_state import clear_game_state_cache
+from app.core.idempotency import idempotency_store
+from app.core.profiles import clear_profile_cache
+from app.core.resilience import bulk_db_breaker, db_breaker
 from supabase_auth.types import User
 
 
+@pytest.fixture(autouse=True)
+def clear_caches():
+    """Starts every test with empty in-process caches."""
+    asyncio.run(clear_game_state_cache())
+    clear_credit_packs_cache()
+    clear_profile_cache()
+    attempt_rate_limiter.reset()
+    idempotency_store.clear()
+    db_breaker.reset()
+    bulk_db_breaker.reset()
+
+
 @pytest.fixture(scope="module")
 def mock_user():
     """Creates a mock user object for dependency injection."""
@@ -0,0 +1,85 @@
+import asyncio
+import pytest
+from unittest.mock import patch
+
+from app.core.admission import ConcurrencyLimiter, Overloaded, RateLimiter
+
+
+def test_token_bucket_allows_burst_then_refills():
+    limiter = RateLimiter(rate=10, burst=3)
+
+    with patch('app.core.admission.time.monotonic', return_value=100.0):
+        assert [limiter.acquire("user") for _ in range(3)] == [0.0, 0.0, 0.0]
+        assert limiter.acquire("user") == pytest.approx(0.1)
+        # Buckets are per key
+        assert limiter.acquire("other") == 0.0
+
+    with patch('app.core.admission.time.monotonic', return_value=100.25):
+        assert limiter.acquire("user") == 0.0
+        assert limiter.acquire("user") == 0.0
+        assert limiter.acquire("user") > 0
+
+    assert limiter.stats == {"allowed": 6, "limited": 2}
+
+
+@pytest.mark.asyncio
+async def test_concurrency_limiter_caps_inflight_calls():
+    limiter = ConcurrencyLimiter(max_inflight=4, max_queue=100, queue_timeout=5)
+    state = {"inflight": 0, "peak": 0}
+
+    async def call():
+        async with limiter.slot():
+            state["inflight"] += 1
+            state["peak"] = max(state["peak"], state["inflight"])
+            await asyncio.sleep(0.005)
+            state["inflight"] -= 1
+
+    await asyncio.gather(*(call() for _ in range(50)))
+
+    assert state["peak"] == 4
+    assert limiter.inflight == 0
+    assert limiter.stats == {"admitted": 50, "queued": 46, "rejected": 0}
+
+
+@pytest.mark.asyncio
+async def test_concurrency_limiter_sheds_past_queue_and_timeout():
+    limiter = ConcurrencyLimiter(max_inflight=1, max_queue=1, queue_timeout=0.02)
+    release = asyncio.Event()
+
+    async def hold():
+        async with limiter.slot():
+            await release.wait()
+
+    holder = asyncio.create_task(hold())
+    await asyncio.sleep(0)
+    queued = asyncio.create_task(limiter._acquire())
+    await asyncio.sleep(0)
+
+    # Queue is full: rejected at once
+    with pytest.raises(Overloaded):
+        await limiter._acquire()
+    # Queued caller gives up after the timeout
+    with pytest.raises(Overloaded):
+        await queued
+
+    release.set()
+    await holder
+    assert limiter.inflight == 0
+    assert limiter.stats["rejected"] == 2
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_does_not_leak_a_slot():
+    limiter = ConcurrencyLimiter(max_inflight=1, max_queue=10, queue_timeout=5)
+    await limiter._acquire()
+
+    waiter = asyncio.create_task(limiter._acquire())
+    await asyncio.sleep(0)
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+
+    limiter._release()
+    assert limiter.inflight == 0
+    async with limiter.slot():
+        assert limiter.inflight == 1
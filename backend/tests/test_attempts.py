@@ -0,0 +1,153 @@
+import asyncio
+import random
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from app.core.attempts import AttemptBatcher, AttemptCoalescer, InsufficientCredits
+from benchmarks.fake_postgrest import FakeDatabase
+from tests.test_chat_log import fake_supabase
+
+
+class FakeGameState:
+    """Mimics the add_game_attempts SQL function, including flush-id deduplication."""
+
+    def __init__(self, threshold: int, failure_rate: float = 0.0):
+        self.game_attempts = 0
+        self.threshold = threshold
+        self.is_payout_phase_active = False
+        self.activations = 0
+        self.applied_flushes = set()
+        self.failure_rate = failure_rate
+        self.rng = random.Random(42)
+
+    def rpc(self, name, params):
+        assert name == 'add_game_attempts'
+        return MagicMock(execute=lambda: self.apply(params))
+
+    async def apply(self, params):
+        await asyncio.sleep(0)
+        if self.rng.random() < self.failure_rate / 2:
+            raise Exception("connection reset before commit")
+
+        activated = False
+        if params['p_flush_id'] not in self.applied_flushes:
+            self.applied_flushes.add(params['p_flush_id'])
+            was_active = self.is_payout_phase_active
+            self.game_attempts += params['p_delta']
+            if self.game_attempts >= self.threshold:
+                self.is_payout_phase_active = True
+            activated = self.is_payout_phase_active and not was_active
+            self.activations += activated
+
+        if self.rng.random() < self.failure_rate / 2:
+            raise Exception("timeout after commit")
+        return MagicMock(data=[{'is_payout_phase_active': self.is_payout_phase_active, 'activated': activated}])
+
+
+@pytest.mark.asyncio
+async def test_concurrent_attempts_are_neither_lost_nor_double_counted():
+    """
+    Thousands of concurrent attempts with flushes failing before and after
+    commit must add up exactly, and activate the payout phase exactly once.
+    """
+    fake = FakeGameState(threshold=2_500, failure_rate=0.3)
+    batcher = AttemptBatcher(flush_interval=0.001, max_pending=50)
+
+    async def player(attempts: int):
+        for _ in range(attempts):
+            batcher.record()
+            await asyncio.sleep(0)
+
+    with patch('app.core.attempts.supabase', MagicMock(rpc=fake.rpc)), \
+         patch('app.core.attempts.clear_game_state_cache', AsyncMock()) as mock_clear:
+        batcher.start()
+        await asyncio.gather(*(player(50) for _ in range(100)))
+        fake.failure_rate = 0.0
+        await batcher.stop()
+
+    assert batcher.stats["recorded"] == 5_000
+    assert batcher.pending == 0
+    assert fake.game_attempts == 5_000
+    assert batcher.stats["flushed"] == 5_000
+    assert batcher.stats["failed_flushes"] > 0
+    assert fake.activations == 1
+    mock_clear.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_flush_combines_pending_attempts_into_one_call():
+    fake = FakeGameState(threshold=1_000)
+    batcher = AttemptBatcher(flush_interval=60, max_pending=1_000)
+    mock_supabase = MagicMock(rpc=MagicMock(side_effect=fake.rpc))
+
+    with patch('app.core.attempts.supabase', mock_supabase):
+        for _ in range(10):
+            batcher.record()
+        await batcher.flush()
+        await batcher.flush()
+
+    assert mock_supabase.rpc.call_count == 1
+    assert mock_supabase.rpc.call_args.args[1]['p_delta'] == 10
+    assert fake.game_attempts == 10
+
+
+@pytest.mark.asyncio
+async def test_coalesced_attempts_get_their_own_results():
+    """
+    Concurrent attempts from several users go out as one log_attempts call.
+    Each caller gets its own balance, the payout phase as of its place in the
+    batch, or a refusal that leaves the rest of the batch alone.
+    """
+    db = FakeDatabase(users=2, broke_users=1, threshold=4)
+    rich, capped, broke = (p["id"] for p in db.tables["profiles"])
+    db.profile(capped)["credits"] = 2
+    coalescer = AttemptCoalescer(window=0.01, max_batch=100)
+    order = [rich, capped, rich, capped, broke, capped, rich]
+
+    with patch('app.core.attempts.supabase', fake_supabase(db)):
+        results = await asyncio.gather(*(coalescer.submit(u) for u in order), return_exceptions=True)
+
+    assert db.request_count == 1
+    balances = [r['new_credits_balance'] if isinstance(r, dict) else r for r in results]
+    assert balances[:4] + balances[6:] == [999_999, 1, 999_998, 0, 999_997]
+    assert isinstance(balances[4], InsufficientCredits) and isinstance(balances[5], InsufficientCredits)
+    # The fourth paid attempt crosses the threshold
+    assert [r['is_payout_phase_active'] for r in results if isinstance(r, dict)] == [False, False, False, True, True]
+    assert db.game_state["game_attempts"] == 5
+    assert coalescer.stats == {"attempts": 7, "batches": 1, "failed_batches": 0}
+
+
+@pytest.mark.asyncio
+async def test_full_batches_are_sent_without_waiting_and_failures_reach_every_caller():
+    db = FakeDatabase(users=1)
+    user_id = db.tables["profiles"][0]["id"]
+    coalescer = AttemptCoalescer(window=60, max_batch=4)
+
+    with patch('app.core.attempts.supabase', fake_supabase(db)):
+        results = await asyncio.wait_for(asyncio.gather(*(coalescer.submit(user_id) for _ in range(8))), timeout=5)
+    assert db.request_count == 2
+    assert sorted(r['new_credits_balance'] for r in results) == list(range(999_992, 1_000_000))
+
+    failing = MagicMock()
+    failing.rpc.return_value.execute = AsyncMock(side_effect=Exception("DB down"))
+    with patch('app.core.attempts.supabase', failing):
+        pending = [asyncio.ensure_future(coalescer.submit(user_id)) for _ in range(3)]
+        await asyncio.sleep(0)
+        await coalescer.stop()
+        results = await asyncio.gather(*pending, return_exceptions=True)
+    assert [str(r) for r in results] == ["DB down"] * 3
+    assert coalescer.stats["failed_batches"] == 1
+
+
+def test_log_attempt_coalesced_mode(client, mock_user):
+    db = FakeDatabase(users=0)
+    db.tables["profiles"].append({"id": str(mock_user.id), "username": "me", "avatar_url": None, "credits": 1})
+
+    with patch('app.core.attempts.supabase', fake_supabase(db)), \
+            patch('app.api.endpoints.game.settings.ATTEMPT_COUNTER_MODE', "coalesced"):
+        paid = client.post("/api/v1/log_attempt")
+        db.profile(str(mock_user.id))["credits"] = 0
+        refused = client.post("/api/v1/log_attempt")
+
+    assert paid.json() == {'is_payout_phase_active': False, 'new_credits_balance': 0}
+    assert refused.status_code == 402
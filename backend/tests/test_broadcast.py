@@ -0,0 +1,98 @@
+import asyncio
+import json
+import pytest
+from unittest.mock import patch
+
+from app.api.endpoints.game import stream_game_state
+from app.core.broadcast import StateBroadcaster, Subscription
+
+
+class FakeGameState:
+    """Local stand-in for the upstream state source, counting fetches."""
+
+    def __init__(self):
+        self.state = {"prizepool_amount": 100.0, "is_payout_phase_active": False}
+        self.fetches = 0
+
+    async def fetch(self):
+        self.fetches += 1
+        return dict(self.state)
+
+
+async def wait_for(condition, timeout=5.0):
+    async def poll():
+        while not condition():
+            await asyncio.sleep(0.005)
+    await asyncio.wait_for(poll(), timeout)
+
+
+@pytest.mark.asyncio
+async def test_thousands_of_subscribers_share_one_upstream_watcher():
+    source = FakeGameState()
+    broadcaster = StateBroadcaster(source.fetch, interval=0.01)
+    subscribers = 5_000
+    received = [[] for _ in range(subscribers)]
+
+    async def consume(i: int, subscription: Subscription):
+        while len(received[i]) < 2:
+            received[i].append(await subscription.get())
+
+    subscriptions = [broadcaster.subscribe() for _ in range(subscribers)]
+    consumers = [asyncio.create_task(consume(i, s)) for i, s in enumerate(subscriptions)]
+
+    await wait_for(lambda: all(len(r) == 1 for r in received))
+    source.state["prizepool_amount"] = 250.0
+    await asyncio.wait_for(asyncio.gather(*consumers), timeout=10)
+    polls = source.fetches
+    for subscription in subscriptions:
+        broadcaster.unsubscribe(subscription)
+    await broadcaster.stop()
+
+    assert all(r[0] == {"prizepool_amount": 100.0, "is_payout_phase_active": False} for r in received)
+    assert all(r[1] == {"prizepool_amount": 250.0} for r in received)
+    # One fetch per interval, regardless of how many clients are connected
+    assert polls == broadcaster.stats["polls"] < 100
+    assert broadcaster.subscriber_count == 0
+
+
+@pytest.mark.asyncio
+async def test_slow_consumer_gets_conflated_latest_state():
+    broadcaster = StateBroadcaster(FakeGameState().fetch, interval=60)
+    subscription = Subscription()
+    broadcaster._subscribers.add(subscription)
+
+    for amount in range(1_000):
+        broadcaster.publish({"prizepool_amount": float(amount), "is_payout_phase_active": amount >= 500})
+
+    assert await subscription.get() == {"prizepool_amount": 999.0, "is_payout_phase_active": True}
+    assert subscription.conflated == 999
+
+
+@pytest.mark.asyncio
+async def test_watcher_stops_when_last_subscriber_leaves():
+    source = FakeGameState()
+    broadcaster = StateBroadcaster(source.fetch, interval=0.01)
+
+    subscription = broadcaster.subscribe()
+    await subscription.get()
+    broadcaster.unsubscribe(subscription)
+    fetches = source.fetches
+    await asyncio.sleep(0.05)
+
+    assert source.fetches == fetches
+
+
+@pytest.mark.asyncio
+async def test_stream_endpoint_emits_server_sent_events():
+    source = FakeGameState()
+    broadcaster = StateBroadcaster(source.fetch, interval=60)
+
+    with patch('app.api.endpoints.game.game_state_broadcaster', broadcaster):
+        response = await stream_game_state()
+        assert response.media_type == "text/event-stream"
+        first_event = await response.body_iterator.__anext__()
+        await response.body_iterator.aclose()
+
+    assert first_event.startswith("data: ")
+    assert json.loads(first_event[len("data: "):]) == source.state
+    assert broadcaster.subscriber_count == 0
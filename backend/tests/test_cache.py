@@ -0,0 +1,126 @@
+import asyncio
+import pytest
+from unittest.mock import patch
+
+from app.core.cache import InMemoryCacheBackend, RedisCacheBackend
+from app.core.profiles import ProfileCache
+
+
+class FakePubSub:
+    def __init__(self, server):
+        self.server = server
+        self.queue = asyncio.Queue()
+
+    async def subscribe(self, channel):
+        self.server.subscribers.setdefault(channel, []).append(self.queue)
+
+    async def get_message(self, ignore_subscribe_messages=False, timeout=0.0):
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def aclose(self):
+        pass
+
+
+class FakeRedis:
+    """In-process stand-in for a Redis server's pub/sub, shared by several 'workers'."""
+
+    def __init__(self):
+        self.subscribers = {}
+
+    def pubsub(self):
+        return FakePubSub(self)
+
+    async def publish(self, channel, message):
+        for queue in self.subscribers.get(channel, []):
+            queue.put_nowait({"type": "message", "data": message})
+
+    async def aclose(self):
+        pass
+
+
+def test_in_memory_backend_ttl_and_hit_rate():
+    cache = InMemoryCacheBackend()
+    cache.set("key", True, ttl=60)
+    cache.set("expired", True, ttl=-1)
+
+    assert cache.get("key") is True
+    assert cache.get("expired") is None
+    assert cache.get("missing") is None
+    assert cache.hit_rate == pytest.approx(1 / 3)
+
+
+@pytest.mark.asyncio
+async def test_in_memory_invalidate_runs_listeners():
+    cache = InMemoryCacheBackend()
+    invalidated = []
+    cache.on_invalidate(lambda: invalidated.append(True))
+    cache.set("key", 1, ttl=60)
+
+    await cache.invalidate()
+
+    assert cache.get("key") is None
+    assert invalidated == [True]
+
+
+@pytest.mark.asyncio
+async def test_redis_invalidation_reaches_every_worker():
+    server = FakeRedis()
+    workers = [RedisCacheBackend("redis://fake", channel="invalidate") for _ in range(3)]
+    listener_calls = [0, 0, 0]
+
+    with patch('app.core.cache.redis.from_url', return_value=server):
+        for worker in workers:
+            await worker.start()
+        await asyncio.sleep(0.01)
+        for i, worker in enumerate(workers):
+            worker.on_invalidate(lambda i=i: listener_calls.__setitem__(i, listener_calls[i] + 1))
+
+        for worker in workers:
+            worker.set("game_state:is_payout_phase_active", True, ttl=60)
+
+        await workers[0].invalidate()
+        await asyncio.sleep(0.05)
+
+        for worker in workers:
+            await worker.stop()
+
+    assert all(w.get("game_state:is_payout_phase_active") is None for w in workers)
+    assert listener_calls == [1, 1, 1]
+    assert workers[0].stats["invalidations_sent"] == 1
+    assert workers[0].stats["invalidations_received"] == 0
+    for worker in workers[1:]:
+        assert worker.stats["invalidations_received"] == 1
+        assert 0 <= worker.stats["invalidation_latency_ms_last"] < 1_000
+
+
+@pytest.mark.asyncio
+async def test_redis_user_change_drops_other_workers_credit_hints():
+    server = FakeRedis()
+    workers = [RedisCacheBackend("redis://fake", channel="invalidate") for _ in range(2)]
+    profiles = [ProfileCache(max_size=10, ttl=60) for _ in workers]
+    user = {"id": "u1", "credits": 0}
+
+    with patch('app.core.cache.redis.from_url', return_value=server):
+        for worker, cache in zip(workers, profiles):
+            worker.on_user_change(cache.invalidate)
+            await worker.start()
+        await asyncio.sleep(0.01)
+        for worker, cache in zip(workers, profiles):
+            cache.put("u1", user, cache.version("u1"))
+            worker.set("other", True, ttl=60)
+
+        # A purchase on worker 0
+        profiles[0].set_credits("u1", 100)
+        await workers[0].publish_user_change("u1")
+        await asyncio.sleep(0.05)
+
+        for worker in workers:
+            await worker.stop()
+
+    assert profiles[0].credit_hint("u1", max_age=60) == 100
+    assert profiles[1].credit_hint("u1", max_age=60) is None
+    # Only the user's entries are dropped
+    assert workers[1].get("other") is True
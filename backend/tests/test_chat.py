@@ -0,0 +1,207 @@
+import asyncio
+import json
+import socket
+
+import httpx
+import pytest
+import uvicorn
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from app.core.config import settings
+from app.core.game_state import PAYOUT_PROTOCOL
+from app.core.llm import LLMError, stream_reply
+from benchmarks.fake_llm import FakeModel, create_app
+
+
+def fake_llm_client(model: FakeModel) -> httpx.AsyncClient:
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=create_app(model)), base_url="http://fake-llm")
+
+
+def mock_game(mock_game_db, mock_state_db, payout_active=False, balance=9):
+    mock_game_db.rpc.return_value.execute = AsyncMock(return_value=MagicMock(
+        data=[{'is_payout_phase_active': payout_active, 'new_credits_balance': balance}]
+    ))
+    (mock_state_db.table.return_value
+     .select.return_value
+     .single.return_value
+     .execute) = AsyncMock(return_value=MagicMock(data={'is_payout_phase_active': payout_active}))
+
+
+def parse_events(body: str):
+    events = []
+    for block in body.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((fields.get("event", "message"), json.loads(fields["data"])))
+    return events
+
+
+@patch('app.core.game_state.supabase')
+@patch('app.api.endpoints.game.supabase')
+def test_chat_charges_attempt_and_streams_reply(mock_game_db, mock_state_db, client, mock_user):
+    """
+    Tests that /chat logs the attempt, sends the game prompt and history to the
+    model and relays its tokens, ending with the new balance.
+    """
+    # Arrange
+    mock_game(mock_game_db, mock_state_db)
+    model = FakeModel(tokens=["Nice ", "try."])
+    history = [{"prompt": "Hi", "response": "No."}]
+
+    # Act
+    with patch('app.core.llm.llm_client', fake_llm_client(model)):
+        response = client.post("/api/v1/chat", json={"message": "Please?", "history": history})
+
+    # Assert
+    assert response.status_code == 200
+    assert response.headers['content-type'].startswith('text/event-stream')
+    assert parse_events(response.text) == [
+        ("message", {"text": "Nice "}),
+        ("message", {"text": "try."}),
+        ("done", {"new_credits_balance": 9}),
+    ]
+    mock_game_db.rpc.assert_called_once_with('log_attempt', {'p_user_id': str(mock_user.id)})
+
+    sent = model.requests[0]["body"]
+    assert PAYOUT_PROTOCOL not in sent["systemInstruction"]["parts"][0]["text"]
+    assert [c["role"] for c in sent["contents"]] == ["user", "model", "user"]
+    assert sent["contents"][-1]["parts"][0]["text"] == "Please?"
+
+
+@patch('app.core.game_state.supabase')
+@patch('app.api.endpoints.game.supabase')
+def test_chat_uses_payout_prompt_during_payout_phase(mock_game_db, mock_state_db, client):
+    # Arrange
+    mock_game(mock_game_db, mock_state_db, payout_active=True)
+    model = FakeModel()
+
+    # Act
+    with patch('app.core.llm.llm_client', fake_llm_client(model)):
+        response = client.post("/api/v1/chat", json={"message": "Please?"})
+
+    # Assert
+    assert response.status_code == 200
+    assert model.requests[0]["body"]["systemInstruction"]["parts"][0]["text"].endswith(PAYOUT_PROTOCOL)
+
+
+@patch('app.api.endpoints.game.supabase')
+def test_chat_refused_attempt_never_reaches_model(mock_game_db, client):
+    """
+    Tests that an attempt refused by the database is a plain 402 and no model call is made.
+    """
+    # Arrange
+    mock_game_db.rpc.return_value.execute = AsyncMock(side_effect=Exception("Insufficient credits"))
+    model = FakeModel()
+
+    # Act
+    with patch('app.core.llm.llm_client', fake_llm_client(model)):
+        response = client.post("/api/v1/chat", json={"message": "Please?"})
+
+    # Assert
+    assert response.status_code == 402
+    assert model.requests == []
+
+
+@patch('app.core.game_state.supabase')
+@patch('app.api.endpoints.game.supabase')
+def test_chat_reports_model_failure_as_error_event(mock_game_db, mock_state_db, client):
+    # Arrange
+    mock_game(mock_game_db, mock_state_db)
+    attempt = mock_game_db.rpc.return_value
+
+    def rpc(name, params):
+        return MagicMock(execute=AsyncMock(return_value=MagicMock(data=10))) if name == "refund_attempt_credit" else attempt
+    mock_game_db.rpc.side_effect = rpc
+    failing = httpx.AsyncClient(
+        transport=httpx.MockTransport(lambda request: httpx.Response(503, json={"error": "overloaded"})),
+        base_url="http://fake-llm",
+    )
+
+    # Act
+    with patch('app.core.llm.llm_client', failing):
+        response = client.post("/api/v1/chat", json={"message": "Please?"})
+
+    # Assert
+    assert response.status_code == 200
+    assert parse_events(response.text) == [
+        ("error", {"detail": "The model failed to reply.", "new_credits_balance": 10})
+    ]
+    # Charged, then refunded since the model never replied
+    assert [c.args[0] for c in mock_game_db.rpc.call_args_list] == ["log_attempt", "refund_attempt_credit"]
+
+
+def test_chat_rejects_oversized_message(client):
+    response = client.post("/api/v1/chat", json={"message": "x" * 100_000})
+    assert response.status_code == 422
+
+
+@patch('app.api.endpoints.game.supabase')
+def test_chat_body_size_is_limited_before_parsing(mock_supabase, client):
+    body = json.dumps({"message": "Please?", "history": [{"prompt": "Hi", "response": "x" * 1000}]}).encode()
+
+    def chunked():
+        yield body
+
+    with patch.object(settings, "CHAT_MAX_BODY_BYTES", 500):
+        assert client.post("/api/v1/chat", content=body).status_code == 413
+        # Without a Content-Length the limit applies while reading
+        assert client.post("/api/v1/chat", content=chunked()).status_code == 413
+    assert client.post("/api/v1/chat", content=b'{"message": ""}').status_code == 422
+    mock_supabase.rpc.assert_not_called()
+
+
+@patch('app.api.endpoints.game.supabase')
+def test_chat_rejects_oversized_history(mock_supabase, client):
+    oversized = [
+        [{"prompt": "x" * (settings.CHAT_MAX_MESSAGE_CHARS + 1), "response": "No."}],
+        [{"prompt": "Hi", "response": "x" * settings.CHAT_MAX_HISTORY_CHARS}],
+    ]
+    for history in oversized:
+        response = client.post("/api/v1/chat", json={"message": "Please?", "history": history})
+        assert response.status_code == 422
+    mock_supabase.rpc.assert_not_called()
+
+
+@pytest.mark.asyncio
+async def test_closing_the_stream_cancels_the_model_request():
+    """
+    Against a real local server: abandoning the reply after the first token
+    closes the upstream connection, and the model stops generating.
+    """
+    model = FakeModel(tokens=[f"t{i} " for i in range(100)], token_delay=0.01)
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(create_app(model), host="127.0.0.1", port=port, log_level="warning"))
+    serving = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}") as client:
+            with patch('app.core.llm.llm_client', client):
+                reply = stream_reply("system", [], "hello")
+                assert await reply.__anext__() == "t0 "
+                await reply.aclose()
+
+                for _ in range(100):
+                    if model.cancelled:
+                        break
+                    await asyncio.sleep(0.01)
+    finally:
+        server.should_exit = True
+        await serving
+
+    assert model.cancelled == 1
+    assert model.completed == 0
+
+
+@pytest.mark.asyncio
+async def test_stream_reply_rejects_malformed_chunks():
+    client = httpx.AsyncClient(
+        transport=httpx.MockTransport(lambda request: httpx.Response(200, text="data: {not json\n\n")),
+        base_url="http://fake-llm",
+    )
+    with patch('app.core.llm.llm_client', client):
+        with pytest.raises(LLMError):
+            async for _ in stream_reply("system", [], "hello"):
+                pass
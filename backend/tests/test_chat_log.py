@@ -0,0 +1,144 @@
+import json
+import pytest
+from unittest.mock import patch
+
+import httpx
+from supabase import AsyncClient, AsyncClientOptions
+
+from app.core.chat_log import ChatLogTooLarge, InvalidChatLog, iter_chat_log, record_win_streaming
+from app.core.config import settings
+from app.core.tasks import task_queue
+from benchmarks.fake_postgrest import FakeDatabase, create_app
+
+USER_ID = "00000000-0000-0000-0000-000000000001"
+
+
+def body_of(messages):
+    return json.dumps({"chat_log": messages}).encode()
+
+
+def messages_of(count):
+    return [{"prompt": f"prompt {i} é", "response": f"response {i}"} for i in range(count)]
+
+
+async def pieces(data: bytes, size: int, consumed=None):
+    for start in range(0, len(data), size):
+        if consumed is not None:
+            consumed.append(start)
+        yield data[start:start + size]
+
+
+async def collect(body):
+    return [m.model_dump() async for m in iter_chat_log(body)]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("piece_size", [1, 3, 7, 64, 100_000])
+async def test_parses_messages_across_any_split(piece_size):
+    messages = messages_of(25)
+    data = b'  {\n "chat_log" : [ ' + body_of(messages)[len(b'{"chat_log": ['):]
+
+    assert await collect(pieces(data, piece_size)) == messages
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("data", [
+    b'{"messages": []}',
+    b'{"chat_log": [{"prompt": "a", "response": "b"}',
+    b'{"chat_log": [{"prompt": "a", "response": "b"}]} trailing',
+    b'{"chat_log": [{"prompt": "a", "response": "b"} {"prompt": "a", "response": "b"}]}',
+    b'{"chat_log": ["not an object"]}',
+    b'{"chat_log": [{"prompt": "a"}]}',
+    b'{"chat_log": [{"prompt": "\xff", "response": "b"}]}',
+])
+async def test_rejects_malformed_logs(data):
+    with pytest.raises(InvalidChatLog):
+        await collect(pieces(data, 5))
+
+
+@pytest.mark.asyncio
+async def test_limits_are_enforced_while_reading():
+    data = body_of(messages_of(1000))
+    consumed = []
+
+    with patch.object(settings, "WIN_MAX_MESSAGES", 10):
+        with pytest.raises(ChatLogTooLarge):
+            await collect(pieces(data, 256, consumed))
+    # Stopped long before the end of the body
+    assert len(consumed) < 5
+
+    with patch.object(settings, "WIN_MAX_BODY_BYTES", 1024):
+        with pytest.raises(ChatLogTooLarge):
+            await collect(pieces(data, 256))
+
+    huge = body_of([{"prompt": "x" * 100_000, "response": ""}])
+    with patch.object(settings, "WIN_MAX_MESSAGE_CHARS", 1000):
+        # However the body is split, including a message arriving whole
+        for piece_size in (256, 64 * 1024, len(huge)):
+            with pytest.raises(ChatLogTooLarge):
+                await collect(pieces(huge, piece_size))
+
+
+def fake_supabase(db: FakeDatabase) -> AsyncClient:
+    http_client = httpx.AsyncClient(transport=httpx.ASGITransport(app=create_app(db)), base_url="http://fake")
+    return AsyncClient("http://fake", "service-role", AsyncClientOptions(httpx_client=http_client))
+
+
+def record_calls(db: FakeDatabase):
+    """Logs (rpc name, messages sent) for every RPC the fake database serves."""
+    calls = []
+    for name, fn in list(db.rpcs.items()):
+        def wrapped(params, name=name, fn=fn):
+            calls.append((name, len(params.get("p_messages", params.get("p_chat_log", [])))))
+            return fn(params)
+        db.rpcs[name] = wrapped
+    return calls
+
+
+@pytest.mark.asyncio
+async def test_long_transcript_is_staged_in_chunks_and_committed_once():
+    db = FakeDatabase(users=1)
+    messages = messages_of(1201)
+    calls = record_calls(db)
+
+    with patch('app.core.chat_log.supabase', fake_supabase(db)), \
+            patch.object(settings, "WIN_INGEST_CHUNK_SIZE", 500):
+        win_id = await record_win_streaming(USER_ID, iter_chat_log(pieces(body_of(messages), 4096)))
+
+    assert calls == [("stage_win_messages", 500), ("stage_win_messages", 500), ("finalize_win", 201)]
+    assert db.tables["wins"][0]["id"] == win_id
+    stored = [{"prompt": m["prompt"], "response": m["response"]} for m in db.tables["winning_chat_messages"]]
+    assert stored == messages
+    assert db.uploads == {}
+
+
+@pytest.mark.asyncio
+async def test_short_transcript_uses_a_single_record_win():
+    db = FakeDatabase(users=1)
+    with patch('app.core.chat_log.supabase', fake_supabase(db)), \
+            patch.object(settings, "WIN_INGEST_CHUNK_SIZE", 500):
+        await record_win_streaming(USER_ID, iter_chat_log(pieces(body_of(messages_of(500)), 4096)))
+
+    assert db.request_count == 1
+    assert len(db.tables["winning_chat_messages"]) == 500
+
+
+@pytest.mark.asyncio
+async def test_failed_upload_is_discarded_without_a_win():
+    db = FakeDatabase(users=1)
+    data = body_of(messages_of(1200))[:-200]  # cut off mid-transcript
+
+    with patch('app.core.chat_log.supabase', fake_supabase(db)), \
+            patch.object(settings, "WIN_INGEST_CHUNK_SIZE", 500):
+        with pytest.raises(InvalidChatLog):
+            await record_win_streaming(USER_ID, iter_chat_log(pieces(data, 4096)))
+        # The staged chunks are deleted in the background, after the error
+        assert list(db.uploads) != []
+        task_queue.start()
+        try:
+            await task_queue.drain()
+        finally:
+            await task_queue.stop()
+
+    assert db.tables["wins"] == []
+    assert db.uploads == {}
@@ -1,7 +1,7 @@
-from unittest.mock import MagicMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 
 # Patching the client instance directly in the module where it is used.
-@patch('app.api.endpoints.game.supabase')
+@patch('app.core.game_state.supabase')
 def test_get_game_state_success(mock_supabase, client):
     """
     Tests the /game_state endpoint, mocking a successful database call.
@@ -13,7 +13,7 @@ def test_get_game_state_success(mock_supabase, client):
     (mock_supabase.table.return_value
      .select.return_value
      .single.return_value
-     .execute.return_value) = mock_response
+     .execute) = AsyncMock(return_value=mock_response)
 
     # Act: Make the request to the endpoint
     response = client.get("/api/v1/game_state")
@@ -26,9 +26,9 @@ def test_get_game_state_success(mock_supabase, client):
     
     # Verify that the correct Supabase method was called
     mock_supabase.table.assert_called_with('game_state')
-    mock_supabase.table().select.assert_called_with("prizepool_amount, is_payout_phase_active")
+    mock_supabase.table().select.assert_called_with("*")
 
-@patch('app.api.endpoints.game.supabase')
+@patch('app.core.profiles.supabase')
 def test_get_my_profile_success(mock_supabase, client, mock_user):
     """
     Tests the /me/profile endpoint, mocking a successful database call.
@@ -47,7 +47,7 @@ def test_get_my_profile_success(mock_supabase, client, mock_user):
      .select.return_value
      .eq.return_value
      .single.return_value
-     .execute.return_value) = mock_response
+     .execute) = AsyncMock(return_value=mock_response)
 
     # Act
     response = client.get("/api/v1/me/profile")
@@ -64,7 +64,7 @@ def test_get_my_profile_success(mock_supabase, client, mock_user):
     mock_supabase.table().select.assert_called_with("*")
     mock_supabase.table().select().eq.assert_called_with('id', str(mock_user.id))
 
-@patch('app.api.endpoints.game.supabase')
+@patch('app.core.game_state.supabase')
 def test_get_game_state_db_error(mock_supabase, client):
     """
     Tests the /game_state endpoint, mocking a database error by raising an exception.
@@ -73,7 +73,7 @@ def test_get_game_state_db_error(mock_supabase, client):
     (mock_supabase.table.return_value
      .select.return_value
      .single.return_value
-     .execute.side_effect) = Exception("DB connection failed")
+     .execute) = AsyncMock(side_effect=Exception("DB connection failed"))
 
     # Act
     response = client.get("/api/v1/game_state")
@@ -89,22 +89,22 @@ def test_log_attempt_success(mock_supabase, client, mock_user):
     """
     # Arrange
     mock_response = MagicMock()
-    mock_response.data = True  # The RPC function returns a boolean
-    
+    mock_response.data = [{'is_payout_phase_active': True, 'new_credits_balance': 9}]  # RPC returns a list
+
     (mock_supabase.rpc.return_value
-     .execute.return_value) = mock_response
+     .execute) = AsyncMock(return_value=mock_response)
 
     # Act
     response = client.post("/api/v1/log_attempt")
 
     # Assert
     assert response.status_code == 200
-    assert response.json() == {'is_payout_phase_active': True}
+    assert response.json() == {'is_payout_phase_active': True, 'new_credits_balance': 9}
     
     # Verify RPC call
     mock_supabase.rpc.assert_called_with('log_attempt', {'p_user_id': str(mock_user.id)})
 
-@patch('app.api.endpoints.game.supabase')
+@patch('app.core.credit_packs.supabase')
 def test_list_credit_packs_success(mock_supabase, client):
     """
     Tests the /credit_packs endpoint for a successful listing.
@@ -130,7 +130,7 @@ def test_list_credit_packs_success(mock_supabase, client):
     (mock_supabase.table.return_value
         .select.return_value
         .order.return_value
-        .execute.return_value) = mock_response
+        .execute) = AsyncMock(return_value=mock_response)
 
     # Act
     response = client.get("/api/v1/credit_packs")
@@ -140,9 +140,45 @@ def test_list_credit_packs_success(mock_supabase, client):
     data = response.json()
     assert len(data) == 2
     assert data[0]['name'] == 'Starter Pack'
+    assert response.headers['etag'].startswith('"')
+    assert 'max-age' in response.headers['cache-control']
     mock_supabase.table.assert_called_with('credit_packs')
     mock_supabase.table().select.assert_called_with('*')
 
+@patch('app.core.credit_packs.supabase')
+def test_list_credit_packs_conditional_get(mock_supabase, client):
+    """
+    Tests that the catalogue is served from cache and a matching If-None-Match gets a 304.
+    """
+    # Arrange
+    packs_data = [
+        {
+            "id": "a1b2c3d4-e5f6-a7b8-c9d0-e1f2a3b4c5d6",
+            "name": "Starter Pack",
+            "credits_amount": 100,
+            "price": 5.00
+        }
+    ]
+    (mock_supabase.table.return_value
+        .select.return_value
+        .order.return_value
+        .execute) = AsyncMock(return_value=MagicMock(data=packs_data))
+
+    # Act
+    first = client.get("/api/v1/credit_packs")
+    etag = first.headers['etag']
+    not_modified = client.get("/api/v1/credit_packs", headers={"If-None-Match": etag})
+    changed = client.get("/api/v1/credit_packs", headers={"If-None-Match": '"stale"'})
+
+    # Assert
+    assert not_modified.status_code == 304
+    assert not_modified.content == b""
+    assert not_modified.headers['etag'] == etag
+    assert changed.status_code == 200
+    assert changed.json() == first.json()
+    # Only the first request reached the database
+    assert mock_supabase.table.call_count == 1
+
 @patch('app.api.endpoints.game.supabase')
 def test_purchase_credit_pack_success(mock_supabase, client, mock_user):
     """
@@ -157,7 +193,7 @@ def test_purchase_credit_pack_success(mock_supabase, client, mock_user):
     mock_rpc_response = MagicMock()
     mock_rpc_response.data = [purchase_data] # RPC returns a list
     
-    mock_supabase.rpc.return_value.execute.return_value = mock_rpc_response
+    mock_supabase.rpc.return_value.execute = AsyncMock(return_value=mock_rpc_response)
 
     # Act
     response = client.post(f"/api/v1/credit_packs/{pack_id}/purchase")
@@ -180,7 +216,7 @@ def test_purchase_credit_pack_not_found(mock_supabase, client, mock_user):
     # Arrange
     pack_id = "a1b2c3d4-e5f6-a7b8-c9d0-e1f2a3b4c5d6"
     
-    mock_supabase.rpc.return_value.execute.side_effect = Exception("Credit pack not found")
+    mock_supabase.rpc.return_value.execute = AsyncMock(side_effect=Exception("Credit pack not found"))
 
     # Act
     response = client.post(f"/api/v1/credit_packs/{pack_id}/purchase")
@@ -189,49 +225,16 @@ def test_purchase_credit_pack_not_found(mock_supabase, client, mock_user):
     assert response.status_code == 404
     assert response.json() == {"detail": "Credit pack not found."}
 
-@patch('app.api.endpoints.game.supabase')
+@patch('app.core.chat_log.supabase')
 def test_handle_win_success(mock_supabase, client, mock_user):
     """
     Tests the full 'happy path' for the /handle_win endpoint.
-    This involves mocking a sequence of database calls.
+    The whole win is recorded by a single 'record_win' RPC call.
     """
     # Arrange
-    # Configure the mock to handle the sequence of calls precisely.
-    mock_supabase.table.side_effect = None # Clear previous side effect
+    win_id = '1a15383a-18b3-4359-9988-1246c483f940'
+    mock_supabase.rpc.return_value.execute = AsyncMock(return_value=MagicMock(data=win_id))
 
-    # 1. Mock for creating the winning_chat_logs entry
-    log_insert_mock = MagicMock()
-    log_insert_mock.execute.return_value.data = [{'id': 'log-uuid-123'}]
-    
-    # 2. Mock for inserting the chat messages
-    msg_insert_mock = MagicMock()
-    msg_insert_mock.execute.return_value.error = None
-
-    # 3. Mock for getting the current global_attempts
-    game_state_select_mock = MagicMock()
-    game_state_select_mock.single.return_value.execute.return_value.data = {'global_attempts': 555}
-
-    # 4. Mock for creating the 'wins' record
-    win_insert_mock = MagicMock()
-    win_insert_mock.execute.return_value.data = [{'id': '1a15383a-18b3-4359-9988-1246c483f940'}]
-
-    # 5. Mock for the 'handle_win' RPC call to reset the game
-    mock_supabase.rpc.return_value.execute.return_value.error = None
-
-    # Configure the mock to return different mock objects based on the table name
-    def table_side_effect(table_name):
-        if table_name == 'winning_chat_logs':
-            return MagicMock(insert=MagicMock(return_value=log_insert_mock))
-        elif table_name == 'winning_chat_messages':
-            return MagicMock(insert=MagicMock(return_value=msg_insert_mock))
-        elif table_name == 'wins':
-            return MagicMock(insert=MagicMock(return_value=win_insert_mock))
-        elif table_name == 'game_state':
-            return MagicMock(select=MagicMock(return_value=game_state_select_mock))
-        return MagicMock()
-
-    mock_supabase.table.side_effect = table_side_effect
-    
     # Act
     win_payload = {
         "chat_log": [
@@ -245,7 +248,197 @@ def test_handle_win_success(mock_supabase, client, mock_user):
     assert response.status_code == 200
     data = response.json()
     assert data['status'] == 'success'
-    assert data['win_id'] == '1a15383a-18b3-4359-9988-1246c483f940'
+    assert data['win_id'] == win_id
+
+    # Exactly one network call: no table operations, one RPC
+    mock_supabase.table.assert_not_called()
+    mock_supabase.rpc.assert_called_once_with('record_win', {
+        'p_user_id': str(mock_user.id),
+        'p_chat_log': win_payload['chat_log'],
+    })
+
+@patch('app.core.chat_log.supabase')
+def test_handle_win_db_error(mock_supabase, client):
+    """
+    Tests that a failed 'record_win' call returns a 500 without any manual cleanup,
+    since the database function rolls back as a whole.
+    """
+    # Arrange
+    mock_supabase.rpc.return_value.execute = AsyncMock(side_effect=Exception("DB connection failed"))
 
-    assert mock_supabase.rpc.call_count == 1
-    mock_supabase.rpc.assert_called_with('handle_win', {}) 
\ No newline at end of file
+    # Act
+    response = client.post("/api/v1/handle_win", json={"chat_log": []})
+
+    # Assert
+    assert response.status_code == 500
+    mock_supabase.table.assert_not_called()
+
+@patch('app.api.endpoints.game.attempt_batcher')
+@patch('app.api.endpoints.game.settings')
+@patch('app.api.endpoints.game.supabase')
+def test_log_attempt_batched_mode(mock_supabase, mock_settings, mock_batcher, client, mock_user):
+    """
+    Tests that in batched mode only the credit is consumed per request and the
+    game attempt is handed to the write-combining batcher.
+    """
+    # Arrange
+    mock_settings.ATTEMPT_COUNTER_MODE = "batched"
+    mock_supabase.rpc.return_value.execute = AsyncMock(return_value=MagicMock(
+        data=[{'is_payout_phase_active': False, 'new_credits_balance': 4}]
+    ))
+
+    # Act
+    response = client.post("/api/v1/log_attempt")
+
+    # Assert
+    assert response.status_code == 200
+    assert response.json() == {'is_payout_phase_active': False, 'new_credits_balance': 4}
+    mock_supabase.rpc.assert_called_once_with('consume_attempt_credit', {'p_user_id': str(mock_user.id)})
+    mock_batcher.record.assert_called_once_with()
+
+def _mock_profile_read(mock_supabase, profile_data):
+    execute = AsyncMock(return_value=MagicMock(data=profile_data))
+    (mock_supabase.table.return_value
+     .select.return_value
+     .eq.return_value
+     .single.return_value
+     .execute) = execute
+    return execute
+
+@patch('app.api.endpoints.game.supabase')
+@patch('app.core.profiles.supabase')
+def test_profile_cache_follows_attempts_and_purchases(mock_profiles_db, mock_game_db, client, mock_user):
+    """
+    Tests that /me/profile is answered from cache and that the cached balance
+    tracks every attempt and purchase without another profile read.
+    """
+    # Arrange
+    profile_read = _mock_profile_read(mock_profiles_db, {
+        "id": str(mock_user.id), "username": "testuser", "avatar_url": None, "credits": 10
+    })
+    balances = iter([9, 8, 108, 107])
+
+    def rpc(name, params):
+        balance = next(balances)
+        if name == 'purchase_credits':
+            data = [{'purchase_id': 'c1d2e3f4-a5b6-c7d8-e9f0-a1b2c3d4e5f6', 'new_credits_balance': balance}]
+        else:
+            data = [{'is_payout_phase_active': False, 'new_credits_balance': balance}]
+        return MagicMock(execute=AsyncMock(return_value=MagicMock(data=data)))
+
+    mock_game_db.rpc.side_effect = rpc
+    pack_id = "a1b2c3d4-e5f6-a7b8-c9d0-e1f2a3b4c5d6"
+
+    # Act / Assert: every write is immediately visible in the next profile read
+    assert client.get("/api/v1/me/profile").json()["credits"] == 10
+    for path, expected in [
+        ("/api/v1/log_attempt", 9),
+        ("/api/v1/log_attempt", 8),
+        (f"/api/v1/credit_packs/{pack_id}/purchase", 108),
+        ("/api/v1/log_attempt", 107),
+    ]:
+        assert client.post(path).status_code == 200
+        assert client.get("/api/v1/me/profile").json()["credits"] == expected
+
+    # Only the first read reached the profiles table
+    assert profile_read.await_count == 1
+
+@patch('app.api.endpoints.game.supabase')
+@patch('app.core.profiles.supabase')
+def test_failed_attempt_leaves_cached_balance_untouched(mock_profiles_db, mock_game_db, client, mock_user):
+    """
+    Tests that a failed log_attempt does not change the cached balance.
+    """
+    # Arrange
+    _mock_profile_read(mock_profiles_db, {
+        "id": str(mock_user.id), "username": "testuser", "avatar_url": None, "credits": 5
+    })
+    mock_game_db.rpc.return_value.execute = AsyncMock(side_effect=Exception("DB connection failed"))
+
+    # Act
+    client.get("/api/v1/me/profile")
+    response = client.post("/api/v1/log_attempt")
+
+    # Assert
+    assert response.status_code == 500
+    assert client.get("/api/v1/me/profile").json()["credits"] == 5
+
+@patch('app.api.endpoints.game.supabase')
+def test_log_attempt_rate_limited_before_database(mock_supabase, client):
+    """
+    Tests that a client looping on /log_attempt gets 429s once its burst is
+    spent, without those requests reaching the database.
+    """
+    # Arrange
+    mock_supabase.rpc.return_value.execute = AsyncMock(return_value=MagicMock(
+        data=[{'is_payout_phase_active': False, 'new_credits_balance': 100}]
+    ))
+
+    # Act
+    statuses = [client.post("/api/v1/log_attempt").status_code for _ in range(20)]
+
+    # Assert
+    assert statuses.count(200) == 5  # ATTEMPT_RATE_BURST
+    assert statuses.count(429) == 15
+    assert mock_supabase.rpc.call_count == 5
+    assert int(client.post("/api/v1/log_attempt").headers['retry-after']) >= 1
+
+@patch('app.api.endpoints.game.supabase')
+@patch('app.core.profiles.supabase')
+def test_log_attempt_refused_when_out_of_credits(mock_profiles_db, mock_game_db, client, mock_user):
+    """
+    Tests that the database's refusal to go negative becomes a 402, and that
+    the next attempt is refused from the credit hint without a round trip.
+    """
+    # Arrange
+    _mock_profile_read(mock_profiles_db, {
+        "id": str(mock_user.id), "username": "testuser", "avatar_url": None, "credits": 1
+    })
+    mock_game_db.rpc.return_value.execute = AsyncMock(side_effect=Exception("Insufficient credits"))
+
+    # Act
+    client.get("/api/v1/me/profile")
+    refused_by_db = client.post("/api/v1/log_attempt")
+    refused_by_hint = client.post("/api/v1/log_attempt")
+
+    # Assert
+    assert refused_by_db.status_code == 402
+    assert refused_by_hint.status_code == 402
+    assert mock_game_db.rpc.call_count == 1
+    assert client.get("/api/v1/me/profile").json()["credits"] == 0
+
+@patch('app.api.endpoints.game.db_admission')
+@patch('app.api.endpoints.game.supabase')
+def test_log_attempt_overloaded(mock_supabase, mock_admission, client):
+    """
+    Tests that a request that cannot get a database slot is shed with a 503.
+    """
+    # Arrange
+    from app.core.admission import Overloaded
+    mock_admission.slot.return_value.__aenter__ = AsyncMock(side_effect=Overloaded())
+
+    # Act
+    response = client.post("/api/v1/log_attempt")
+
+    # Assert
+    assert response.status_code == 503
+    assert 'retry-after' in response.headers
+    mock_supabase.rpc.assert_not_called()
+
+@patch('app.core.chat_log.supabase')
+def test_handle_win_rejects_oversized_and_malformed_logs(mock_supabase, client):
+    """
+    Tests that chat log limits are enforced before anything is written.
+    """
+    # Act
+    too_large = client.post(
+        "/api/v1/handle_win",
+        content=b'{"chat_log": []}',
+        headers={"Content-Type": "application/json", "Content-Length": str(10**9)},
+    )
+    malformed = client.post("/api/v1/handle_win", content=b'{"chat_log": [1, 2]}')
+
+    # Assert
+    assert too_large.status_code == 413
+    assert malformed.status_code == 422
+    mock_supabase.rpc.assert_not_called()
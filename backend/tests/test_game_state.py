@@ -0,0 +1,208 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from app.core.cache import SnapshotCache
+from app.core.game_state import (
+    PAYOUT_PROTOCOL, build_system_prompt, build_system_prompts, clear_game_state_cache,
+    get_cached_system_prompt, get_full_game_state, get_game_state_cache_stats, get_system_prompt_cache_stats,
+)
+
+
+def make_loader(results):
+    """Returns an async loader that yields `results` in order, one per call."""
+    calls = {"count": 0}
+
+    async def loader():
+        calls["count"] += 1
+        await asyncio.sleep(0.01)
+        result = results[min(calls["count"], len(results)) - 1]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    return loader, calls
+
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_share_one_load():
+    loader, calls = make_loader([{"prizepool_amount": 100.0}])
+    cache = SnapshotCache(loader, ttl=60)
+
+    results = await asyncio.gather(*(cache.get() for _ in range(500)))
+
+    assert calls["count"] == 1
+    assert all(r == {"prizepool_amount": 100.0} for r in results)
+    assert cache.stats == {"hits": 0, "misses": 1, "coalesced": 499, "stale": 0}
+
+
+@pytest.mark.asyncio
+async def test_value_is_served_until_ttl_expires():
+    loader, calls = make_loader([{"v": 1}, {"v": 2}])
+    cache = SnapshotCache(loader, ttl=0.05)
+
+    assert await cache.get() == {"v": 1}
+    assert await cache.get() == {"v": 1}
+    await asyncio.sleep(0.06)
+    assert await cache.get() == {"v": 2}
+
+    assert calls["count"] == 2
+    assert cache.stats["hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_failed_load_is_not_cached():
+    loader, calls = make_loader([Exception("DB down"), {"v": 1}])
+    cache = SnapshotCache(loader, ttl=60)
+
+    with pytest.raises(Exception, match="DB down"):
+        await cache.get()
+    assert await cache.get() == {"v": 1}
+    assert calls["count"] == 2
+
+
+@pytest.mark.asyncio
+async def test_expired_value_is_served_while_refreshing():
+    loader, calls = make_loader([{"v": 1}, {"v": 2}])
+    cache = SnapshotCache(loader, ttl=0.01, stale_ttl=60)
+
+    assert await cache.get() == {"v": 1}
+    await asyncio.sleep(0.02)
+
+    refreshing = asyncio.create_task(cache.get())
+    await asyncio.sleep(0)
+    # Does not wait for the refresh in flight
+    assert await cache.get() == {"v": 1}
+    assert await refreshing == {"v": 2}
+    assert calls["count"] == 2
+    assert cache.stats["stale"] == 1
+
+
+@pytest.mark.asyncio
+async def test_stale_value_is_served_when_refresh_fails():
+    loader, calls = make_loader([{"v": 1}, Exception("DB down")])
+    cache = SnapshotCache(loader, ttl=0.01, stale_ttl=0.2)
+
+    assert await cache.get() == {"v": 1}
+    await asyncio.sleep(0.02)
+    assert await cache.get() == {"v": 1}
+
+    await asyncio.sleep(0.2)
+    with pytest.raises(Exception, match="DB down"):
+        await cache.get()
+
+
+@pytest.mark.asyncio
+async def test_invalidated_value_is_not_served_stale():
+    loader, calls = make_loader([{"v": 1}, Exception("DB down")])
+    cache = SnapshotCache(loader, ttl=60, stale_ttl=60)
+
+    assert await cache.get() == {"v": 1}
+    cache.invalidate()
+    with pytest.raises(Exception, match="DB down"):
+        await cache.get()
+
+
+@pytest.mark.asyncio
+async def test_invalidate_during_load_does_not_store_stale_value():
+    loader, calls = make_loader([{"v": "stale"}, {"v": "fresh"}])
+    cache = SnapshotCache(loader, ttl=60)
+
+    pending = asyncio.create_task(cache.get())
+    await asyncio.sleep(0)
+    cache.invalidate()
+
+    assert await pending == {"v": "stale"}
+    assert await cache.get() == {"v": "fresh"}
+    assert calls["count"] == 2
+
+
+@pytest.mark.asyncio
+@patch('app.core.game_state.supabase')
+async def test_clear_game_state_cache_invalidates_snapshot(mock_supabase):
+    (mock_supabase.table.return_value
+     .select.return_value
+     .single.return_value
+     .execute) = AsyncMock(return_value=MagicMock(data={'prizepool_amount': 1.0, 'is_payout_phase_active': False}))
+    before = get_game_state_cache_stats()
+
+    await get_full_game_state()
+    await get_full_game_state()
+    await clear_game_state_cache()
+    await get_full_game_state()
+
+    after = get_game_state_cache_stats()
+    assert after["misses"] - before["misses"] == 2
+    assert after["hits"] - before["hits"] == 1
+    assert mock_supabase.table.call_count == 2
+
+
+def mock_payout_reads(mock_supabase, values):
+    """Each payout phase read returns the next value in `values`."""
+    execute = AsyncMock(side_effect=[MagicMock(data={'is_payout_phase_active': v}) for v in values])
+    (mock_supabase.table.return_value
+     .select.return_value
+     .single.return_value
+     .execute) = execute
+    return execute
+
+
+@pytest.mark.asyncio
+@patch('app.core.game_state.supabase')
+async def test_system_prompt_is_a_lookup_while_phase_is_fresh(mock_supabase):
+    execute = mock_payout_reads(mock_supabase, [False])
+
+    assert get_cached_system_prompt("BASE") is None
+    assert await build_system_prompt("BASE") == "BASE"
+    # Now served without awaiting anything
+    assert get_cached_system_prompt("BASE") == "BASE"
+    assert await build_system_prompt("BASE") == "BASE"
+
+    assert execute.await_count == 1
+
+
+@pytest.mark.asyncio
+@patch('app.core.game_state.supabase')
+async def test_system_prompt_follows_activation_and_win(mock_supabase):
+    execute = mock_payout_reads(mock_supabase, [False, True, False])
+    before = get_system_prompt_cache_stats()
+
+    assert await build_system_prompt("BASE") == "BASE"
+    # Activation is published as an invalidation by the attempt batcher
+    await clear_game_state_cache()
+    assert await build_system_prompt("BASE") == "BASE" + PAYOUT_PROTOCOL
+    assert await build_system_prompt("BASE") == "BASE" + PAYOUT_PROTOCOL
+    # A win resets the phase
+    await clear_game_state_cache()
+    assert await build_system_prompt("BASE") == "BASE"
+
+    after = get_system_prompt_cache_stats()
+    assert after["compiles"] - before["compiles"] == 3
+    assert execute.await_count == 3
+
+
+@pytest.mark.asyncio
+@patch('app.core.game_state.supabase')
+async def test_concurrent_prompt_builds_share_one_state_check(mock_supabase):
+    execute = mock_payout_reads(mock_supabase, [True])
+
+    single = await asyncio.gather(*(build_system_prompt("BASE") for _ in range(100)))
+    await clear_game_state_cache()
+    execute.side_effect = [MagicMock(data={'is_payout_phase_active': True})]
+    batch = await build_system_prompts(["A", "B", "A"])
+
+    assert set(single) == {"BASE" + PAYOUT_PROTOCOL}
+    assert batch == ["A" + PAYOUT_PROTOCOL, "B" + PAYOUT_PROTOCOL, "A" + PAYOUT_PROTOCOL]
+    assert execute.await_count == 2
+
+
+@pytest.mark.asyncio
+@patch('app.core.game_state.supabase')
+async def test_failed_phase_read_is_not_cached(mock_supabase):
+    (mock_supabase.table.return_value
+     .select.return_value
+     .single.return_value
+     .execute) = AsyncMock(side_effect=Exception("DB down"))
+
+    assert await build_system_prompt("BASE") == "BASE"
+    assert get_cached_system_prompt("BASE") is None
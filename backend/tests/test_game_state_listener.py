@@ -0,0 +1,210 @@
+import asyncio
+import importlib.util
+import json
+import statistics
+import time
+import uuid
+import pytest
+from unittest.mock import patch
+
+from app.core import game_state, listener
+from app.core.game_state import build_system_prompt, get_cached_system_prompt, is_payout_phase_active, PAYOUT_PROTOCOL
+from app.core.listener import NotifyListener
+from tests.postgres import DATABASE_URL, create_database, database_url, drop_database
+from tests.test_game_state import mock_payout_reads
+
+
+class FakeConnection:
+    """The part of an asyncpg connection the listener uses."""
+
+    def __init__(self, payout_active: bool):
+        self.row = {"prizepool_amount": 100.0, "is_payout_phase_active": payout_active}
+        self.closed = False
+        self.during_snapshot = None
+        self._notify = None
+        self._terminated = None
+
+    async def add_listener(self, channel, callback):
+        self._notify = callback
+
+    def add_termination_listener(self, callback):
+        self._terminated = callback
+
+    async def fetchval(self, query):
+        if self.closed:
+            raise ConnectionError("connection is closed")
+        if query == "SELECT 1":
+            return 1
+        snapshot = json.dumps(self.row)
+        if self.during_snapshot is not None:
+            self.during_snapshot()
+        return snapshot
+
+    def notify(self, payout_active: bool):
+        self.row = dict(self.row, is_payout_phase_active=payout_active)
+        self._notify(self, 1, game_state.GAME_STATE_CHANNEL, json.dumps(self.row))
+
+    def drop(self):
+        """The server closes the connection."""
+        self.closed = True
+        self._terminated(self)
+
+    def is_closed(self):
+        return self.closed
+
+    def terminate(self):
+        self.closed = True
+
+
+def make_listener(connections, healthcheck_interval=10.0):
+    """A game_state listener whose connects return `connections` in order."""
+    pending = iter(connections)
+
+    async def connect(dsn):
+        return next(pending)
+
+    return NotifyListener(
+        "postgresql://test",
+        channel=game_state.GAME_STATE_CHANNEL,
+        snapshot_query=game_state.GAME_STATE_SNAPSHOT_QUERY,
+        on_state=game_state._apply_game_state,
+        on_lost=game_state._on_game_state_listener_lost,
+        healthcheck_interval=healthcheck_interval,
+        connect=connect,
+    )
+
+
+async def wait_until(predicate, timeout=1.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        await asyncio.sleep(0.001)
+
+
+@pytest.mark.asyncio
+@patch('app.core.game_state.supabase')
+async def test_phase_is_pushed_to_memory_without_reads(mock_supabase):
+    execute = mock_payout_reads(mock_supabase, [])
+    conn = FakeConnection(payout_active=False)
+    live = make_listener([conn])
+
+    with patch('app.core.game_state.game_state_listener', live):
+        live.start()
+        await wait_until(lambda: live.live)
+        assert await build_system_prompt("BASE") == "BASE"
+
+        # Visible to the very next read, long after any TTL would have expired
+        conn.notify(True)
+        assert get_cached_system_prompt("BASE") == "BASE" + PAYOUT_PROTOCOL
+        await asyncio.sleep(game_state.PAYOUT_CACHE_TTL_SECONDS + 0.1)
+        assert await is_payout_phase_active() is True
+        conn.notify(False)
+        assert await build_system_prompt("BASE") == "BASE"
+        await live.stop()
+
+    assert execute.await_count == 0
+    assert live.stats == {"notifications": 2, "resyncs": 1, "disconnects": 1}
+
+
+@pytest.mark.asyncio
+async def test_notification_during_resync_wins_over_snapshot():
+    conn = FakeConnection(payout_active=False)
+    # Committed after the snapshot was taken, delivered before it is applied
+    conn.during_snapshot = lambda: conn.notify(True)
+    live = make_listener([conn])
+
+    with patch('app.core.game_state.game_state_listener', live):
+        live.start()
+        await wait_until(lambda: live.live)
+        assert await is_payout_phase_active() is True
+        await live.stop()
+
+
+@pytest.mark.asyncio
+@patch.object(listener, 'RECONNECT_MIN_DELAY_SECONDS', 0.05)
+@patch('app.core.game_state.supabase')
+async def test_lost_listener_falls_back_to_reads_and_resyncs(mock_supabase):
+    """
+    Tests that a dropped connection and a connection that silently stops
+    answering both send reads back to the database until a reconnect has
+    resynced the state, including changes made while it was down.
+    """
+    execute = mock_payout_reads(mock_supabase, [True, False])
+    first, second, third = FakeConnection(False), FakeConnection(True), FakeConnection(False)
+    live = make_listener([first, second, third], healthcheck_interval=0.05)
+
+    with patch('app.core.game_state.game_state_listener', live):
+        live.start()
+        await wait_until(lambda: live.live)
+
+        first.drop()
+        await wait_until(lambda: not live.live)
+        await game_state.clear_game_state_cache()
+        assert await is_payout_phase_active() is True
+        assert execute.await_count == 1
+
+        await wait_until(lambda: live.live)
+        assert await is_payout_phase_active() is True
+        # Fails the next health check instead of signalling termination
+        second.closed = True
+        await wait_until(lambda: not live.live)
+        await game_state.clear_game_state_cache()
+        assert await is_payout_phase_active() is False
+
+        await wait_until(lambda: live.live)
+        third.notify(True)
+        assert await is_payout_phase_active() is True
+        await live.stop()
+
+    assert execute.await_count == 2
+    assert live.stats["resyncs"] == 3
+
+
+@pytest.mark.skipif(
+    not DATABASE_URL or importlib.util.find_spec("asyncpg") is None,
+    reason="needs TEST_DATABASE_URL and asyncpg (see tests/postgres.py)",
+)
+@pytest.mark.asyncio
+async def test_propagation_latency_against_postgres():
+    """
+    Flips the payout phase in a migrated throwaway database and measures how
+    long each commit takes to reach a worker's in-memory phase.
+    """
+    name = f"notify_{uuid.uuid4().hex[:12]}"
+    writer = await create_database(name)
+    live = NotifyListener(
+        database_url(name),
+        channel=game_state.GAME_STATE_CHANNEL,
+        snapshot_query=game_state.GAME_STATE_SNAPSHOT_QUERY,
+        on_state=game_state._apply_game_state,
+        on_lost=game_state._on_game_state_listener_lost,
+    )
+    latencies = []
+    try:
+        with patch('app.core.game_state.game_state_listener', live):
+            live.start()
+            await wait_until(lambda: live.live, timeout=10.0)
+            assert await is_payout_phase_active() is False
+
+            for i in range(50):
+                payout_active = i % 2 == 0
+                await writer.execute("UPDATE game_state SET is_payout_phase_active = $1 WHERE id = 1", payout_active)
+                committed = time.perf_counter()
+                await wait_until(lambda: game_state._phase.payout_active == payout_active)
+                latencies.append(time.perf_counter() - committed)
+                assert await is_payout_phase_active() is payout_active
+
+            # Attempts alone do not notify
+            await writer.execute("UPDATE game_state SET global_attempts = global_attempts + 1 WHERE id = 1")
+            await asyncio.sleep(0.1)
+            assert live.stats["notifications"] == 50
+    finally:
+        await live.stop()
+        await writer.close()
+        await drop_database(name)
+
+    latencies.sort()
+    p50, p99 = statistics.median(latencies), latencies[int(len(latencies) * 0.99) - 1]
+    assert p99 < 0.1, (
+        f"NOTIFY propagation: p50 {p50 * 1000:.2f} ms, p99 {p99 * 1000:.2f} ms, max {latencies[-1] * 1000:.2f} ms"
+    )
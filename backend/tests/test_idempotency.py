@@ -0,0 +1,251 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from app.main import app
+from app.api.deps import get_current_user
+from app.core.idempotency import IdempotencyConflict, InMemoryIdempotencyStore, RedisIdempotencyStore
+
+PACK_ID = "a1b2c3d4-e5f6-a7b8-c9d0-e1f2a3b4c5d6"
+PURCHASE = {"purchase_id": "c1d2e3f4-a5b6-c7d8-e9f0-a1b2c3d4e5f6", "new_credits_balance": 110}
+
+
+class FakeRedis:
+    """The subset of redis.asyncio used by RedisIdempotencyStore, shared between 'workers'."""
+
+    def __init__(self):
+        self.data = {}
+
+    def _live(self, key):
+        entry = self.data.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= time.monotonic():
+            del self.data[key]
+            return None
+        return entry
+
+    async def get(self, key):
+        entry = self._live(key)
+        return entry[0] if entry else None
+
+    async def set(self, key, value, nx=False, px=None, ex=None):
+        if nx and self._live(key):
+            return None
+        ttl = px / 1000 if px is not None else ex
+        self.data[key] = (value, time.monotonic() + ttl if ttl is not None else None)
+        return True
+
+    async def delete(self, key):
+        self.data.pop(key, None)
+
+    async def exists(self, key):
+        return int(self._live(key) is not None)
+
+    async def aclose(self):
+        pass
+
+
+def redis_store(fake: FakeRedis, wait_timeout: float = 5) -> RedisIdempotencyStore:
+    with patch('app.core.idempotency.redis.from_url', return_value=fake):
+        return RedisIdempotencyStore(
+            "redis://fake", prefix="test", ttl=60, wait_timeout=wait_timeout, lock_ttl=10
+        )
+
+
+def slow_purchase(delay=0.05):
+    async def execute():
+        await asyncio.sleep(delay)
+        return MagicMock(data=[PURCHASE])
+    return AsyncMock(side_effect=execute)
+
+
+@pytest.fixture
+def api(mock_user):
+    app.dependency_overrides[get_current_user] = lambda: mock_user
+    yield httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+    app.dependency_overrides.clear()
+
+
+@pytest.mark.asyncio
+@patch('app.api.endpoints.game.supabase')
+async def test_concurrent_duplicate_purchases_charge_once(mock_supabase, api):
+    """
+    Tests that duplicates arriving while the original purchase runs wait for
+    it and receive the same result, with a single database call.
+    """
+    # Arrange
+    mock_supabase.rpc.return_value.execute = slow_purchase()
+    headers = {"Idempotency-Key": "purchase-1"}
+
+    # Act
+    async with api:
+        responses = await asyncio.gather(*(
+            api.post(f"/api/v1/credit_packs/{PACK_ID}/purchase", headers=headers) for _ in range(5)
+        ))
+
+    # Assert
+    assert mock_supabase.rpc.return_value.execute.await_count == 1
+    assert [r.status_code for r in responses] == [200] * 5
+    assert all(r.json() == {"status": "success", **PURCHASE} for r in responses)
+    assert [r.headers.get("idempotent-replayed") for r in responses].count("true") == 4
+
+
+@patch('app.api.endpoints.game.supabase')
+def test_purchase_replay_and_distinct_keys(mock_supabase, client):
+    # Arrange
+    mock_supabase.rpc.return_value.execute = AsyncMock(return_value=MagicMock(data=[PURCHASE]))
+    url = f"/api/v1/credit_packs/{PACK_ID}/purchase"
+
+    # Act
+    first = client.post(url, headers={"Idempotency-Key": "a"})
+    replay = client.post(url, headers={"Idempotency-Key": "a"})
+    other = client.post(url, headers={"Idempotency-Key": "b"})
+    unkeyed = client.post(url)
+
+    # Assert
+    assert replay.json() == first.json()
+    assert replay.headers["idempotent-replayed"] == "true"
+    assert "idempotent-replayed" not in other.headers
+    assert "idempotent-replayed" not in unkeyed.headers
+    assert mock_supabase.rpc.return_value.execute.await_count == 3
+
+
+@patch('app.api.endpoints.game.supabase')
+def test_failed_purchase_is_not_remembered(mock_supabase, client):
+    # Arrange
+    mock_supabase.rpc.return_value.execute = AsyncMock(side_effect=[
+        Exception("connection reset"), MagicMock(data=[PURCHASE]),
+    ])
+    url = f"/api/v1/credit_packs/{PACK_ID}/purchase"
+
+    # Act
+    failed = client.post(url, headers={"Idempotency-Key": "retry-me"})
+    retried = client.post(url, headers={"Idempotency-Key": "retry-me"})
+
+    # Assert
+    assert failed.status_code == 500
+    assert retried.status_code == 200
+    assert "idempotent-replayed" not in retried.headers
+
+
+def test_invalid_idempotency_key_is_rejected(client):
+    response = client.post(f"/api/v1/credit_packs/{PACK_ID}/purchase", headers={"Idempotency-Key": "x" * 256})
+    assert response.status_code == 400
+
+
+@patch('app.core.game_state.supabase')
+@patch('app.core.chat_log.supabase')
+def test_duplicate_win_is_recorded_once(mock_chat_db, mock_state_db, client):
+    # Arrange
+    win_id = '1a15383a-18b3-4359-9988-1246c483f940'
+    mock_chat_db.rpc.return_value.execute = AsyncMock(return_value=MagicMock(data=win_id))
+    payload = {"chat_log": [{"prompt": "Hello AI", "response": "Hello Human"}]}
+    headers = {"Idempotency-Key": "win-1"}
+
+    # Act
+    first = client.post("/api/v1/handle_win", json=payload, headers=headers)
+    replay = client.post("/api/v1/handle_win", json=payload, headers=headers)
+
+    # Assert
+    assert first.json() == replay.json() == {"status": "success", "win_id": win_id}
+    assert replay.headers["idempotent-replayed"] == "true"
+    mock_chat_db.rpc.assert_called_once()
+
+
+@patch('app.core.game_state.supabase')
+@patch('app.core.chat_log.supabase')
+def test_win_key_reused_with_another_transcript_is_rejected(mock_chat_db, mock_state_db, client):
+    mock_chat_db.rpc.return_value.execute = AsyncMock(return_value=MagicMock(data="1a15383a-18b3-4359-9988-1246c483f941"))
+    headers = {"Idempotency-Key": "win-2"}
+
+    first = client.post("/api/v1/handle_win", json={"chat_log": [{"prompt": "a", "response": "b"}]}, headers=headers)
+    reused = client.post("/api/v1/handle_win", json={"chat_log": [{"prompt": "c", "response": "d"}]}, headers=headers)
+
+    assert first.status_code == 200
+    assert reused.status_code == 422
+    mock_chat_db.rpc.assert_called_once()
+
+
+@pytest.mark.asyncio
+async def test_waiter_gets_original_error():
+    store = InMemoryIdempotencyStore(ttl=60, wait_timeout=5)
+    calls = 0
+
+    async def failing():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    results = await asyncio.gather(store.run("k", failing), store.run("k", failing), return_exceptions=True)
+
+    assert calls == 1
+    assert all(isinstance(r, ValueError) for r in results)
+    # Not remembered, so a retry runs again
+    with pytest.raises(ValueError):
+        await store.run("k", failing)
+    assert calls == 2
+
+
+@pytest.mark.asyncio
+async def test_redis_store_duplicates_on_another_worker_wait_for_owner():
+    """
+    Two workers sharing Redis: the duplicate on the second worker polls until
+    the first stores its result instead of running the handler itself.
+    """
+    fake = FakeRedis()
+    worker_a, worker_b = redis_store(fake), redis_store(fake)
+    calls = 0
+
+    async def handler():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.1)
+        return {"purchase_id": "p1"}
+
+    owner = asyncio.create_task(worker_a.run("k", handler))
+    await asyncio.sleep(0.01)
+    duplicate = await worker_b.run("k", handler)
+
+    assert await owner == ({"purchase_id": "p1"}, False)
+    assert duplicate == ({"purchase_id": "p1"}, True)
+    assert calls == 1
+    # The claim is released once the result is stored
+    assert await fake.exists("test:lock:k") == 0
+
+
+@pytest.mark.asyncio
+async def test_redis_store_conflict_when_owner_outlasts_wait():
+    fake = FakeRedis()
+    worker_a, worker_b = redis_store(fake), redis_store(fake, wait_timeout=0.1)
+
+    async def handler():
+        await asyncio.sleep(0.5)
+        return {}
+
+    owner = asyncio.create_task(worker_a.run("k", handler))
+    await asyncio.sleep(0.01)
+    with pytest.raises(IdempotencyConflict):
+        await worker_b.run("k", handler)
+    await owner
+
+
+@pytest.mark.asyncio
+async def test_result_is_returned_and_claim_released_when_storing_fails():
+    fake = FakeRedis()
+    store = redis_store(fake)
+    original_set = fake.set
+
+    async def failing_set(key, value, **kwargs):
+        if key.startswith("test:result:"):
+            raise ConnectionError("redis went away")
+        return await original_set(key, value, **kwargs)
+
+    async def handler():
+        return {"purchase_id": "p1"}
+
+    fake.set = failing_set
+    assert await store.run("k", handler) == ({"purchase_id": "p1"}, False)
+    assert await fake.exists("test:lock:k") == 0
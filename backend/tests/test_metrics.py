@@ -0,0 +1,72 @@
+import httpx
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.core.metrics import (
+    Histogram, InstrumentedTransport, MetricsMiddleware, Registry, cache_stats_collector, registry
+)
+
+
+def build_app():
+    """A tiny app whose handler makes two 'database' calls through an instrumented transport."""
+    db = httpx.AsyncClient(
+        transport=InstrumentedTransport(httpx.MockTransport(lambda request: httpx.Response(200, json=[]))),
+        base_url="http://db",
+    )
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware)
+
+    @app.get("/items/{item_id}")
+    async def read_item(item_id: str):
+        await db.get("/rest/v1/items", params={"id": f"eq.{item_id}"})
+        await db.post("/rest/v1/rpc/touch_item")
+        return {"id": item_id}
+
+    return app
+
+
+def test_middleware_records_route_latency_and_db_round_trips():
+    client = TestClient(build_app())
+
+    for item_id in ("a", "b", "c"):
+        assert client.get(f"/items/{item_id}").status_code == 200
+    client.get("/missing")
+
+    output = registry.render()
+    # Route templates, not raw paths, so label cardinality stays bounded
+    assert 'http_requests_total{method="GET",route="/items/{item_id}",status="200"} 3.0' in output
+    assert 'http_requests_total{method="GET",route="unmatched",status="404"} 1.0' in output
+    assert 'http_request_duration_seconds_count{method="GET",route="/items/{item_id}"} 3' in output
+    assert 'db_calls_per_request_bucket{route="/items/{item_id}",le="2"} 3' in output
+    assert 'db_calls_per_request_bucket{route="/items/{item_id}",le="1"} 0' in output
+    assert 'db_calls_total{method="POST",operation="rpc/touch_item"}' in output
+    assert 'http_requests_in_flight 0.0' in output
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram("latency_seconds", "Latency.", buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 5.0):
+        histogram.observe(value)
+
+    assert list(histogram.samples()) == [
+        'latency_seconds_bucket{le="0.1"} 2',
+        'latency_seconds_bucket{le="1.0"} 3',
+        'latency_seconds_bucket{le="+Inf"} 4',
+        'latency_seconds_sum 5.65',
+        'latency_seconds_count 4',
+    ]
+
+
+def test_cache_collector_groups_families_and_derives_hit_ratio():
+    local = Registry()
+    local.register_collector(cache_stats_collector({
+        "snapshot": lambda: {"hits": 3, "misses": 1, "coalesced": 0},
+        "packs": lambda: {"hits": 0, "misses": 0, "coalesced": 0},
+    }))
+
+    lines = local.render().splitlines()
+
+    hits = [i for i, line in enumerate(lines) if line.startswith("cache_hits_total")]
+    assert hits == [hits[0], hits[0] + 1]
+    assert 'cache_hit_ratio{cache="snapshot"} 0.75' in lines
+    assert 'cache_hit_ratio{cache="packs"} 0.0' in lines
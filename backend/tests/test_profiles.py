@@ -0,0 +1,142 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from app.core.profiles import ProfileCache, balance_write, get_credit_hint, get_profile
+
+USER_ID = "8d5c9e2b-6428-4f05-8472-760a2d2a45b1"
+
+
+def profile(credits):
+    return {"id": USER_ID, "username": "testuser", "avatar_url": None, "credits": credits}
+
+
+@pytest.mark.asyncio
+@patch('app.core.profiles.supabase')
+async def test_slow_read_never_overwrites_a_newer_balance(mock_supabase):
+    """
+    A profile read that started before an attempt committed returns the old
+    balance; it must not replace the balance written through by the attempt.
+    """
+    release = asyncio.Event()
+    reads = {"count": 0}
+
+    async def slow_read():
+        reads["count"] += 1
+        if reads["count"] == 1:
+            await release.wait()
+            return MagicMock(data=profile(10))
+        return MagicMock(data=profile(9))
+
+    (mock_supabase.table.return_value
+     .select.return_value
+     .eq.return_value
+     .single.return_value
+     .execute) = slow_read
+
+    stale_read = asyncio.create_task(get_profile(USER_ID))
+    await asyncio.sleep(0)
+    with balance_write(USER_ID) as write:
+        write.credits = 9
+    release.set()
+
+    assert (await stale_read)["credits"] == 10
+    assert (await get_profile(USER_ID))["credits"] == 9
+    assert reads["count"] == 2
+
+
+def test_write_through_updates_only_cached_rows():
+    cache = ProfileCache(max_size=10, ttl=60)
+
+    cache.set_credits(USER_ID, 5)
+    assert cache.get(USER_ID) is None
+
+    cache.put(USER_ID, profile(5), cache.version(USER_ID))
+    cache.set_credits(USER_ID, 4)
+
+    assert cache.get(USER_ID)["credits"] == 4
+    assert cache.stats == {"hits": 1, "misses": 1, "write_through": 1}
+
+
+def test_least_recently_used_profile_is_evicted():
+    cache = ProfileCache(max_size=2, ttl=60)
+    for user_id in ("a", "b"):
+        cache.put(user_id, {"id": user_id, "credits": 1}, cache.version(user_id))
+
+    cache.get("a")
+    cache.put("c", {"id": "c", "credits": 1}, cache.version("c"))
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get("c") is not None
+
+
+def test_versions_are_only_kept_for_cached_or_loading_users():
+    cache = ProfileCache(max_size=1, ttl=60)
+    for n in range(100):
+        cache.set_credits(f"user-{n}", 1)
+    assert cache._versions == {}
+
+    version = cache.begin_load("a")
+    cache.set_credits("a", 2)
+    cache.put("a", {"id": "a", "credits": 1}, version)
+    cache.end_load("a")
+    assert cache.get("a") is None
+    assert cache._versions == {}
+
+    cache.put("b", {"id": "b", "credits": 1}, cache.begin_load("b"))
+    cache.end_load("b")
+    cache.set_credits("b", 2)
+    cache.put("c", {"id": "c", "credits": 1}, cache.version("c"))
+    assert cache._versions == {}
+
+
+def test_overlapping_writes_drop_the_balance_instead_of_keeping_the_last_response():
+    """
+    An attempt leaves 0 credits and a purchase then adds 100, but the
+    attempt's response arrives last; the cache must not keep its 0.
+    """
+    cache = ProfileCache(max_size=10, ttl=60)
+    cache.put(USER_ID, profile(1), cache.version(USER_ID))
+
+    cache.begin_write(USER_ID)  # attempt
+    cache.begin_write(USER_ID)  # purchase
+    cache.end_write(USER_ID, 100)
+    cache.end_write(USER_ID, 0)
+
+    assert cache.credit_hint(USER_ID, max_age=60) is None
+    assert cache.get(USER_ID) is None
+
+    cache.put(USER_ID, profile(100), cache.version(USER_ID))
+    cache.begin_write(USER_ID)
+    cache.end_write(USER_ID, 99)
+    assert cache.credit_hint(USER_ID, max_age=60) == 99
+    assert cache._writing == {} and cache._overlapped == set()
+
+
+@pytest.mark.asyncio
+@patch('app.core.profiles.supabase')
+async def test_interleaved_attempt_and_purchase_never_leave_a_stale_zero(mock_supabase):
+    mock_supabase.table.return_value.select.return_value.eq.return_value.single.return_value.execute = \
+        AsyncMock(return_value=MagicMock(data=profile(1)))
+    await get_profile(USER_ID)
+    attempt_done, purchase_done = asyncio.Event(), asyncio.Event()
+
+    async def attempt():
+        with balance_write(USER_ID) as write:
+            await attempt_done.wait()
+            write.credits = 0
+
+    async def purchase():
+        with balance_write(USER_ID) as write:
+            await purchase_done.wait()
+            write.credits = 100
+
+    tasks = [asyncio.create_task(attempt()), asyncio.create_task(purchase())]
+    await asyncio.sleep(0)
+    purchase_done.set()
+    await asyncio.sleep(0)
+    attempt_done.set()
+    await asyncio.gather(*tasks)
+
+    assert get_credit_hint(USER_ID) is None
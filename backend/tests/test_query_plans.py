@@ -0,0 +1,184 @@
+"""
+Query plan regression tests against a real Postgres.
+
+Loads every migration into a throwaway database, seeds a synthetic dataset
+big enough that the planner only reads a whole table when no index applies,
+and checks with EXPLAIN that the hot queries and the RLS policies are
+served by the expected indexes. Skipped unless TEST_DATABASE_URL is set
+(see tests/postgres.py).
+"""
+import asyncio
+import json
+import uuid
+
+import pytest
+
+from tests.postgres import DATABASE_URL, create_database, database_url, drop_database
+
+if not DATABASE_URL:
+    pytest.skip("TEST_DATABASE_URL is not set", allow_module_level=True)
+asyncpg = pytest.importorskip("asyncpg")
+
+USERS = 20_000
+PURCHASES = 100_000
+WINS = 10_000
+MESSAGES_PER_WIN = 10
+
+SEED = f"""
+INSERT INTO auth.users (raw_user_meta_data)
+SELECT jsonb_build_object('user_name', 'user' || i) FROM generate_series(1, {USERS}) i;
+
+CREATE TEMP TABLE seed_users AS SELECT id, row_number() OVER (ORDER BY id) AS n FROM auth.users;
+
+INSERT INTO credit_packs (name, credits_amount, price)
+SELECT 'Pack ' || i, i * 100, i * 5 FROM generate_series(1, 5) i;
+
+INSERT INTO purchases (user_id, credit_pack_id, created_at)
+SELECT u.id, p.id, now() - g * interval '1 minute'
+FROM generate_series(1, {PURCHASES}) g
+JOIN seed_users u ON u.n = 1 + g % {USERS}
+JOIN (SELECT id, row_number() OVER (ORDER BY id) - 1 AS k FROM credit_packs) p ON p.k = g % 5;
+
+INSERT INTO winning_chat_logs (user_id, created_at)
+SELECT u.id, now() - g * interval '1 hour'
+FROM generate_series(1, {WINS}) g
+JOIN seed_users u ON u.n = 1 + (g * g) % 5000;
+
+INSERT INTO winning_chat_messages (log_id, prompt, response)
+SELECT l.id, 'prompt ' || m, 'response ' || m
+FROM winning_chat_logs l CROSS JOIN generate_series(1, {MESSAGES_PER_WIN}) m
+ORDER BY l.id, m;
+
+INSERT INTO wins (user_id, win_time, global_attempt_at_win, winning_chat_log_id)
+SELECT user_id, created_at, 0, id FROM winning_chat_logs;
+
+ANALYZE;
+"""
+
+SAMPLES = {
+    "user": "SELECT user_id FROM purchases ORDER BY created_at DESC LIMIT 1",
+    "winner": "SELECT user_id FROM wins ORDER BY win_time DESC OFFSET 100 LIMIT 1",
+    "log": "SELECT winning_chat_log_id FROM wins ORDER BY win_time DESC OFFSET 100 LIMIT 1",
+    "win_time": "SELECT win_time FROM wins ORDER BY win_time DESC OFFSET 100 LIMIT 1",
+    "win_id": "SELECT id FROM wins ORDER BY win_time DESC OFFSET 100 LIMIT 1",
+    "rank_wins": "SELECT wins FROM leaderboard ORDER BY wins DESC, last_win_at, user_id OFFSET 100 LIMIT 1",
+    "rank_last_win": "SELECT last_win_at FROM leaderboard ORDER BY wins DESC, last_win_at, user_id OFFSET 100 LIMIT 1",
+    "rank_user": "SELECT user_id FROM leaderboard ORDER BY wins DESC, last_win_at, user_id OFFSET 100 LIMIT 1",
+}
+
+# (name, query, sample arguments, role, index that must serve it). SECURITY
+# DEFINER functions are never inlined into the caller's plan, so the queries
+# inside get_recent_wins, get_win_messages and get_leaderboard are checked
+# directly.
+CASES = [
+    ("profile by id", "SELECT * FROM profiles WHERE id = $1", ["user"], None, "profiles_pkey"),
+    (
+        "purchase history",
+        "SELECT * FROM purchases WHERE user_id = $1 ORDER BY created_at DESC LIMIT 20",
+        ["user"], None, "purchases_user_id_created_at_idx",
+    ),
+    (
+        # The lookup behind ON DELETE CASCADE from winning_chat_logs
+        "message cascade",
+        "SELECT 1 FROM ONLY winning_chat_messages WHERE log_id = $1",
+        ["log"], None, "winning_chat_messages_log_id_seq_idx",
+    ),
+    ("logs by user", "SELECT id FROM winning_chat_logs WHERE user_id = $1", ["winner"], None, "winning_chat_logs_user_id_idx"),
+    (
+        "wins by user",
+        "SELECT * FROM wins WHERE user_id = $1 ORDER BY win_time DESC LIMIT 20",
+        ["winner"], None, "wins_user_id_win_time_idx",
+    ),
+    (
+        "recent wins, first page",
+        "SELECT w.id, p.username FROM wins w LEFT JOIN profiles p ON p.id = w.user_id "
+        "ORDER BY w.win_time DESC, w.id DESC LIMIT 21",
+        [], None, "wins_win_time_id_idx",
+    ),
+    (
+        "recent wins, next page",
+        "SELECT w.id, p.username FROM wins w LEFT JOIN profiles p ON p.id = w.user_id "
+        "WHERE (w.win_time, w.id) < ($1, $2) ORDER BY w.win_time DESC, w.id DESC LIMIT 21",
+        ["win_time", "win_id"], None, "wins_win_time_id_idx",
+    ),
+    (
+        "transcript page",
+        "SELECT seq, prompt, response FROM winning_chat_messages WHERE log_id = $1 AND seq > 0 ORDER BY seq LIMIT 21",
+        ["log"], None, "winning_chat_messages_log_id_seq_idx",
+    ),
+    (
+        "leaderboard, first page",
+        "SELECT l.user_id, p.username FROM leaderboard l LEFT JOIN profiles p ON p.id = l.user_id "
+        "ORDER BY l.wins DESC, l.last_win_at, l.user_id LIMIT 21",
+        [], None, "leaderboard_rank_idx",
+    ),
+    (
+        "leaderboard, next page",
+        "SELECT l.user_id FROM leaderboard l "
+        "WHERE l.wins < $1 OR (l.wins = $1 AND (l.last_win_at, l.user_id) > ($2, $3)) "
+        "ORDER BY l.wins DESC, l.last_win_at, l.user_id LIMIT 21",
+        ["rank_wins", "rank_last_win", "rank_user"], None, "leaderboard_rank_idx",
+    ),
+    (
+        "transcripts due for archiving",
+        "SELECT id FROM winning_chat_logs WHERE archived_at IS NULL AND created_at < now() - interval '30 days' "
+        "ORDER BY created_at LIMIT 100",
+        [], None, "winning_chat_logs_unarchived_idx",
+    ),
+    # RLS: the owner policies must become index conditions, not per-row filters
+    ("own purchases under RLS", "SELECT * FROM purchases", [], "authenticated", "purchases_user_id_created_at_idx"),
+    ("own profile under RLS", "SELECT credits FROM profiles", [], "anon", "profiles_pkey"),
+]
+
+# Large enough that a sequential scan of any of them is a regression
+LARGE_TABLES = {"profiles", "purchases", "wins", "winning_chat_logs", "winning_chat_messages", "leaderboard"}
+
+
+async def _seed_database(name: str):
+    conn = await create_database(name)
+    try:
+        await conn.execute(SEED)
+        return {key: await conn.fetchval(query) for key, query in SAMPLES.items()}
+    finally:
+        await conn.close()
+
+
+async def _explain(dsn: str, query: str, args: list, role, user_id) -> dict:
+    conn = await asyncpg.connect(dsn)
+    try:
+        async with conn.transaction():
+            if role is not None:
+                await conn.execute("SELECT set_config('request.jwt.claim.sub', $1, true)", str(user_id))
+                await conn.execute(f"SET LOCAL ROLE {role}")
+            return json.loads(await conn.fetchval(f"EXPLAIN (FORMAT JSON) {query}", *args))[0]["Plan"]
+    finally:
+        await conn.close()
+
+
+def _nodes(plan: dict):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from _nodes(child)
+
+
+@pytest.fixture(scope="module")
+def seeded():
+    """A migrated, seeded throwaway database: (dsn, sample values)."""
+    name = f"plans_{uuid.uuid4().hex[:12]}"
+    try:
+        samples = asyncio.run(_seed_database(name))
+        yield database_url(name), samples
+    finally:
+        asyncio.run(drop_database(name))
+
+
+@pytest.mark.parametrize("name, query, arg_keys, role, index", CASES, ids=[case[0] for case in CASES])
+def test_hot_queries_use_indexes(seeded, name, query, arg_keys, role, index):
+    dsn, samples = seeded
+
+    plan = asyncio.run(_explain(dsn, query, [samples[k] for k in arg_keys], role, samples["user"]))
+
+    nodes = list(_nodes(plan))
+    seq_scans = {n["Relation Name"] for n in nodes if n["Node Type"] == "Seq Scan"} & LARGE_TABLES
+    assert not seq_scans, f"{name}: sequential scan of {seq_scans}\n{json.dumps(plan, indent=2)}"
+    assert index in {n.get("Index Name") for n in nodes}, f"{name}: {index} not used\n{json.dumps(plan, indent=2)}"
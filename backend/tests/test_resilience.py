@@ -0,0 +1,213 @@
+import asyncio
+import time
+import httpx
+import pytest
+from unittest.mock import patch
+from supabase import AsyncClient, AsyncClientOptions
+
+from app.core.config import settings
+from app.core.archive import archive_win_transcripts
+from app.core.resilience import CircuitBreaker, DatabaseUnavailable, ResilientTransport, bulk_db_breaker, db_breaker
+from benchmarks.fake_postgrest import FakeDatabase, create_app
+
+
+def transport_for(handler, breaker=None, deadline=1.0, read_retries=2) -> ResilientTransport:
+    return ResilientTransport(
+        httpx.MockTransport(handler),
+        breaker or CircuitBreaker(failure_threshold=100, reset_timeout=60),
+        deadline=deadline,
+        read_retries=read_retries,
+        backoff=0.001,
+        backoff_max=0.002,
+    )
+
+
+def failing_then(results):
+    """Returns a handler answering with `results` in order, then 200s."""
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request)
+        status = results[len(calls) - 1] if len(calls) <= len(results) else 200
+        if status == "drop":
+            raise httpx.ConnectError("connection refused", request=request)
+        return httpx.Response(status, json=[])
+
+    return handler, calls
+
+
+async def send(transport, method, path):
+    async with httpx.AsyncClient(transport=transport, base_url="http://db") as client:
+        return await client.request(method, path)
+
+
+@pytest.mark.asyncio
+async def test_reads_are_retried():
+    handler, calls = failing_then(["drop", 503])
+    response = await send(transport_for(handler), "GET", "/rest/v1/game_state")
+
+    assert response.status_code == 200
+    assert len(calls) == 3
+
+
+@pytest.mark.asyncio
+async def test_writes_and_read_only_rpcs():
+    handler, calls = failing_then([503, 503])
+    with pytest.raises(DatabaseUnavailable):
+        await send(transport_for(handler), "POST", "/rest/v1/rpc/log_attempt")
+    assert len(calls) == 1
+
+    assert (await send(transport_for(handler), "POST", "/rest/v1/rpc/get_recent_wins")).status_code == 200
+    assert len(calls) == 3
+
+
+@pytest.mark.asyncio
+async def test_client_errors_are_returned_without_retrying():
+    handler, calls = failing_then([400])
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+    response = await send(transport_for(handler, breaker), "GET", "/rest/v1/profiles")
+
+    assert response.status_code == 400
+    assert len(calls) == 1
+    assert breaker.state == "closed"
+
+
+@pytest.mark.asyncio
+async def test_deadline_covers_the_call():
+    async def handler(request):
+        await asyncio.sleep(1)
+        return httpx.Response(200)
+
+    transport = transport_for(handler, deadline=0.05)
+    started = time.monotonic()
+    with pytest.raises(DatabaseUnavailable, match="deadline"):
+        await send(transport, "GET", "/rest/v1/game_state")
+    assert time.monotonic() - started < 0.5
+    assert transport.stats["deadline_exceeded"] == 1
+
+
+@pytest.mark.asyncio
+async def test_breaker_fails_fast_then_probes_recovery():
+    handler, calls = failing_then([503, 503, 503])
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+    transport = transport_for(handler, breaker, read_retries=0)
+
+    for _ in range(2):
+        with pytest.raises(DatabaseUnavailable):
+            await send(transport, "GET", "/rest/v1/game_state")
+    assert breaker.state == "open"
+
+    with pytest.raises(DatabaseUnavailable, match="open"):
+        await send(transport, "GET", "/rest/v1/game_state")
+    assert len(calls) == 2
+
+    # The probe fails, so the breaker opens again
+    await asyncio.sleep(0.06)
+    assert breaker.state == "half_open"
+    with pytest.raises(DatabaseUnavailable):
+        await send(transport, "GET", "/rest/v1/game_state")
+    assert breaker.state == "open"
+
+    await asyncio.sleep(0.06)
+    assert (await send(transport, "GET", "/rest/v1/game_state")).status_code == 200
+    assert breaker.state == "closed"
+    assert breaker.stats["opened"] == 2
+    assert breaker.stats["rejected"] == 1
+
+
+@pytest.mark.asyncio
+async def test_cancelled_probe_does_not_wedge_the_breaker():
+    started = asyncio.Event()
+
+    async def handler(request):
+        started.set()
+        await asyncio.sleep(1)
+        return httpx.Response(200)
+
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.01)
+    breaker.record_failure()
+    await asyncio.sleep(0.02)
+    assert breaker.state == "half_open"
+
+    probe = asyncio.create_task(send(transport_for(handler, breaker), "GET", "/rest/v1/game_state"))
+    await started.wait()
+    assert breaker.state == "open"
+    probe.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await probe
+
+    assert breaker.state == "half_open"
+    handler_ok, _ = failing_then([])
+    assert (await send(transport_for(handler_ok, breaker), "GET", "/rest/v1/game_state")).status_code == 200
+    assert breaker.state == "closed"
+
+
+@pytest.mark.asyncio
+async def test_archive_timeouts_do_not_trip_the_shared_breaker():
+    async def handler(request):
+        if request.url.path.endswith("/rpc/archive_win_transcripts"):
+            await asyncio.sleep(1)
+        return httpx.Response(200, json=[])
+
+    transport = ResilientTransport(
+        httpx.MockTransport(handler),
+        db_breaker,
+        deadline=1.0,
+        read_retries=0,
+        backoff=0.001,
+        backoff_max=0.002,
+        bulk_breaker=bulk_db_breaker,
+        bulk_deadline=0.01,
+    )
+    http_client = httpx.AsyncClient(transport=transport, base_url="http://fake")
+    supabase = AsyncClient("http://fake", "service-role", AsyncClientOptions(httpx_client=http_client))
+
+    with patch('app.core.archive.supabase', supabase):
+        # As the task queue would retry it, and more
+        for _ in range(settings.DB_BREAKER_FAILURE_THRESHOLD + 2):
+            with pytest.raises(DatabaseUnavailable):
+                await archive_win_transcripts()
+
+    assert bulk_db_breaker.state == "open"
+    assert db_breaker.state == "closed"
+    assert (await http_client.get("/rest/v1/game_state")).status_code == 200
+
+
+def resilient_supabase(db: FakeDatabase) -> AsyncClient:
+    transport = ResilientTransport(
+        httpx.ASGITransport(app=create_app(db)),
+        db_breaker,
+        deadline=1.0,
+        read_retries=1,
+        backoff=0.001,
+        backoff_max=0.002,
+    )
+    http_client = httpx.AsyncClient(transport=transport, base_url="http://fake")
+    return AsyncClient("http://fake", "service-role", AsyncClientOptions(httpx_client=http_client))
+
+
+def test_outage_serves_stale_reads_and_sheds_the_rest(client):
+    db = FakeDatabase(users=1)
+    supabase = resilient_supabase(db)
+    with patch('app.core.game_state.supabase', supabase), patch('app.core.wins.supabase', supabase), \
+            patch.object(settings, "FAST_JSON_RESPONSES", True), \
+            patch('app.core.game_state._game_state_snapshot.ttl', 0):
+        before = client.get("/api/v1/game_state").json()
+
+        db.outage = "error"
+        assert client.get("/api/v1/game_state").json() == before
+
+        response = client.get("/api/v1/wins")
+        assert response.status_code == 503
+        assert "Retry-After" in response.headers
+
+        while db_breaker.state == "closed":
+            client.get("/api/v1/wins")
+        calls = db.request_count
+        assert client.get("/api/v1/wins").status_code == 503
+        assert client.get("/api/v1/game_state").json() == before
+        assert db.request_count == calls
+
+        db.outage = None
+        db_breaker.reset()
+        assert client.get("/api/v1/wins").status_code == 200
@@ -0,0 +1,96 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from app.core import game_state
+from app.core.config import settings
+from app.core.responses import FastJSONResponse, dump_json, trusted_fields
+from app.schemas.game import ProfileResponse
+
+GAME_STATE_ROW = {
+    'id': 1, 'prizepool_amount': 1234.5, 'is_payout_phase_active': False, 'total_attempts': 77,
+}
+
+
+def mock_game_state_read(mock_supabase, row=GAME_STATE_ROW):
+    execute = AsyncMock(side_effect=lambda: MagicMock(data=dict(row)))
+    (mock_supabase.table.return_value
+     .select.return_value
+     .single.return_value
+     .execute) = execute
+    return execute
+
+
+def test_trusted_fields_projects_row_onto_model():
+    row = {"id": "8d5c9e2b-6428-4f05-8472-760a2d2a45b1", "credits": 3, "created_at": "2024-07-30"}
+
+    assert trusted_fields(ProfileResponse, row) == {
+        "id": "8d5c9e2b-6428-4f05-8472-760a2d2a45b1", "username": None, "avatar_url": None, "credits": 3,
+    }
+    with pytest.raises(KeyError):
+        trusted_fields(ProfileResponse, {"id": row["id"]})
+
+
+def test_fast_json_response_is_compact():
+    response = FastJSONResponse({"a": [1, 2], "b": None})
+
+    assert response.body == b'{"a":[1,2],"b":null}'
+    assert response.headers["content-type"] == "application/json"
+    assert dump_json({"a": [1, 2], "b": None}) == response.body
+
+
+@pytest.mark.parametrize("fast", [False, True])
+@patch('app.api.endpoints.game.supabase')
+@patch('app.core.profiles.supabase')
+@patch('app.core.game_state.supabase')
+def test_fast_path_returns_the_same_documents(mock_state_db, mock_profiles_db, mock_game_db, fast, client, mock_user):
+    """
+    Tests that the fast path and the default path serve identical JSON for
+    /game_state, /me/profile and /log_attempt.
+    """
+    # Arrange
+    mock_game_state_read(mock_state_db)
+    (mock_profiles_db.table.return_value
+     .select.return_value
+     .eq.return_value
+     .single.return_value
+     .execute) = AsyncMock(return_value=MagicMock(data={
+         "id": str(mock_user.id), "username": "testuser", "avatar_url": None, "credits": 10,
+         "created_at": "2024-07-30T10:00:00+00:00",
+     }))
+    mock_game_db.rpc.return_value.execute = AsyncMock(return_value=MagicMock(
+        data=[{'is_payout_phase_active': True, 'new_credits_balance': 9}]
+    ))
+
+    # Act
+    with patch.object(settings, 'FAST_JSON_RESPONSES', fast):
+        state = client.get("/api/v1/game_state")
+        profile = client.get("/api/v1/me/profile")
+        attempt = client.post("/api/v1/log_attempt")
+
+    # Assert
+    assert state.json() == {'prizepool_amount': 1234.5, 'is_payout_phase_active': False}
+    assert profile.json() == {
+        "id": str(mock_user.id), "username": "testuser", "avatar_url": None, "credits": 10,
+    }
+    assert attempt.json() == {'is_payout_phase_active': True, 'new_credits_balance': 9}
+    assert all(r.headers["content-type"] == "application/json" for r in (state, profile, attempt))
+
+
+@pytest.mark.asyncio
+@patch('app.core.game_state.supabase')
+async def test_game_state_body_is_serialized_once_per_snapshot(mock_supabase):
+    # Arrange
+    read = mock_game_state_read(mock_supabase)
+
+    # Act
+    with patch('app.core.game_state.dump_json', wraps=dump_json) as dump:
+        first = await game_state.get_game_state_body()
+        second = await game_state.get_game_state_body()
+        await game_state.clear_game_state_cache()
+        third = await game_state.get_game_state_body()
+
+    # Assert
+    assert first is second
+    assert first == third == b'{"prizepool_amount":1234.5,"is_payout_phase_active":false}'
+    assert dump.call_count == 2
+    assert read.await_count == 2
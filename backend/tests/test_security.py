@@ -0,0 +1,128 @@
+import time
+import pytest
+from unittest.mock import AsyncMock, MagicMock, patch
+from fastapi import HTTPException
+from jose import jwt
+
+from app.api.deps import get_current_user
+from app.core.security import JWTVerifier, TokenUser, TokenVerificationError
+
+SECRET = "test-jwt-secret"
+USER_ID = "8d5c9e2b-6428-4f05-8472-760a2d2a45b1"
+
+
+def make_token(secret=SECRET, **overrides):
+    claims = {
+        "sub": USER_ID,
+        "aud": "authenticated",
+        "role": "authenticated",
+        "email": "test@example.com",
+        "exp": int(time.time()) + 3600,
+    }
+    claims.update(overrides)
+    return jwt.encode(claims, secret, algorithm="HS256")
+
+
+@pytest.fixture
+def verifier():
+    return JWTVerifier(
+        supabase_url="http://localhost:54321",
+        audience="authenticated",
+        jwt_secret=SECRET,
+        cache_size=2,
+    )
+
+
+@pytest.mark.asyncio
+async def test_verify_valid_token(verifier):
+    claims = await verifier.verify(make_token())
+    assert claims["sub"] == USER_ID
+    assert TokenUser.from_claims(claims).id == USER_ID
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("token", [
+    make_token(secret="wrong-secret"),
+    make_token(exp=int(time.time()) - 10),
+    make_token(aud="other-audience"),
+    make_token(role="anon"),
+    make_token(role="service_role"),
+])
+async def test_verify_rejects_invalid_tokens(verifier, token):
+    with pytest.raises(TokenVerificationError):
+        await verifier.verify(token)
+
+
+@pytest.mark.asyncio
+async def test_role_is_checked_separately_from_audience():
+    verifier = JWTVerifier(
+        supabase_url="http://localhost:54321",
+        audience="my-app",
+        role="authenticated",
+        jwt_secret=SECRET,
+    )
+    claims = await verifier.verify(make_token(aud="my-app"))
+    assert claims["sub"] == USER_ID
+
+    with pytest.raises(TokenVerificationError):
+        await verifier.verify(make_token(aud="my-app", role="my-app"))
+
+
+@pytest.mark.asyncio
+async def test_verified_claims_are_cached(verifier):
+    token = make_token()
+    await verifier.verify(token)
+
+    with patch('app.core.security.jwt.decode') as mock_decode:
+        claims = await verifier.verify(token)
+
+    mock_decode.assert_not_called()
+    assert claims["sub"] == USER_ID
+
+
+@pytest.mark.asyncio
+async def test_claims_cache_is_bounded_and_evicts_at_expiry(verifier):
+    tokens = [make_token(email=f"user{i}@example.com") for i in range(3)]
+    for token in tokens:
+        await verifier.verify(token)
+    assert len(verifier.claims_cache) == 2
+
+    short_lived = make_token(exp=int(time.time()) + 1)
+    await verifier.verify(short_lived)
+    key = verifier.claims_cache.key_for(short_lived)
+    verifier.claims_cache._entries[key]["exp"] = int(time.time()) - 1
+
+    assert verifier.claims_cache.get(key) is None
+    assert key not in verifier.claims_cache._entries
+
+
+@pytest.mark.asyncio
+@patch('app.api.deps.supabase')
+@patch('app.api.deps.token_verifier', JWTVerifier("http://localhost:54321", "authenticated", SECRET))
+async def test_get_current_user_verifies_locally(mock_supabase):
+    user = await get_current_user(make_token())
+
+    assert user.id == USER_ID
+    mock_supabase.auth.get_user.assert_not_called()
+
+
+@pytest.mark.asyncio
+@patch('app.api.deps.token_verifier', JWTVerifier("http://localhost:54321", "authenticated", SECRET))
+async def test_get_current_user_rejects_invalid_token():
+    with pytest.raises(HTTPException) as exc_info:
+        await get_current_user(make_token(secret="wrong-secret"))
+    assert exc_info.value.status_code == 401
+
+
+@pytest.mark.asyncio
+@patch('app.api.deps.supabase')
+@patch('app.api.deps.settings')
+async def test_get_current_user_strict_mode_uses_supabase_auth(mock_settings, mock_supabase):
+    mock_settings.AUTH_STRICT_MODE = True
+    remote_user = MagicMock(id=USER_ID)
+    mock_supabase.auth.get_user = AsyncMock(return_value=MagicMock(user=remote_user))
+
+    user = await get_current_user("opaque-token")
+
+    assert user is remote_user
+    mock_supabase.auth.get_user.assert_called_once_with("opaque-token")
@@ -0,0 +1,36 @@
+import os
+
+from benchmarks.bench_startup import measure_boot
+
+# Generous, so only a real regression (e.g. a client built at import) trips it
+STARTUP_BUDGET_SECONDS = float(os.environ.get("STARTUP_BUDGET_SECONDS", "3.0"))
+
+
+def test_importing_the_app_builds_no_clients():
+    """
+    Tests that a fresh worker imports the app without building connection
+    pools or configuring logging, and within the boot time budget.
+    """
+    report = measure_boot()
+
+    assert report["clients_built"] is False
+    assert report["root_log_handlers"] == 0
+    assert report["import_seconds"] < STARTUP_BUDGET_SECONDS
+
+
+def test_lazy_client_is_built_once_per_process():
+    from app.core.lazy import PerWorker
+
+    built = []
+    holder = PerWorker(lambda: built.append(object()) or built[-1])
+
+    assert holder.built is False
+    assert holder.get() is holder.get()
+    assert len(built) == 1
+
+    # A forked worker inherits the parent's instance but must build its own
+    holder._pid = -1
+    assert holder.built is False
+    assert holder.get() is built[1]
+    assert holder.reset() is built[1]
+    assert holder.built is False
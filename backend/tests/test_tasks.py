@@ -0,0 +1,105 @@
+import asyncio
+import json
+import pytest
+from unittest.mock import AsyncMock, patch
+
+from app.core.tasks import InMemoryTaskQueue, RedisTaskQueue, UnknownTask
+
+
+class FakeRedis:
+    """The list commands RedisTaskQueue uses, shared between 'workers'."""
+
+    def __init__(self):
+        self.lists = {}
+
+    async def lpush(self, key, value):
+        self.lists.setdefault(key, []).insert(0, value)
+
+    async def brpop(self, key, timeout):
+        for _ in range(int(timeout * 100)):
+            if self.lists.get(key):
+                return key, self.lists[key].pop()
+            await asyncio.sleep(0.01)
+        return None
+
+    async def aclose(self):
+        pass
+
+
+def flaky(failures: int):
+    """A handler that fails `failures` times, then records its arguments."""
+    calls = []
+
+    async def handler(**payload):
+        calls.append(payload)
+        if len(calls) <= failures:
+            raise Exception("database unavailable")
+
+    return handler, calls
+
+
+@pytest.mark.asyncio
+async def test_jobs_run_in_the_background_and_are_retried():
+    queue = InMemoryTaskQueue(concurrency=2, max_attempts=3, retry_delay=0.001, drain_timeout=1)
+    recovers, recovers_calls = flaky(2)
+    broken, broken_calls = flaky(10)
+    queue.register("recovers", recovers)
+    queue.register("broken", broken)
+
+    # Queued before the consumers start; nothing runs until then
+    await queue.enqueue("recovers", upload_id="u1")
+    await queue.enqueue("broken")
+    assert recovers_calls == []
+    queue.start()
+    await queue.drain()
+    await queue.stop()
+
+    assert recovers_calls == [{"upload_id": "u1"}] * 3
+    assert len(broken_calls) == 3
+    assert queue.stats == {"enqueued": 2, "completed": 1, "retried": 4, "failed": 1}
+    with pytest.raises(UnknownTask):
+        await queue.enqueue("missing")
+
+
+@pytest.mark.asyncio
+async def test_scheduled_jobs_repeat_until_stopped():
+    queue = InMemoryTaskQueue(concurrency=1, max_attempts=1, retry_delay=0, drain_timeout=1)
+    job = AsyncMock()
+    queue.register("sweep", job)
+    queue.schedule("sweep", interval=0.01)
+
+    queue.start()
+    await asyncio.sleep(0.055)
+    await queue.stop()
+    runs = job.await_count
+    await asyncio.sleep(0.03)
+
+    assert 3 <= runs <= 6
+    assert job.await_count == runs
+
+
+@pytest.mark.asyncio
+async def test_redis_queue_runs_jobs_on_any_worker():
+    fake = FakeRedis()
+    with patch('app.core.tasks.redis.from_url', return_value=fake):
+        producer, consumer = (
+            RedisTaskQueue("redis://fake", key="tasks", concurrency=1, max_attempts=2, retry_delay=0.001)
+            for _ in range(2)
+        )
+    handler, calls = flaky(1)
+    for worker in (producer, consumer):
+        worker.register("discard", handler)
+
+    # Only the consumer is running; the producer's job waits in Redis for it
+    await producer.enqueue("discard", upload_id="u1")
+    assert json.loads(fake.lists["tasks"][0]) == {"name": "discard", "payload": {"upload_id": "u1"}}
+    consumer.start()
+    for _ in range(100):
+        if consumer.stats["completed"]:
+            break
+        await asyncio.sleep(0.01)
+    await consumer.stop()
+
+    assert calls == [{"upload_id": "u1"}] * 2
+    assert fake.lists["tasks"] == []
+    assert consumer.stats["retried"] == 1
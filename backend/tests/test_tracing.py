@@ -0,0 +1,85 @@
+import argparse
+import asyncio
+import json
+import os
+import httpx
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from supabase import AsyncClient, AsyncClientOptions
+
+from app.main import app
+from app.core.security import JWTVerifier
+from app.core.tracing import TraceMiddleware, TraceWriter, TracingTransport, hash_user
+from benchmarks import replay_trace
+from benchmarks.fake_postgrest import FakeDatabase, create_app
+from tests.test_security import SECRET, USER_ID, make_token
+
+
+def traced_supabase(db: FakeDatabase) -> AsyncClient:
+    transport = TracingTransport(httpx.ASGITransport(app=create_app(db)))
+    http_client = httpx.AsyncClient(transport=transport, base_url="http://fake")
+    return AsyncClient("http://fake", "service-role", AsyncClientOptions(httpx_client=http_client))
+
+
+def record_traffic(tmp_path, sample_rate=1.0):
+    """Sends a few requests through the traced app and returns the written records."""
+    writer = TraceWriter(str(tmp_path / "trace-{pid}.jsonl"))
+    traced = TraceMiddleware(app, writer, sample_rate, query_params=["limit"])
+    token = make_token()
+    db = FakeDatabase(users=1)
+    supabase = traced_supabase(db)
+
+    with patch('app.core.wins.supabase', supabase), patch('app.core.profiles.supabase', supabase), \
+            patch('app.api.deps.token_verifier', JWTVerifier("http://localhost:54321", "authenticated", SECRET)):
+        with TestClient(traced) as client:
+            assert client.get("/api/v1/wins", params={"limit": 5, "note": "secret-ish"}).status_code == 200
+            client.get("/api/v1/me/profile", headers={"Authorization": f"Bearer {token}"})
+            assert client.get("/not-a-route").status_code == 404
+    writer.close()
+
+    path = tmp_path / f"trace-{os.getpid()}.jsonl"
+    if not path.exists():
+        return [], ""
+    text = path.read_text()
+    return [json.loads(line) for line in text.splitlines()], text
+
+
+def test_sampled_requests_are_traced_without_secrets(tmp_path):
+    records, text = record_traffic(tmp_path)
+
+    wins, profile = records
+    assert wins["route"] == "/api/v1/wins"
+    assert wins["params"] == {"limit": "5"}
+    assert wins["user"] is None
+    assert wins["status"] == 200
+    assert [call[:3] for call in wins["db"]] == [["rpc/get_recent_wins", "POST", 200]]
+
+    assert profile["route"] == "/api/v1/me/profile"
+    assert profile["user"] == hash_user(USER_ID)
+    assert [call[0] for call in profile["db"]] == ["profiles"]
+
+    assert make_token() not in text
+    assert USER_ID not in text
+    assert "secret-ish" not in text
+
+
+def test_unsampled_requests_are_not_written(tmp_path):
+    assert record_traffic(tmp_path, sample_rate=0.0) == ([], "")
+
+
+def test_replay_reports_and_profiles_each_route(tmp_path):
+    records, _ = record_traffic(tmp_path)
+    args = argparse.Namespace(
+        speed=100.0, db_latency_ms=None, llm_token_delay_ms=0.0,
+        profile_dir=str(tmp_path / "profiles"), profiler="cprofile",
+    )
+    os.makedirs(args.profile_dir)
+
+    replay = asyncio.run(replay_trace.run(records, args))
+    report = replay_trace.report(replay)
+
+    assert report["routes"]["GET /api/v1/wins"]["replayed"]["statuses"] == {200: 1}
+    assert report["routes"]["GET /api/v1/me/profile"]["replayed"]["db_calls"] == 1
+    assert sorted(os.listdir(args.profile_dir)) == [
+        "GET_api_v1_me_profile.pstats", "GET_api_v1_wins.pstats",
+    ]
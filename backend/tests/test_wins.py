@@ -0,0 +1,132 @@
+import pytest
+from unittest.mock import patch
+
+from app.core.archive import archive_win_transcripts
+from app.core.config import settings
+from app.core.wins import InvalidCursor, _integer, _timestamp, _uuid, decode_cursor, encode_cursor
+from benchmarks.fake_postgrest import FakeDatabase
+from tests.test_chat_log import fake_supabase
+
+
+def user(i: int) -> str:
+    return FakeDatabase().tables["profiles"][i]["id"]
+
+
+@pytest.fixture
+def db():
+    """A fake database with 5 wins: user0 won 3 times, user1 twice."""
+    db = FakeDatabase(users=3)
+    for i, winner in enumerate([0, 1, 0, 1, 0]):
+        db.record_win({
+            "p_user_id": user(winner),
+            "p_chat_log": [{"prompt": f"win {i} turn {t}", "response": "ok"} for t in range(5)],
+        })
+    client = fake_supabase(db)
+    with patch('app.core.wins.supabase', client), patch('app.core.chat_log.supabase', client):
+        yield db
+
+
+def collect(client, url, limit):
+    """Follows next_cursor through every page, returning the pages."""
+    pages = [client.get(url, params={"limit": limit}).json()]
+    while pages[-1]["next_cursor"]:
+        pages.append(client.get(url, params={"limit": limit, "cursor": pages[-1]["next_cursor"]}).json())
+    return pages
+
+
+def test_cursor_round_trip_and_rejection():
+    fields = (_integer, _timestamp, _uuid)
+    assert decode_cursor(encode_cursor(3, "2024-07-30T10:00:00+00:00", user(0)), *fields) == [
+        3, "2024-07-30T10:00:00+00:00", user(0)
+    ]
+    for bad in [
+        "not a cursor",
+        encode_cursor(1, 2),
+        encode_cursor("3", "2024-07-30T10:00:00+00:00", user(0)),
+        encode_cursor(True, "2024-07-30T10:00:00+00:00", user(0)),
+        encode_cursor(3, "yesterday", user(0)),
+        encode_cursor(3, "2024-07-30T10:00:00+00:00", "abc"),
+        encode_cursor(3, "2024-07-30T10:00:00+00:00", {"id": user(0)}),
+    ]:
+        with pytest.raises(InvalidCursor):
+            decode_cursor(bad, *fields)
+
+
+def test_recent_wins_pages_cover_every_win_newest_first(db, client):
+    pages = collect(client, "/api/v1/wins", limit=2)
+
+    assert [len(p["items"]) for p in pages] == [2, 2, 1]
+    ids = [w["id"] for p in pages for w in p["items"]]
+    assert ids == [w["id"] for w in reversed(db.tables["wins"])]
+    assert pages[0]["items"][0]["username"] == "user0"
+
+
+def test_win_transcript_pages_in_order(db, client):
+    win_id = db.tables["wins"][1]["id"]
+
+    pages = collect(client, f"/api/v1/wins/{win_id}/messages", limit=2)
+
+    assert all(p["win_id"] == win_id for p in pages)
+    assert [m["prompt"] for p in pages for m in p["messages"]] == [f"win 1 turn {t}" for t in range(5)]
+
+
+def test_win_reads_reject_unknown_wins_and_bad_cursors(db, client):
+    missing = "00000000-0000-0000-0000-00000000beef"
+
+    assert client.get(f"/api/v1/wins/{missing}/messages").status_code == 404
+    assert client.get("/api/v1/wins", params={"cursor": "garbage"}).status_code == 400
+    assert client.get("/api/v1/leaderboard", params={"cursor": encode_cursor("a", "b")}).status_code == 400
+    assert client.get("/api/v1/wins", params={"cursor": encode_cursor("not a time", "x")}).status_code == 400
+    assert client.get("/api/v1/leaderboard", params={"cursor": encode_cursor("1", None, 7)}).status_code == 400
+    assert client.get(
+        f"/api/v1/wins/{db.tables['wins'][0]['id']}/messages", params={"cursor": encode_cursor([1])}
+    ).status_code == 400
+    assert client.get("/api/v1/wins", params={"limit": 1000}).status_code == 422
+
+
+def test_leaderboard_ranks_winners_and_follows_new_wins(db, client, mock_user):
+    """
+    Tests the leaderboard order and paging, and that the cached first page
+    is refreshed once a win goes through /handle_win.
+    """
+    first = client.get("/api/v1/leaderboard").json()
+    assert [(e["username"], e["wins"]) for e in first["items"]] == [("user0", 3), ("user1", 2)]
+    assert first["next_cursor"] is None
+
+    # Act: user1 wins twice more, then the test user wins through the API
+    for _ in range(2):
+        db.record_win({"p_user_id": user(1), "p_chat_log": []})
+    assert client.get("/api/v1/leaderboard").json() == first
+    assert client.post("/api/v1/handle_win", json={"chat_log": []}).status_code == 200
+
+    # Assert
+    refreshed = client.get("/api/v1/leaderboard").json()
+    assert [(e["user_id"], e["wins"]) for e in refreshed["items"]] == [
+        (user(1), 4), (user(0), 3), (str(mock_user.id), 1)
+    ]
+    pages = collect(client, "/api/v1/leaderboard", limit=1)
+    assert [e for p in pages for e in p["items"]] == refreshed["items"]
+
+
+@pytest.mark.asyncio
+async def test_archived_transcripts_leave_the_hot_table_and_stay_readable(db, client):
+    """
+    Tests that the archiver moves old transcripts out of the messages table
+    in batches, and that /wins/{id}/messages still pages through them with
+    cursors issued before the move.
+    """
+    for log in db.tables["winning_chat_logs"][:3]:
+        log["created_at"] = "2024-01-01T00:00:00+00:00"
+    old_win = db.tables["wins"][1]["id"]
+    before = collect(client, f"/api/v1/wins/{old_win}/messages", limit=2)
+
+    with patch('app.core.archive.supabase', fake_supabase(db)), \
+            patch.object(settings, "TRANSCRIPT_ARCHIVE_BATCH_SIZE", 2):
+        assert await archive_win_transcripts() == 3
+        assert await archive_win_transcripts() == 0
+
+    assert len(db.tables["winning_chat_messages"]) == 10
+    assert [a["message_count"] for a in db.tables["winning_chat_archive"]] == [5, 5, 5]
+    assert collect(client, f"/api/v1/wins/{old_win}/messages", limit=2) == before
+    resumed = client.get(f"/api/v1/wins/{old_win}/messages", params={"limit": 2, "cursor": before[0]["next_cursor"]})
+    assert resumed.json() == before[1]
@@ -114,23 +114,24 @@ export const useAppData = (session: any) => {
     
     try {
       const result = await api.logAttempt();
-      // Update game state based on the response (but don't expose payout phase to UI)
+      // Update game state and credits from the response (but don't expose payout phase to UI)
       setAppData(prev => ({
         ...prev,
         gameState: prev.gameState ? {
           ...prev.gameState,
           is_payout_phase_active: result.is_payout_phase_active
+        } : null,
+        profile: prev.profile ? {
+          ...prev.profile,
+          credits: result.new_credits_balance
         } : null
       }));
       
-      // Refresh profile to get updated credits after attempt
-      await fetchProfile();
-      
       // Don't return payout phase status to frontend
     } catch (error) {
       console.error('Failed to log attempt:', error);
     }
-  }, [session, fetchProfile]);
+  }, [session]);
 
   // Handle win submission
   const handleWinSubmission = useCallback(async (chatLog: ChatMessage[]) => {
@@ -23,6 +23,7 @@ export interface HandleWinRequest {
 // Response Models (Data sent FROM the API)
 export interface LogAttemptResponse {
   is_payout_phase_active: boolean;
+  new_credits_balance: number;
 }
 
 export interface HandleWinResponse {
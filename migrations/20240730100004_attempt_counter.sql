@@ -0,0 +1,83 @@
+-- Write-combining attempt counter.
+-- In 'batched' mode the backend splits log_attempt in two: the per-user credit
+-- decrement runs on every request, while game_state attempts are aggregated in
+-- each worker and applied as one delta per flush.
+
+-- Flushes already applied, so a retried flush is never counted twice
+CREATE TABLE attempt_flushes (
+    id UUID PRIMARY KEY,
+    delta BIGINT NOT NULL,
+    applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+ALTER TABLE attempt_flushes ENABLE ROW LEVEL SECURITY;
+
+
+-- Per-user half of log_attempt: decrements credits without locking game_state
+CREATE OR REPLACE FUNCTION public.consume_attempt_credit(p_user_id UUID)
+RETURNS BOOLEAN AS $$
+DECLARE
+  v_is_payout_phase_active BOOLEAN;
+BEGIN
+  UPDATE public.profiles
+  SET credits = credits - 1
+  WHERE id = p_user_id;
+
+  -- Plain read, so it never waits on a flush holding the game_state row lock
+  SELECT is_payout_phase_active INTO v_is_payout_phase_active
+  FROM public.game_state
+  WHERE id = 1;
+
+  RETURN v_is_payout_phase_active;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+
+-- Applies an aggregated attempt delta and activates the payout phase when
+-- game_attempts crosses the threshold. 'activated' is true only for the flush
+-- that flipped the phase on.
+CREATE OR REPLACE FUNCTION public.add_game_attempts(p_flush_id UUID, p_delta BIGINT)
+RETURNS TABLE (
+    is_payout_phase_active BOOLEAN,
+    activated BOOLEAN
+) AS $$
+DECLARE
+  v_was_active BOOLEAN;
+  v_is_active BOOLEAN;
+BEGIN
+  INSERT INTO public.attempt_flushes (id, delta)
+  VALUES (p_flush_id, p_delta)
+  ON CONFLICT (id) DO NOTHING;
+
+  IF NOT FOUND THEN
+    -- Retry of a flush that was already applied
+    RETURN QUERY SELECT gs.is_payout_phase_active, false FROM public.game_state gs WHERE gs.id = 1;
+    RETURN;
+  END IF;
+
+  SELECT gs.is_payout_phase_active INTO v_was_active
+  FROM public.game_state gs
+  WHERE gs.id = 1
+  FOR UPDATE;
+
+  UPDATE public.game_state gs
+  SET
+    global_attempts = gs.global_attempts + p_delta,
+    game_attempts = gs.game_attempts + p_delta,
+    is_payout_phase_active = CASE
+      WHEN gs.game_attempts + p_delta >= gs.payout_phase_threshold THEN true
+      ELSE gs.is_payout_phase_active
+    END
+  WHERE gs.id = 1
+  RETURNING gs.is_payout_phase_active INTO v_is_active;
+
+  RETURN QUERY SELECT v_is_active, (v_is_active AND NOT v_was_active);
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+-- Only the backend may call these, with the service role key; the anon key
+-- shipped to the frontend must not reach them through PostgREST
+REVOKE EXECUTE ON FUNCTION public.consume_attempt_credit(UUID) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.consume_attempt_credit(UUID) TO service_role;
+REVOKE EXECUTE ON FUNCTION public.add_game_attempts(UUID, BIGINT) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.add_game_attempts(UUID, BIGINT) TO service_role;
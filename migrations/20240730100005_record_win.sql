@@ -0,0 +1,40 @@
+-- Function to record a win in a single transaction: stores the winning chat
+-- log and its messages, creates the win record and resets the game state.
+-- p_chat_log is a JSON array of {"prompt": ..., "response": ...} objects.
+CREATE OR REPLACE FUNCTION public.record_win(p_user_id UUID, p_chat_log JSONB)
+RETURNS UUID AS $$
+DECLARE
+  v_log_id UUID;
+  v_win_id UUID;
+  v_global_attempts BIGINT;
+BEGIN
+  -- Lock the game state first so concurrent attempts cannot change
+  -- global_attempts between reading it and resetting the game
+  SELECT global_attempts INTO v_global_attempts
+  FROM public.game_state
+  WHERE id = 1
+  FOR UPDATE;
+
+  INSERT INTO public.winning_chat_logs (user_id)
+  VALUES (p_user_id)
+  RETURNING id INTO v_log_id;
+
+  -- Bulk insert every message of the transcript
+  INSERT INTO public.winning_chat_messages (log_id, prompt, response)
+  SELECT v_log_id, m.prompt, m.response
+  FROM jsonb_to_recordset(p_chat_log) AS m(prompt TEXT, response TEXT);
+
+  INSERT INTO public.wins (user_id, global_attempt_at_win, winning_chat_log_id)
+  VALUES (p_user_id, v_global_attempts, v_log_id)
+  RETURNING id INTO v_win_id;
+
+  PERFORM public.handle_win();
+
+  RETURN v_win_id;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+-- Only the backend may call these, with the service role key; the anon key
+-- shipped to the frontend must not reach them through PostgREST
+REVOKE EXECUTE ON FUNCTION public.record_win(UUID, JSONB) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.record_win(UUID, JSONB) TO service_role;
@@ -0,0 +1,62 @@
+-- log_attempt and consume_attempt_credit also return the user's new credit
+-- balance, so the backend can keep its profile cache current without a
+-- follow-up read of profiles. The return type changes, hence DROP + CREATE.
+
+DROP FUNCTION IF EXISTS public.log_attempt(UUID);
+
+CREATE OR REPLACE FUNCTION public.log_attempt(p_user_id UUID)
+RETURNS TABLE (
+    is_payout_phase_active BOOLEAN,
+    new_credits_balance INT
+) AS $$
+DECLARE
+  v_is_payout_phase_active BOOLEAN;
+  v_new_balance INT;
+BEGIN
+  -- Decrement user's credits
+  UPDATE public.profiles
+  SET credits = credits - 1
+  WHERE id = p_user_id
+  RETURNING credits INTO v_new_balance;
+
+  -- Increment game state attempts and check for payout phase activation
+  UPDATE public.game_state gs
+  SET
+    global_attempts = gs.global_attempts + 1,
+    game_attempts = gs.game_attempts + 1,
+    is_payout_phase_active = CASE
+      WHEN gs.game_attempts + 1 >= gs.payout_phase_threshold THEN true
+      ELSE gs.is_payout_phase_active
+    END
+  WHERE gs.id = 1
+  RETURNING gs.is_payout_phase_active INTO v_is_payout_phase_active;
+
+  RETURN QUERY SELECT v_is_payout_phase_active, v_new_balance;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+
+DROP FUNCTION IF EXISTS public.consume_attempt_credit(UUID);
+
+CREATE OR REPLACE FUNCTION public.consume_attempt_credit(p_user_id UUID)
+RETURNS TABLE (
+    is_payout_phase_active BOOLEAN,
+    new_credits_balance INT
+) AS $$
+DECLARE
+  v_is_payout_phase_active BOOLEAN;
+  v_new_balance INT;
+BEGIN
+  UPDATE public.profiles
+  SET credits = credits - 1
+  WHERE id = p_user_id
+  RETURNING credits INTO v_new_balance;
+
+  -- Plain read, so it never waits on a flush holding the game_state row lock
+  SELECT gs.is_payout_phase_active INTO v_is_payout_phase_active
+  FROM public.game_state gs
+  WHERE gs.id = 1;
+
+  RETURN QUERY SELECT v_is_payout_phase_active, v_new_balance;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
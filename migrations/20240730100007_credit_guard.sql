@@ -0,0 +1,70 @@
+-- Attempts never take a balance below zero. Both attempt functions raise
+-- 'Insufficient credits' instead, which the backend maps to 402; in
+-- log_attempt the exception also rolls back the game_state increment.
+
+CREATE OR REPLACE FUNCTION public.log_attempt(p_user_id UUID)
+RETURNS TABLE (
+    is_payout_phase_active BOOLEAN,
+    new_credits_balance INT
+) AS $$
+DECLARE
+  v_is_payout_phase_active BOOLEAN;
+  v_new_balance INT;
+BEGIN
+  -- Decrement user's credits, only while some are left
+  UPDATE public.profiles
+  SET credits = credits - 1
+  WHERE id = p_user_id AND credits > 0
+  RETURNING credits INTO v_new_balance;
+
+  IF NOT FOUND THEN
+    RAISE EXCEPTION 'Insufficient credits';
+  END IF;
+
+  -- Increment game state attempts and check for payout phase activation
+  UPDATE public.game_state gs
+  SET
+    global_attempts = gs.global_attempts + 1,
+    game_attempts = gs.game_attempts + 1,
+    is_payout_phase_active = CASE
+      WHEN gs.game_attempts + 1 >= gs.payout_phase_threshold THEN true
+      ELSE gs.is_payout_phase_active
+    END
+  WHERE gs.id = 1
+  RETURNING gs.is_payout_phase_active INTO v_is_payout_phase_active;
+
+  RETURN QUERY SELECT v_is_payout_phase_active, v_new_balance;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+
+CREATE OR REPLACE FUNCTION public.consume_attempt_credit(p_user_id UUID)
+RETURNS TABLE (
+    is_payout_phase_active BOOLEAN,
+    new_credits_balance INT
+) AS $$
+DECLARE
+  v_is_payout_phase_active BOOLEAN;
+  v_new_balance INT;
+BEGIN
+  UPDATE public.profiles
+  SET credits = credits - 1
+  WHERE id = p_user_id AND credits > 0
+  RETURNING credits INTO v_new_balance;
+
+  IF NOT FOUND THEN
+    RAISE EXCEPTION 'Insufficient credits';
+  END IF;
+
+  -- Plain read, so it never waits on a flush holding the game_state row lock
+  SELECT gs.is_payout_phase_active INTO v_is_payout_phase_active
+  FROM public.game_state gs
+  WHERE gs.id = 1;
+
+  RETURN QUERY SELECT v_is_payout_phase_active, v_new_balance;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+-- Backstop for any other writer
+ALTER TABLE public.profiles
+  ADD CONSTRAINT profiles_credits_non_negative CHECK (credits >= 0) NOT VALID;
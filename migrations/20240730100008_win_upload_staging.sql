@@ -0,0 +1,95 @@
+-- Chunked win uploads. Long transcripts are sent in fixed-size chunks
+-- with stage_win_messages, then committed by finalize_win. That one
+-- transaction does what record_win does for short transcripts: it stores the
+-- log and its messages, creates the win and resets the game state. Staged
+-- rows never become visible as a win unless finalize_win commits.
+
+CREATE TABLE win_upload_messages (
+    upload_id UUID NOT NULL,
+    user_id UUID NOT NULL REFERENCES auth.users(id) ON DELETE CASCADE,
+    position INT NOT NULL,
+    prompt TEXT NOT NULL,
+    response TEXT NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    PRIMARY KEY (upload_id, position)
+);
+
+CREATE INDEX win_upload_messages_created_at_idx ON win_upload_messages (created_at);
+
+ALTER TABLE win_upload_messages ENABLE ROW LEVEL SECURITY;
+
+
+-- Stages one chunk; p_offset is the position of its first message.
+-- A retried chunk is ignored.
+CREATE OR REPLACE FUNCTION public.stage_win_messages(
+    p_upload_id UUID, p_user_id UUID, p_offset INT, p_messages JSONB
+)
+RETURNS VOID AS $$
+BEGIN
+  INSERT INTO public.win_upload_messages (upload_id, user_id, position, prompt, response)
+  SELECT p_upload_id, p_user_id, p_offset + m.ord - 1, m.prompt, m.response
+  FROM ROWS FROM (jsonb_to_recordset(p_messages) AS (prompt TEXT, response TEXT))
+    WITH ORDINALITY AS m(prompt, response, ord)
+  ON CONFLICT (upload_id, position) DO NOTHING;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+
+-- Commits a staged upload plus its final chunk as a win
+CREATE OR REPLACE FUNCTION public.finalize_win(p_upload_id UUID, p_user_id UUID, p_chat_log JSONB)
+RETURNS UUID AS $$
+DECLARE
+  v_log_id UUID;
+  v_win_id UUID;
+  v_global_attempts BIGINT;
+BEGIN
+  -- Lock the game state first, as in record_win
+  SELECT global_attempts INTO v_global_attempts
+  FROM public.game_state
+  WHERE id = 1
+  FOR UPDATE;
+
+  INSERT INTO public.winning_chat_logs (user_id)
+  VALUES (p_user_id)
+  RETURNING id INTO v_log_id;
+
+  INSERT INTO public.winning_chat_messages (log_id, prompt, response)
+  SELECT v_log_id, s.prompt, s.response
+  FROM public.win_upload_messages s
+  WHERE s.upload_id = p_upload_id AND s.user_id = p_user_id
+  ORDER BY s.position;
+
+  INSERT INTO public.winning_chat_messages (log_id, prompt, response)
+  SELECT v_log_id, m.prompt, m.response
+  FROM jsonb_to_recordset(p_chat_log) AS m(prompt TEXT, response TEXT);
+
+  INSERT INTO public.wins (user_id, global_attempt_at_win, winning_chat_log_id)
+  VALUES (p_user_id, v_global_attempts, v_log_id)
+  RETURNING id INTO v_win_id;
+
+  PERFORM public.handle_win();
+
+  -- Drop this upload, and any abandoned by clients that went away
+  DELETE FROM public.win_upload_messages
+  WHERE upload_id = p_upload_id OR created_at < now() - interval '1 hour';
+
+  RETURN v_win_id;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+
+CREATE OR REPLACE FUNCTION public.discard_win_upload(p_upload_id UUID)
+RETURNS VOID AS $$
+BEGIN
+  DELETE FROM public.win_upload_messages WHERE upload_id = p_upload_id;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+-- Only the backend may call these, with the service role key; the anon key
+-- shipped to the frontend must not reach them through PostgREST
+REVOKE EXECUTE ON FUNCTION public.stage_win_messages(UUID, UUID, INT, JSONB) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.stage_win_messages(UUID, UUID, INT, JSONB) TO service_role;
+REVOKE EXECUTE ON FUNCTION public.finalize_win(UUID, UUID, JSONB) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.finalize_win(UUID, UUID, JSONB) TO service_role;
+REVOKE EXECUTE ON FUNCTION public.discard_win_upload(UUID) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.discard_win_upload(UUID) TO service_role;
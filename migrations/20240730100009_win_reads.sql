@@ -0,0 +1,134 @@
+-- Read side of wins: the recent wins feed, win transcripts and a
+-- leaderboard. Every list is paged with a keyset cursor (the sort key of
+-- the last row returned) instead of OFFSET, so each page is an index range
+-- scan no matter how deep it is.
+
+-- Order of a transcript's messages. created_at is the transaction time,
+-- identical for every message of a win, so it cannot order them.
+ALTER TABLE winning_chat_messages ADD COLUMN seq BIGINT GENERATED BY DEFAULT AS IDENTITY;
+
+CREATE INDEX wins_win_time_id_idx ON wins (win_time DESC, id DESC);
+CREATE INDEX wins_user_id_win_time_idx ON wins (user_id, win_time DESC);
+CREATE INDEX winning_chat_logs_user_id_idx ON winning_chat_logs (user_id);
+CREATE INDEX winning_chat_messages_log_id_seq_idx ON winning_chat_messages (log_id, seq);
+
+
+-- One row per winner, maintained by the triggers below as wins are
+-- recorded, so the leaderboard never aggregates the wins table
+CREATE TABLE leaderboard (
+    user_id UUID PRIMARY KEY REFERENCES auth.users(id) ON DELETE CASCADE,
+    wins INT NOT NULL,
+    first_win_at TIMESTAMPTZ NOT NULL,
+    last_win_at TIMESTAMPTZ NOT NULL
+);
+
+-- Ranking order: most wins first, then whoever reached that count first
+CREATE INDEX leaderboard_rank_idx ON leaderboard (wins DESC, last_win_at, user_id);
+
+ALTER TABLE leaderboard ENABLE ROW LEVEL SECURITY;
+CREATE POLICY "Leaderboard is public" ON leaderboard FOR SELECT USING (true);
+
+INSERT INTO leaderboard (user_id, wins, first_win_at, last_win_at)
+SELECT user_id, count(*), min(win_time), max(win_time)
+FROM wins
+GROUP BY user_id;
+
+
+CREATE OR REPLACE FUNCTION public.count_win()
+RETURNS TRIGGER AS $$
+BEGIN
+  IF TG_OP = 'INSERT' THEN
+    INSERT INTO public.leaderboard AS l (user_id, wins, first_win_at, last_win_at)
+    VALUES (NEW.user_id, 1, NEW.win_time, NEW.win_time)
+    ON CONFLICT (user_id) DO UPDATE
+      SET wins = l.wins + 1,
+          last_win_at = greatest(l.last_win_at, EXCLUDED.last_win_at);
+  ELSE
+    UPDATE public.leaderboard SET wins = wins - 1 WHERE user_id = OLD.user_id;
+    DELETE FROM public.leaderboard WHERE user_id = OLD.user_id AND wins <= 0;
+  END IF;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+-- Fires inside record_win / finalize_win, so the leaderboard changes in
+-- the same transaction as the win
+CREATE TRIGGER on_win_counted
+  AFTER INSERT OR DELETE ON wins
+  FOR EACH ROW EXECUTE FUNCTION public.count_win();
+
+
+-- Newest wins first; pass the win_time and id of the last row seen to get
+-- the next page
+CREATE OR REPLACE FUNCTION public.get_recent_wins(
+    p_limit INT, p_before_time TIMESTAMPTZ DEFAULT NULL, p_before_id UUID DEFAULT NULL
+)
+RETURNS TABLE (
+    id UUID,
+    user_id UUID,
+    username TEXT,
+    win_time TIMESTAMPTZ,
+    global_attempt_at_win BIGINT
+) AS $$
+  SELECT w.id, w.user_id, p.username, w.win_time, w.global_attempt_at_win
+  FROM public.wins w
+  LEFT JOIN public.profiles p ON p.id = w.user_id
+  WHERE p_before_time IS NULL OR (w.win_time, w.id) < (p_before_time, p_before_id)
+  ORDER BY w.win_time DESC, w.id DESC
+  LIMIT p_limit;
+$$ LANGUAGE sql STABLE SECURITY DEFINER;
+
+
+-- A win's transcript in order; pass the seq of the last message seen to
+-- get the next page
+CREATE OR REPLACE FUNCTION public.get_win_messages(p_win_id UUID, p_limit INT, p_after_seq BIGINT DEFAULT NULL)
+RETURNS TABLE (
+    seq BIGINT,
+    prompt TEXT,
+    response TEXT
+) AS $$
+DECLARE
+  v_log_id UUID;
+BEGIN
+  SELECT w.winning_chat_log_id INTO v_log_id
+  FROM public.wins w
+  WHERE w.id = p_win_id;
+
+  IF v_log_id IS NULL THEN
+    RAISE EXCEPTION 'Win not found';
+  END IF;
+
+  RETURN QUERY
+    SELECT m.seq, m.prompt, m.response
+    FROM public.winning_chat_messages m
+    WHERE m.log_id = v_log_id AND m.seq > coalesce(p_after_seq, 0)
+    ORDER BY m.seq
+    LIMIT p_limit;
+END;
+$$ LANGUAGE plpgsql STABLE SECURITY DEFINER;
+
+
+-- Leaderboard in ranking order; pass the wins, last_win_at and user_id of
+-- the last row seen to get the next page
+CREATE OR REPLACE FUNCTION public.get_leaderboard(
+    p_limit INT,
+    p_after_wins INT DEFAULT NULL,
+    p_after_last_win TIMESTAMPTZ DEFAULT NULL,
+    p_after_user UUID DEFAULT NULL
+)
+RETURNS TABLE (
+    user_id UUID,
+    username TEXT,
+    avatar_url TEXT,
+    wins INT,
+    last_win_at TIMESTAMPTZ
+) AS $$
+  SELECT l.user_id, p.username, p.avatar_url, l.wins, l.last_win_at
+  FROM public.leaderboard l
+  LEFT JOIN public.profiles p ON p.id = l.user_id
+  WHERE p_after_wins IS NULL
+     OR l.wins < p_after_wins
+     OR (l.wins = p_after_wins AND (l.last_win_at, l.user_id) > (p_after_last_win, p_after_user))
+  ORDER BY l.wins DESC, l.last_win_at, l.user_id
+  LIMIT p_limit;
+$$ LANGUAGE sql STABLE SECURITY DEFINER;
@@ -0,0 +1,26 @@
+-- Indexes for the foreign keys the initial schema left unindexed. Without
+-- them every per-user lookup, and every ON DELETE check or cascade from the
+-- referenced row, scans the whole child table.
+--
+-- winning_chat_messages.log_id, winning_chat_logs.user_id and wins.user_id
+-- are already covered by the indexes added with the win read API
+-- (20240730100009_win_reads.sql).
+
+CREATE INDEX IF NOT EXISTS purchases_user_id_created_at_idx ON purchases (user_id, created_at DESC);
+CREATE INDEX IF NOT EXISTS win_upload_messages_user_id_idx ON win_upload_messages (user_id);
+
+
+-- Owner policies: wrapping auth.uid() in a sub-select makes Postgres
+-- evaluate it once per statement instead of once per row, and the
+-- comparison becomes an index condition on the user column.
+DROP POLICY "Users can read their own profile" ON profiles;
+DROP POLICY "Users can insert their own profile" ON profiles;
+DROP POLICY "Users can update their own profile" ON profiles;
+DROP POLICY "Users can delete their own profile" ON profiles;
+DROP POLICY "Users can view their own purchases" ON purchases;
+
+CREATE POLICY "Users can read their own profile" ON profiles FOR SELECT USING ((SELECT auth.uid()) = id);
+CREATE POLICY "Users can insert their own profile" ON profiles FOR INSERT WITH CHECK ((SELECT auth.uid()) = id);
+CREATE POLICY "Users can update their own profile" ON profiles FOR UPDATE USING ((SELECT auth.uid()) = id) WITH CHECK ((SELECT auth.uid()) = id);
+CREATE POLICY "Users can delete their own profile" ON profiles FOR DELETE USING ((SELECT auth.uid()) = id);
+CREATE POLICY "Users can view their own purchases" ON purchases FOR SELECT USING ((SELECT auth.uid()) = user_id);
@@ -0,0 +1,33 @@
+-- Pushes game_state changes to the backend over LISTEN/NOTIFY, so each
+-- worker holds the payout phase in memory instead of re-reading it every
+-- second. Notifications are delivered on commit, in commit order.
+
+-- The part of the row the backend keeps in memory. Used for the notification
+-- payload and for the snapshot a listener reads after (re)connecting, so both
+-- have the same shape.
+CREATE OR REPLACE FUNCTION public.game_state_notification(gs public.game_state)
+RETURNS JSONB AS $$
+  SELECT jsonb_build_object(
+    'prizepool_amount', gs.prizepool_amount,
+    'is_payout_phase_active', gs.is_payout_phase_active
+  );
+$$ LANGUAGE sql STABLE;
+
+CREATE OR REPLACE FUNCTION public.notify_game_state_changed()
+RETURNS TRIGGER AS $$
+BEGIN
+  PERFORM pg_notify('game_state_changed', public.game_state_notification(NEW)::text);
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- The attempt counters change on every attempt; only a change to the fields
+-- in the payload is worth a notification
+CREATE TRIGGER on_game_state_changed
+  AFTER UPDATE ON public.game_state
+  FOR EACH ROW
+  WHEN (
+    OLD.is_payout_phase_active IS DISTINCT FROM NEW.is_payout_phase_active
+    OR OLD.prizepool_amount IS DISTINCT FROM NEW.prizepool_amount
+  )
+  EXECUTE FUNCTION public.notify_game_state_changed();
@@ -0,0 +1,91 @@
+-- Set-based log_attempt for the 'coalesced' attempt counter mode: the
+-- backend collects the attempts that arrive within a few milliseconds and
+-- sends them as one call. Every user is charged with a single UPDATE and
+-- game_state is bumped once by the number of attempts that were paid for.
+--
+-- Returns one row per element of p_user_ids, in order. Each attempt sees the
+-- game state as if the batch had been applied one attempt at a time: the
+-- attempt that crosses the threshold, and every later one, get
+-- is_payout_phase_active = true. An attempt the user has no credits left for
+-- gets NULLs and leaves the others untouched.
+
+CREATE OR REPLACE FUNCTION public.log_attempts(p_user_ids UUID[])
+RETURNS TABLE (
+    attempt_index INT,
+    is_payout_phase_active BOOLEAN,
+    new_credits_balance INT
+) AS $$
+DECLARE
+  v_charged_ids UUID[];
+  v_old_credits INT[];
+  v_granted BIGINT[];
+  v_total BIGINT;
+  v_attempts_before BIGINT;
+  v_threshold BIGINT;
+  v_was_active BOOLEAN;
+BEGIN
+  -- Lock the profiles in a fixed order, so concurrent batches cannot deadlock
+  PERFORM 1 FROM public.profiles p WHERE p.id = ANY(p_user_ids) ORDER BY p.id FOR UPDATE;
+
+  -- Charge each user for as many of their attempts as their balance covers
+  WITH wanted AS (
+    SELECT u.user_id, count(*) AS n
+    FROM unnest(p_user_ids) AS u(user_id)
+    GROUP BY u.user_id
+  ), charges AS (
+    SELECT p.id, p.credits AS old_credits, least(w.n, p.credits) AS granted
+    FROM wanted w
+    JOIN public.profiles p ON p.id = w.user_id
+    WHERE p.credits > 0
+  ), charged AS (
+    UPDATE public.profiles p
+    SET credits = p.credits - c.granted
+    FROM charges c
+    WHERE p.id = c.id
+    RETURNING c.id, c.old_credits, c.granted
+  )
+  SELECT array_agg(charged.id), array_agg(charged.old_credits), array_agg(charged.granted), coalesce(sum(charged.granted), 0)
+  INTO v_charged_ids, v_old_credits, v_granted, v_total
+  FROM charged;
+
+  SELECT gs.game_attempts, gs.payout_phase_threshold, gs.is_payout_phase_active
+  INTO v_attempts_before, v_threshold, v_was_active
+  FROM public.game_state gs
+  WHERE gs.id = 1
+  FOR UPDATE;
+
+  IF v_total > 0 THEN
+    UPDATE public.game_state gs
+    SET
+      global_attempts = gs.global_attempts + v_total,
+      game_attempts = gs.game_attempts + v_total,
+      is_payout_phase_active = gs.is_payout_phase_active OR gs.game_attempts + v_total >= gs.payout_phase_threshold
+    WHERE gs.id = 1;
+  END IF;
+
+  RETURN QUERY
+  WITH attempts AS (
+    SELECT a.user_id, a.i, row_number() OVER (PARTITION BY a.user_id ORDER BY a.i) AS nth
+    FROM unnest(p_user_ids) WITH ORDINALITY AS a(user_id, i)
+  ), paid AS (
+    SELECT a.i, a.nth, c.old_credits, a.nth <= coalesce(c.granted, 0) AS ok
+    FROM attempts a
+    LEFT JOIN unnest(v_charged_ids, v_old_credits, v_granted) AS c(user_id, old_credits, granted)
+      ON c.user_id = a.user_id
+  ), ordered AS (
+    SELECT paid.*, count(*) FILTER (WHERE paid.ok) OVER (ORDER BY paid.i) AS position
+    FROM paid
+  )
+  SELECT
+    (o.i - 1)::INT,
+    CASE WHEN o.ok THEN v_was_active OR v_attempts_before + o.position >= v_threshold END,
+    CASE WHEN o.ok THEN (o.old_credits - o.nth)::INT END
+  FROM ordered o
+  ORDER BY o.i;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+-- Only the backend may call these, with the service role key; the anon key
+-- shipped to the frontend must not reach them through PostgREST
+REVOKE EXECUTE ON FUNCTION public.log_attempts(UUID[]) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.log_attempts(UUID[]) TO service_role;
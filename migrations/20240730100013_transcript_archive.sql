@@ -0,0 +1,148 @@
+-- Cold storage for winning transcripts. winning_chat_messages keeps one row
+-- per message forever, so it only grows. The backend's archiver moves
+-- transcripts past a cutoff into winning_chat_archive instead: one row per
+-- transcript, holding its messages as a single JSONB array, which TOAST
+-- stores compressed. The archive is append-only and partitioned by month of
+-- the win, so old months can be detached or dropped whole.
+
+ALTER TABLE winning_chat_logs ADD COLUMN archived_at TIMESTAMPTZ;
+
+-- Finds the transcripts due for archiving without reading archived ones
+CREATE INDEX winning_chat_logs_unarchived_idx ON winning_chat_logs (created_at) WHERE archived_at IS NULL;
+
+CREATE TABLE winning_chat_archive (
+    log_id UUID NOT NULL,
+    user_id UUID NOT NULL,
+    -- The transcript's created_at, and the partition key
+    created_at TIMESTAMPTZ NOT NULL,
+    message_count INT NOT NULL,
+    -- [{"seq", "prompt", "response"}, ...] in order; seq is kept so
+    -- transcript cursors stay valid across archiving
+    messages JSONB NOT NULL,
+    archived_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    PRIMARY KEY (log_id, created_at)
+) PARTITION BY RANGE (created_at);
+
+ALTER TABLE winning_chat_archive ENABLE ROW LEVEL SECURITY;
+
+
+CREATE OR REPLACE FUNCTION public.reject_archive_change()
+RETURNS TRIGGER AS $$
+BEGIN
+  RAISE EXCEPTION 'winning_chat_archive is append-only';
+END;
+$$ LANGUAGE plpgsql;
+
+-- Row triggers on the parent apply to every partition. Dropping or
+-- detaching a whole partition is still allowed.
+CREATE TRIGGER winning_chat_archive_append_only
+  BEFORE UPDATE OR DELETE ON winning_chat_archive
+  FOR EACH ROW EXECUTE FUNCTION public.reject_archive_change();
+
+
+-- Creates the month's partition for `p_at` if it does not exist yet.
+-- Bounds are computed in UTC so they never depend on the session time zone.
+CREATE OR REPLACE FUNCTION public.ensure_archive_partition(p_at TIMESTAMPTZ)
+RETURNS VOID AS $$
+DECLARE
+  v_from TIMESTAMPTZ := date_trunc('month', p_at AT TIME ZONE 'UTC') AT TIME ZONE 'UTC';
+  v_name TEXT := 'winning_chat_archive_' || to_char(p_at AT TIME ZONE 'UTC', 'YYYY_MM');
+BEGIN
+  IF to_regclass('public.' || v_name) IS NULL THEN
+    EXECUTE format(
+      'CREATE TABLE public.%I PARTITION OF public.winning_chat_archive FOR VALUES FROM (%L) TO (%L)',
+      v_name, v_from, v_from + interval '1 month'
+    );
+  END IF;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+
+-- Archives up to p_limit of the oldest transcripts older than p_older_than
+-- and returns how many it moved. Each one is copied to the archive and its
+-- messages are deleted from the hot table in the same transaction. Logs
+-- locked by a concurrent run are skipped.
+CREATE OR REPLACE FUNCTION public.archive_win_transcripts(p_older_than INTERVAL, p_limit INT)
+RETURNS INT AS $$
+DECLARE
+  v_log RECORD;
+  v_archived INT := 0;
+BEGIN
+  FOR v_log IN
+    SELECT l.id, l.user_id, l.created_at
+    FROM public.winning_chat_logs l
+    WHERE l.archived_at IS NULL AND l.created_at < now() - p_older_than
+    ORDER BY l.created_at
+    LIMIT p_limit
+    FOR UPDATE SKIP LOCKED
+  LOOP
+    PERFORM public.ensure_archive_partition(v_log.created_at);
+
+    INSERT INTO public.winning_chat_archive (log_id, user_id, created_at, message_count, messages)
+    SELECT
+      v_log.id, v_log.user_id, v_log.created_at, count(*),
+      coalesce(
+        jsonb_agg(jsonb_build_object('seq', m.seq, 'prompt', m.prompt, 'response', m.response) ORDER BY m.seq),
+        '[]'::jsonb
+      )
+    FROM public.winning_chat_messages m
+    WHERE m.log_id = v_log.id;
+
+    DELETE FROM public.winning_chat_messages WHERE log_id = v_log.id;
+    UPDATE public.winning_chat_logs SET archived_at = now() WHERE id = v_log.id;
+    v_archived := v_archived + 1;
+  END LOOP;
+
+  RETURN v_archived;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+
+-- Same contract as before, now also serving archived transcripts
+CREATE OR REPLACE FUNCTION public.get_win_messages(p_win_id UUID, p_limit INT, p_after_seq BIGINT DEFAULT NULL)
+RETURNS TABLE (
+    seq BIGINT,
+    prompt TEXT,
+    response TEXT
+) AS $$
+DECLARE
+  v_log_id UUID;
+  v_created_at TIMESTAMPTZ;
+  v_archived_at TIMESTAMPTZ;
+BEGIN
+  SELECT l.id, l.created_at, l.archived_at INTO v_log_id, v_created_at, v_archived_at
+  FROM public.wins w
+  JOIN public.winning_chat_logs l ON l.id = w.winning_chat_log_id
+  WHERE w.id = p_win_id;
+
+  IF v_log_id IS NULL THEN
+    RAISE EXCEPTION 'Win not found';
+  END IF;
+
+  IF v_archived_at IS NULL THEN
+    RETURN QUERY
+      SELECT m.seq, m.prompt, m.response
+      FROM public.winning_chat_messages m
+      WHERE m.log_id = v_log_id AND m.seq > coalesce(p_after_seq, 0)
+      ORDER BY m.seq
+      LIMIT p_limit;
+  ELSE
+    -- created_at prunes the lookup to one partition
+    RETURN QUERY
+      SELECT (e->>'seq')::BIGINT, e->>'prompt', e->>'response'
+      FROM public.winning_chat_archive a
+      CROSS JOIN jsonb_array_elements(a.messages) e
+      WHERE a.log_id = v_log_id AND a.created_at = v_created_at
+        AND (e->>'seq')::BIGINT > coalesce(p_after_seq, 0)
+      ORDER BY 1
+      LIMIT p_limit;
+  END IF;
+END;
+$$ LANGUAGE plpgsql STABLE SECURITY DEFINER;
+
+-- Only the backend may call these, with the service role key; the anon key
+-- shipped to the frontend must not reach them through PostgREST
+REVOKE EXECUTE ON FUNCTION public.ensure_archive_partition(TIMESTAMPTZ) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.ensure_archive_partition(TIMESTAMPTZ) TO service_role;
+REVOKE EXECUTE ON FUNCTION public.archive_win_transcripts(INTERVAL, INT) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.archive_win_transcripts(INTERVAL, INT) TO service_role;
@@ -0,0 +1,15 @@
+-- /chat charges an attempt before calling the model. When the model fails
+-- before replying, the credit is given back; the attempt stays counted.
+
+CREATE OR REPLACE FUNCTION public.refund_attempt_credit(p_user_id UUID)
+RETURNS INT AS $$
+  UPDATE public.profiles
+  SET credits = credits + 1
+  WHERE id = p_user_id
+  RETURNING credits;
+$$ LANGUAGE sql SECURITY DEFINER;
+
+-- Only the backend may call this, with the service role key; the anon key
+-- shipped to the frontend must not reach it through PostgREST
+REVOKE EXECUTE ON FUNCTION public.refund_attempt_credit(UUID) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.refund_attempt_credit(UUID) TO service_role;